@@ -0,0 +1,185 @@
+import asyncio
+import logging
+import threading
+import weakref
+from collections import deque
+from time import monotonic, perf_counter
+from typing import Any, Callable, Deque, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# degradation levels, applied to the live sessions in this order
+SHED_TRANSLATION = 1
+SHED_DIARIZATION = 2
+SHED_CADENCE = 3
+SHED_CHUNK_FACTOR = 3  # at SHED_CADENCE, decode every 3 x --min-chunk-size
+
+LOAD_WINDOW = 10.0  # seconds of inference calls used to measure the load
+SHED_AFTER = 5.0  # overload duration before degrading one more level
+RECOVER_AFTER = 15.0  # duration without overload before restoring one level
+QUEUE_POLL_INTERVAL = 0.5
+
+
+def available_memory() -> Optional[int]:
+    """Memory available for new allocations, in bytes (Linux only)."""
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+class AdmissionController:
+    """
+    Admission of new sessions and load shedding, based on the measured
+    capacity of the process.
+
+    The load is the time spent in model calls over the last `LOAD_WINDOW`
+    seconds, per inference lane: the aggregate real-time factor of the live
+    sessions divided by the number of calls that can run in parallel. The
+    process is overloaded when the load exceeds `max_load`, when a speaking
+    session lags more than `max_lag` seconds behind its audio, or when the
+    scheduler has more pending calls than slots. New sessions are admitted
+    only when the process is not overloaded, has less than `max_sessions`
+    sessions and `min_free_memory` bytes available; otherwise they wait up
+    to `queue_timeout` seconds for capacity, then are refused.
+
+    With `shed_load`, a sustained overload degrades the live sessions one
+    level at a time: translation is paused, then diarization, then the
+    decoder runs less often. Levels are restored one at a time once the
+    overload is over. Higher priority classes are degraded later.
+    """
+
+    def __init__(
+        self,
+        capacity: int = 1,
+        max_sessions: int = 0,
+        max_load: float = 0.0,
+        max_lag: float = 0.0,
+        min_free_memory: int = 0,
+        queue_timeout: float = 0.0,
+        shed_load: bool = False,
+        scheduler: Any = None,
+    ) -> None:
+        self.capacity = max(1, capacity)
+        self.max_sessions = max_sessions
+        self.max_load = max_load
+        self.max_lag = max_lag
+        self.min_free_memory = min_free_memory
+        self.queue_timeout = queue_timeout
+        self.shed_load = shed_load
+        self.scheduler = scheduler
+        self.n_sessions = 0
+        self.level = 0
+        self._sessions: "weakref.WeakSet[Any]" = weakref.WeakSet()
+        self._calls: Deque[Tuple[float, float]] = deque()  # (end, duration) of the recent model calls
+        self._calls_lock = threading.Lock()
+        self._overloaded_since: Optional[float] = None
+        self._recovered_since: Optional[float] = None
+        self._level_changed_at = monotonic()
+
+    def timed(self, fn: Callable) -> Callable:
+        """Wrap a blocking model call so that its duration counts in the load."""
+        def call(*args: Any) -> Any:
+            start = perf_counter()
+            try:
+                return fn(*args)
+            finally:
+                end = perf_counter()
+                with self._calls_lock:
+                    self._calls.append((end, end - start))
+        return call
+
+    def load(self) -> float:
+        horizon = perf_counter() - LOAD_WINDOW
+        with self._calls_lock:
+            while self._calls and self._calls[0][0] < horizon:
+                self._calls.popleft()
+            busy = sum(duration for _, duration in self._calls)
+        return busy / (LOAD_WINDOW * self.capacity)
+
+    def max_session_lag(self) -> float:
+        lags = [session.transcription_lag() for session in list(self._sessions)]
+        return max((lag for lag in lags if lag is not None), default=0.0)
+
+    def overload(self) -> Optional[str]:
+        """Why the process is overloaded, or None."""
+        if self.max_load > 0:
+            load = self.load()
+            if load > self.max_load:
+                return f"inference load {load:.2f} above {self.max_load:.2f}"
+        if self.max_lag > 0:
+            lag = self.max_session_lag()
+            if lag > self.max_lag:
+                return f"sessions lag {lag:.1f}s behind their audio"
+        if self.scheduler is not None and (self.max_load > 0 or self.max_lag > 0):
+            if self.scheduler.queue_length > self.scheduler.slots:
+                return f"{self.scheduler.queue_length} inference calls waiting for a slot"
+        return None
+
+    def _refusal(self) -> Optional[str]:
+        if self.max_sessions and self.n_sessions >= self.max_sessions:
+            return f"server full ({self.n_sessions}/{self.max_sessions} sessions)"
+        if self.min_free_memory:
+            free = available_memory()
+            if free is not None and free < self.min_free_memory:
+                return f"low memory ({free / 2**30:.1f} GB available)"
+        return self.overload()
+
+    async def admit(self) -> Optional[str]:
+        """
+        Reserve a session, waiting up to `queue_timeout` seconds for capacity.
+        Returns None when admitted (release it with `release`), or why the
+        session is refused.
+        """
+        deadline = monotonic() + self.queue_timeout
+        while True:
+            refusal = self._refusal()
+            if refusal is None:
+                self.n_sessions += 1
+                return None
+            if monotonic() >= deadline:
+                logger.warning(f"Refusing a session: {refusal}")
+                return refusal
+            await asyncio.sleep(QUEUE_POLL_INTERVAL)
+
+    def attach(self, session: Any) -> None:
+        self._sessions.add(session)
+
+    def release(self, session: Any = None) -> None:
+        self.n_sessions = max(0, self.n_sessions - 1)
+        if session is not None:
+            self._sessions.discard(session)
+
+    def _update_level(self) -> None:
+        now = monotonic()
+        if self.overload() is not None:
+            self._recovered_since = None
+            if self._overloaded_since is None:
+                self._overloaded_since = now
+            since = max(self._overloaded_since, self._level_changed_at)
+            if self.level < SHED_CADENCE and now - since >= SHED_AFTER:
+                self.level += 1
+                self._level_changed_at = now
+                logger.warning(f"Sustained overload: degrading the sessions to level {self.level}")
+        else:
+            self._overloaded_since = None
+            if self._recovered_since is None:
+                self._recovered_since = now
+            since = max(self._recovered_since, self._level_changed_at)
+            if self.level > 0 and now - since >= RECOVER_AFTER:
+                self.level -= 1
+                self._level_changed_at = now
+                logger.info(f"Overload over: restoring the sessions to level {self.level}")
+
+    def degradation_level(self, priority: int = 0) -> int:
+        """Degradation level of a session of the given priority class."""
+        if not self.shed_load:
+            return 0
+        self._update_level()
+        if self.level == 0:
+            return 0
+        return min(SHED_CADENCE, max(0, self.level - priority))
@@ -1,19 +1,28 @@
 import asyncio
 import logging
 import traceback
+import uuid
 from time import time
-from typing import Any, AsyncGenerator, List, Optional, Union
+from typing import Any, AsyncGenerator, Callable, List, Optional, Union
 
 import numpy as np
 
+from whisperlivekit import metrics
+from whisperlivekit.admission import (SHED_CADENCE, SHED_CHUNK_FACTOR,
+                                      SHED_DIARIZATION, SHED_TRANSLATION)
 from whisperlivekit.core import (TranscriptionEngine,
                                  online_diarization_factory, online_factory,
                                  online_translation_factory)
 from whisperlivekit.ffmpeg_manager import FFmpegManager, FFmpegState
-from whisperlivekit.silero_vad_iterator import FixedVADIterator
+from whisperlivekit.latency_controller import LatencyController
+from whisperlivekit.model_registry import ModelLease
+from whisperlivekit.pcm_buffer import PCMBuffer
+from whisperlivekit.silero_vad_iterator import BatchedVADIterator
 from whisperlivekit.timed_objects import (ASRToken, ChangeSpeaker, FrontData,
                                           Line, Silence, State, Transcript)
 from whisperlivekit.tokens_alignment import TokensAlignment
+from whisperlivekit.tracing import start_trace
+from whisperlivekit.transcript_archive import TranscriptArchive
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 logger = logging.getLogger(__name__)
@@ -62,13 +71,17 @@ class AudioProcessor:
         else:
             models = TranscriptionEngine(**kwargs)
         
+        # Model selected by the session (see TranscriptionEngine.acquire_model), or the server one
+        self.models = models
+        self.model_lease: Optional[ModelLease] = kwargs.get('model')
+        asr = self.model_lease.asr if self.model_lease else models.asr
+
         # Audio processing settings
-        self.args = models.args
+        self.args = self.model_lease.args if self.model_lease else models.args
         self.sample_rate = 16000
         self.channels = 1
         self.samples_per_sec = int(self.sample_rate * self.args.min_chunk_size)
         self.bytes_per_sample = 2
-        self.bytes_per_sec = self.samples_per_sec * self.bytes_per_sample
         self.max_bytes_per_sec = 32000 * 5  # 5 seconds of audio at 32 kHz
         self.is_pcm_input = self.args.pcm_input
 
@@ -79,17 +92,49 @@ class AudioProcessor:
         self.lock: asyncio.Lock = asyncio.Lock()
         self.sep: str = " "  # Default separator
         self.last_response_content: FrontData = FrontData()
+        # set by the processors whenever the results may have changed
+        self._results_changed: asyncio.Event = asyncio.Event()
+        self._results_changed.set()
+        max_update_rate = self.args.max_update_rate
+        if kwargs.get('max_update_rate'):
+            max_update_rate = min(max_update_rate, kwargs['max_update_rate'])
+        self.min_update_interval: float = 1.0 / max_update_rate
+        # priority class of the session in the inference scheduler (higher is served first)
+        self.priority: int = kwargs.get('priority') or 0
+        # load shedding level applied to the session (see AdmissionController)
+        self.degradation: int = 0
+        # latency budget of the session: its decoder settings are tuned to use it
+        target_lag = kwargs.get('target_lag') or self.args.target_lag
+        self.latency_controller: Optional[LatencyController] = None
+        if target_lag and self.args.transcription:
+            # only SimulStreaming has a frame threshold (the decoders of a pool share the server settings)
+            simul_cfg = getattr(asr or models.asr, "cfg", None) if self.args.backend_policy == "simulstreaming" else None
+            self.latency_controller = LatencyController(
+                target_lag,
+                self.args.min_chunk_size,
+                simul_cfg.frame_threshold if simul_cfg else None,
+            )
 
         self.tokens_alignment: TokensAlignment = TokensAlignment(self.state, self.args, self.sep)
         self.beg_loop: Optional[float] = None
 
+        # Long sessions: lines older than archive_horizon are moved to an on-disk archive
+        self.session_id: str = uuid.uuid4().hex
+        self.archive: Optional[TranscriptArchive] = None
+        self.archived_lines: int = 0
+        if self.args.archive_horizon > 0:
+            self.archive = TranscriptArchive(self.args.archive_dir, self.session_id)
+        self.tracer = None
+        if self.args.trace_sessions > 0:
+            self.tracer = start_trace(self.session_id, self.args.trace_sessions, self.args.trace_spans)
+
         # Models and processing
-        self.asr: Any = models.asr
+        self.asr: Any = asr
         self.vac_model: Any = models.vac_model
         if self.args.vac:
-            self.vac: Optional[FixedVADIterator] = FixedVADIterator(models.vac_model)
+            self.vac: Optional[BatchedVADIterator] = BatchedVADIterator(models.vad_service)
         else:
-            self.vac: Optional[FixedVADIterator] = None
+            self.vac: Optional[BatchedVADIterator] = None
                          
         self.ffmpeg_manager: Optional[FFmpegManager] = None
         self.ffmpeg_reader_task: Optional[asyncio.Task] = None
@@ -102,13 +147,15 @@ class AudioProcessor:
             )
             async def handle_ffmpeg_error(error_type: str):
                 logger.error(f"FFmpeg error: {error_type}")
+                metrics.ffmpeg_event(error_type)
                 self._ffmpeg_error = error_type
+                self._notify_results()
             self.ffmpeg_manager.on_error_callback = handle_ffmpeg_error
              
         self.transcription_queue: Optional[asyncio.Queue] = asyncio.Queue() if self.args.transcription else None
         self.diarization_queue: Optional[asyncio.Queue] = asyncio.Queue() if self.args.diarization else None
         self.translation_queue: Optional[asyncio.Queue] = asyncio.Queue() if self.args.target_language else None
-        self.pcm_buffer: bytearray = bytearray()
+        self.pcm_buffer: PCMBuffer = PCMBuffer()
         self.total_pcm_samples: int = 0
         self.transcription_task: Optional[asyncio.Task] = None
         self.diarization_task: Optional[asyncio.Task] = None
@@ -121,14 +168,69 @@ class AudioProcessor:
         self.diarization: Optional[Any] = None
 
         if self.args.transcription:
-            self.transcription = online_factory(self.args, models.asr)        
+            if models.inference_pool is not None:
+                # the decoder runs in an inference worker, which also routes languages
+                self.transcription = models.inference_pool.open_session(
+                    self.model_lease.key if self.model_lease else None
+                )
+            else:
+                self.transcription = online_factory(self.args, asr)
+                if models.language_routes and self.args.backend_policy == "simulstreaming":
+                    self.transcription.language_router = self._route_language
             self.sep = self.transcription.asr.sep   
+            if self.tracer and hasattr(self.transcription, "set_tracer"):
+                self.transcription.set_tracer(self.tracer)
         if self.args.diarization:
             self.diarization = online_diarization_factory(self.args, models.diarization_model)
         if models.translation_model:
             self.translation = online_translation_factory(self.args, models.translation_model)
+        metrics.track_session(self)
+
+    def transcription_lag(self) -> Optional[float]:
+        """Seconds the transcription is behind the audio received, None while silent or not started."""
+        if not self.beg_loop or not self.transcription or self.current_silence:
+            # a silent session has nothing to transcribe, its end_buffer does not move
+            return None
+        return max(0.0, time() - self.beg_loop - self.state.end_buffer)
+
+    async def _run_inference(self, stage: str, stream_time: float, fn: Callable, *args: Any) -> Any:
+        """
+        Run a blocking model call of a pipeline `stage` off the event loop.
+        With the inference scheduler, the call is ordered by the wall-clock
+        time at which the audio up to `stream_time` would have been
+        processed with no lag.
+        """
+        fn = metrics.timed(stage, fn)
+        if self.tracer:
+            fn = self.tracer.traced(stage, fn, audio_time=stream_time)
+        if self.models.admission is not None:
+            fn = self.models.admission.timed(fn)
+        scheduler = self.models.inference_scheduler
+        if scheduler is None:
+            return await asyncio.to_thread(fn, *args)
+        deadline = (self.beg_loop or time()) + stream_time
+        return await scheduler.run(fn, *args, deadline=deadline, priority=self.priority)
+
+    def _update_degradation(self) -> int:
+        admission = self.models.admission
+        level = admission.degradation_level(self.priority) if admission is not None else 0
+        if level != self.degradation:
+            logger.info(f"Session degradation level: {self.degradation} -> {level}")
+            self.degradation = level
+        return level
+
+    def _control_latency(self, compute_time: float, processed_upto: float) -> None:
+        lag = max(0.0, time() - self.beg_loop - max(processed_upto, self.state.end_buffer))
+        if self.latency_controller.update(lag, compute_time) and hasattr(self.transcription, "tune"):
+            self.transcription.tune(**self.latency_controller.decoder_params())
+            logger.info(f"Decoder settings for a {self.latency_controller.target_lag}s target lag: {self.latency_controller.describe()}")
+
+    def _notify_results(self) -> None:
+        """Wake up the results formatter."""
+        self._results_changed.set()
 
     async def _push_silence_event(self) -> None:
+        self._notify_results()
         if self.transcription_queue:
             await self.transcription_queue.put(self.current_silence)
         if self.args.diarization and self.diarization_queue:
@@ -159,12 +261,26 @@ class AudioProcessor:
         self.current_silence = None
 
     async def _enqueue_active_audio(self, pcm_chunk: np.ndarray) -> None:
+        # pcm_chunk is a read-only view of the PCM buffer, shared by all consumers
         if pcm_chunk is None or pcm_chunk.size == 0:
             return
+        if self.tracer:
+            self.tracer.instant(
+                "enqueue", audio_time=self.total_pcm_samples / self.sample_rate,
+                duration=len(pcm_chunk) / self.sample_rate,
+            )
         if self.transcription_queue:
-            await self.transcription_queue.put(pcm_chunk.copy())
+            await self.transcription_queue.put(pcm_chunk)
         if self.args.diarization and self.diarization_queue:
-            await self.diarization_queue.put(pcm_chunk.copy())
+            if self._update_degradation() >= SHED_DIARIZATION:
+                # diarization paused: only keep its timeline aligned with the audio,
+                # and let the lines of this audio be committed without a speaker
+                await self.diarization_queue.put(
+                    Silence(duration=len(pcm_chunk) / self.sample_rate, has_ended=True)
+                )
+                self.tokens_alignment.unattributed_until = (self.total_pcm_samples + len(pcm_chunk)) / self.sample_rate
+            else:
+                await self.diarization_queue.put(pcm_chunk)
 
     def _slice_before_silence(self, pcm_array: np.ndarray, chunk_sample_start: int, silence_sample: Optional[int]) -> Optional[np.ndarray]:
         if silence_sample is None:
@@ -177,10 +293,6 @@ class AudioProcessor:
             return None
         return pcm_array[:split_index]
 
-    def convert_pcm_to_float(self, pcm_buffer: Union[bytes, bytearray]) -> np.ndarray:
-        """Convert PCM buffer in s16le format to normalized NumPy array."""
-        return np.frombuffer(pcm_buffer, dtype=np.int16).astype(np.float32) / 32768.0
-            
     async def get_current_state(self) -> State:
         """Get current state."""
         async with self.lock:
@@ -231,7 +343,7 @@ class AudioProcessor:
                     await asyncio.sleep(0.05)
                     continue
 
-                self.pcm_buffer.extend(chunk)
+                self.pcm_buffer.write(chunk)
                 await self.handle_pcm_data()
 
             except asyncio.CancelledError:
@@ -253,14 +365,19 @@ class AudioProcessor:
     async def transcription_processor(self) -> None:
         """Process audio chunks for transcription."""
         cumulative_pcm_duration_stream_time = 0.0
+        undecoded_duration = 0.0  # audio inserted since the last process_iter
         
-        while True:
+        finishing = False
+        while not finishing:
             try:
                 # item = await self.transcription_queue.get()
                 item = await get_all_from_queue(self.transcription_queue)
                 if item is SENTINEL:
                     logger.debug("Transcription processor received sentinel. Finishing.")
-                    break
+                    if not undecoded_duration:
+                        break
+                    # decode the audio held back by the cadence before finishing
+                    finishing = True
 
                 asr_internal_buffer_duration_s = len(getattr(self.transcription, 'audio_buffer', [])) / self.transcription.SAMPLING_RATE
                 transcription_lag_s = max(0.0, time() - self.beg_loop - self.state.end_buffer)
@@ -271,8 +388,8 @@ class AudioProcessor:
 
                 if isinstance(item, Silence):
                     if item.is_starting:
-                        new_tokens, current_audio_processed_upto = await asyncio.to_thread(
-                            self.transcription.start_silence
+                        new_tokens, current_audio_processed_upto = await self._run_inference(
+                            "transcription", self.state.end_buffer, self.transcription.start_silence
                         )
                         asr_processing_logs += f" + Silence starting"
                     if item.has_ended:
@@ -288,14 +405,27 @@ class AudioProcessor:
                 elif isinstance(item, ChangeSpeaker):
                     self.transcription.new_speaker(item)
                     continue
-                elif isinstance(item, np.ndarray):
-                    pcm_array = item
-                    logger.info(asr_processing_logs)
-                    cumulative_pcm_duration_stream_time += len(pcm_array) / self.sample_rate
-                    stream_time_end_of_current_pcm = cumulative_pcm_duration_stream_time
-                    self.transcription.insert_audio_chunk(pcm_array, stream_time_end_of_current_pcm)
-                    new_tokens, current_audio_processed_upto = await asyncio.to_thread(self.transcription.process_iter)
+                elif isinstance(item, np.ndarray) or finishing:
+                    if not finishing:
+                        pcm_array = item
+                        logger.info(asr_processing_logs)
+                        cumulative_pcm_duration_stream_time += len(pcm_array) / self.sample_rate
+                        stream_time_end_of_current_pcm = cumulative_pcm_duration_stream_time
+                        self.transcription.insert_audio_chunk(pcm_array, stream_time_end_of_current_pcm)
+                        undecoded_duration += len(pcm_array) / self.sample_rate
+                        decode_interval = self.latency_controller.cadence if self.latency_controller else 0.0
+                        if self._update_degradation() >= SHED_CADENCE:
+                            decode_interval = max(decode_interval, SHED_CHUNK_FACTOR * self.args.min_chunk_size)
+                        if undecoded_duration < decode_interval:
+                            continue
+                    undecoded_duration = 0.0
+                    decode_start = time()
+                    new_tokens, current_audio_processed_upto = await self._run_inference(
+                        "transcription", self.state.end_buffer, self.transcription.process_iter
+                    )
                     new_tokens = new_tokens or []
+                    if self.latency_controller:
+                        self._control_latency(time() - decode_start, current_audio_processed_upto)
 
                 _buffer_transcript = self.transcription.get_buffer()
                 buffer_text = _buffer_transcript.text
@@ -321,8 +451,15 @@ class AudioProcessor:
                     self.state.end_buffer = max(candidate_end_times)
                     self.state.new_tokens.extend(new_tokens)
                     self.state.new_tokens_buffer = _buffer_transcript
-
-                if self.translation_queue:
+                    if self.archive:
+                        # only the end of the last token is used
+                        del self.state.tokens[:-1]
+                self._notify_results()
+                metrics.count_tokens(len(new_tokens))
+                if self.archive:
+                    self.transcription.trim_committed(self.state.end_buffer - self.args.archive_horizon)
+
+                if self.translation_queue and self._update_degradation() < SHED_TRANSLATION:
                     for token in new_tokens:
                         await self.translation_queue.put(token)                
             except Exception as e:
@@ -353,8 +490,12 @@ class AudioProcessor:
                     continue
 
                 self.diarization.insert_audio_chunk(item)
+                diarize_start = time()
                 diarization_segments = await self.diarization.diarize()
+                if self.tracer:
+                    self.tracer.add("diarization", diarize_start, time())
                 self.state.new_diarization = diarization_segments
+                self._notify_results()
                 
             except Exception as e:
                 logger.warning(f"Exception in diarization_processor: {e}")
@@ -382,17 +523,51 @@ class AudioProcessor:
                     pass
                 else:
                     self.translation.insert_tokens(item)
-                    new_translation, new_translation_buffer = await asyncio.to_thread(self.translation.process)
+                    new_translation, new_translation_buffer = await self._run_inference(
+                        "translation", item[0].start if item else self.state.end_buffer, self.translation.process
+                    )
                 async with self.lock:
                     self.state.new_translation.append(new_translation)
                     self.state.new_translation_buffer = new_translation_buffer
+                self._notify_results()
             except Exception as e:
                 logger.warning(f"Exception in translation_processor: {e}")
                 logger.warning(f"Traceback: {traceback.format_exc()}")
         logger.info("Translation processor task finished.")
 
+    async def _archive_old_lines(self, lines: List[Line]) -> List[Line]:
+        """Move the final lines older than the archive horizon to the archive, return the remaining ones."""
+        # only archive lines the client already received in their final state
+        published = self.last_response_content.lines
+        limit = 0
+        while limit < min(len(lines), len(published)) and lines[limit] == published[limit]:
+            limit += 1
+        before = self.state.end_buffer - self.args.archive_horizon
+        if self.translation and self.degradation < SHED_TRANSLATION:
+            # a translation segment arriving after its line was archived would be lost
+            before = min(before, self.tokens_alignment.translated_until)
+        released = self.tokens_alignment.release_lines(lines, before, limit=limit)
+        if not released:
+            return lines
+        records = []
+        for line in released:
+            if line.text or line.speaker == -2:
+                self.archived_lines += 1
+                records.append(line.to_segment_dict(self.archived_lines))
+        await asyncio.to_thread(self.archive.append, records)
+        return lines[len(released):]
+
     async def results_formatter(self) -> AsyncGenerator[FrontData, None]:
-        """Format processing results for output."""
+        """
+        Format processing results for output.
+
+        Waits for the processors to signal a change instead of polling. The
+        changes arriving within `update_coalesce` seconds are published
+        together, at most `max_update_rate` times per second. While a silence
+        is open, the results are also refreshed every `idle_refresh` seconds
+        so that its duration keeps growing.
+        """
+        last_push = 0.0
         while True:
             try:
                 if self._ffmpeg_error:
@@ -401,12 +576,25 @@ class AudioProcessor:
                     await asyncio.sleep(1)
                     continue
 
+                timeout = self.args.idle_refresh if self.current_silence else None
+                try:
+                    await asyncio.wait_for(self._results_changed.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                delay = max(self.args.update_coalesce, last_push + self.min_update_interval - time())
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                self._results_changed.clear()
+                format_start = time()
+
                 self.tokens_alignment.update()
                 lines, buffer_diarization_text, buffer_translation_text = self.tokens_alignment.get_lines(
                     diarization=self.args.diarization,
                     translation=bool(self.translation),
                     current_silence=self.current_silence
                 )
+                if self.archive:
+                    lines = await self._archive_old_lines(lines)
                 state = await self.get_current_state()
 
                 buffer_transcription_text = state.buffer_transcription.text if state.buffer_transcription else ''
@@ -422,23 +610,29 @@ class AudioProcessor:
                     buffer_diarization=buffer_diarization_text,
                     buffer_translation=buffer_translation_text,
                     remaining_time_transcription=state.remaining_time_transcription,
-                    remaining_time_diarization=state.remaining_time_diarization if self.args.diarization else 0
+                    remaining_time_diarization=state.remaining_time_diarization if self.args.diarization else 0,
+                    archived_lines=self.archived_lines,
                 )
                                 
                 should_push = (response != self.last_response_content)
                 if should_push:
+                    if self.tracer:
+                        self.tracer.add(
+                            "results_formatter", format_start, time(),
+                            audio_time=state.end_buffer, args={"lines": len(lines)},
+                        )
                     yield response
                     self.last_response_content = response
+                    last_push = time()
                 
                 if self.is_stopping and self._processing_tasks_done():
                     logger.info("Results formatter: All upstream processors are done and in stopping state. Terminating.")
                     return
                 
-                await asyncio.sleep(0.05)
-                
             except Exception as e:
                 logger.warning(f"Exception in results_formatter. Traceback: {traceback.format_exc()}")
                 await asyncio.sleep(0.5)
+                self._notify_results()
         
     async def create_tasks(self) -> AsyncGenerator[FrontData, None]:
         """Create and start processing tasks."""
@@ -475,6 +669,10 @@ class AudioProcessor:
             self.all_tasks_for_cleanup.append(self.translation_task)
             processing_tasks_for_watchdog.append(self.translation_task)
         
+        # the formatter checks for the end of processing when woken up
+        for task in processing_tasks_for_watchdog:
+            task.add_done_callback(lambda _: self._notify_results())
+
         # Monitor overall system health
         self.watchdog_task = asyncio.create_task(self.watchdog(processing_tasks_for_watchdog))
         self.all_tasks_for_cleanup.append(self.watchdog_task)
@@ -507,7 +705,21 @@ class AudioProcessor:
                 break
             except Exception as e:
                 logger.error(f"Error in watchdog task: {e}", exc_info=True)
-        
+
+    def _route_language(self, language: str) -> Optional[Any]:
+        """Switch the session to the model routed for its detected language (runs in the transcription thread)."""
+        key = self.model_lease.key if self.model_lease else self.models.default_model_key
+        routed_key = self.models.language_route(key, language)
+        if routed_key is None:
+            return None
+        lease = self.models.acquire_model(routed_key)
+        if self.model_lease:
+            self.models.release_model(self.model_lease)
+        self.model_lease = lease
+        self.asr = lease.asr
+        logger.info(f"Detected language {language}: continuing with model {routed_key.model}")
+        return lease.asr
+
     async def cleanup(self) -> None:
         """Clean up resources when processing is complete."""
         logger.info("Starting cleanup of AudioProcessor resources.")
@@ -529,6 +741,21 @@ class AudioProcessor:
                 logger.warning(f"Error stopping FFmpeg manager: {e}")
         if self.diarization:
             self.diarization.close()
+        if self.archive:
+            try:
+                await asyncio.to_thread(self.archive.close, self.args.archive_retention)
+            except OSError as e:
+                logger.warning(f"Could not clean up the transcript archives: {e}")
+        if self.tracer:
+            try:
+                await asyncio.to_thread(self.tracer.save, self.args.trace_dir, self.args.trace_sessions)
+            except OSError as e:
+                logger.warning(f"Could not save the session trace: {e}")
+        if self.transcription and self.models.inference_pool is not None:
+            self.transcription.close()
+        if self.model_lease:
+            self.models.release_model(self.model_lease)
+            self.model_lease = None
         logger.info("AudioProcessor cleanup complete.")
 
     def _processing_tasks_done(self) -> bool:
@@ -549,10 +776,12 @@ class AudioProcessor:
             self.beg_loop = time()
             self.current_silence = Silence(start=0.0, is_starting=True)
             self.tokens_alignment.beg_loop = self.beg_loop
+            self._notify_results()
 
         if not message:
             logger.info("Empty audio message received, initiating stop sequence.")
             self.is_stopping = True
+            self._notify_results()
              
             if self.transcription_queue:
                 await self.transcription_queue.put(SENTINEL)
@@ -565,9 +794,11 @@ class AudioProcessor:
         if self.is_stopping:
             logger.warning("AudioProcessor is stopping. Ignoring incoming audio.")
             return
+        if self.tracer:
+            self.tracer.instant("pcm", bytes=len(message))
 
         if self.is_pcm_input:
-            self.pcm_buffer.extend(message)
+            self.pcm_buffer.write(message)
             await self.handle_pcm_data()
         else:
             if not self.ffmpeg_manager:
@@ -583,22 +814,19 @@ class AudioProcessor:
 
     async def handle_pcm_data(self) -> None:
         # Process when enough data
-        if len(self.pcm_buffer) < self.bytes_per_sec:
+        if len(self.pcm_buffer) < self.samples_per_sec:
             return
 
-        if len(self.pcm_buffer) > self.max_bytes_per_sec:
+        max_samples = self.max_bytes_per_sec // self.bytes_per_sample
+        if len(self.pcm_buffer) > max_samples:
             logger.warning(
-                f"Audio buffer too large: {len(self.pcm_buffer) / self.bytes_per_sec:.2f}s. "
+                f"Audio buffer too large: {len(self.pcm_buffer) / self.samples_per_sec:.2f}s. "
                 f"Consider using a smaller model."
             )
 
-        chunk_size = min(len(self.pcm_buffer), self.max_bytes_per_sec)
-        aligned_chunk_size = (chunk_size // self.bytes_per_sample) * self.bytes_per_sample
-        
-        if aligned_chunk_size == 0:
+        pcm_array = self.pcm_buffer.read(max_samples)
+        if pcm_array.size == 0:
             return
-        pcm_array = self.convert_pcm_to_float(self.pcm_buffer[:aligned_chunk_size])
-        self.pcm_buffer = self.pcm_buffer[aligned_chunk_size:]
 
         num_samples = len(pcm_array)
         chunk_sample_start = self.total_pcm_samples
@@ -606,7 +834,14 @@ class AudioProcessor:
 
         res = None
         if self.args.vac:
-            res = self.vac(pcm_array)
+            vad_start = time()
+            res = await self.vac(pcm_array)
+            vad_end = time()
+            if self.tracer:
+                self.tracer.add(
+                    "vad", vad_start, vad_end, audio_time=chunk_sample_start / self.sample_rate,
+                    args={k: int(v) for k, v in res.items()} if res else None,
+                )
 
         if res is not None:
             if "start" in res and self.current_silence:
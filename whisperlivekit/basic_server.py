@@ -1,13 +1,20 @@
 import asyncio
 import logging
-from contextlib import asynccontextmanager
+import math
+from contextlib import asynccontextmanager, nullcontext
+from typing import Optional
 
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, JSONResponse, Response
 
 from whisperlivekit import (AudioProcessor, TranscriptionEngine,
                             get_inline_ui_html, parse_args)
+from whisperlivekit.latency_controller import MAX_TARGET_LAG
+from whisperlivekit.metrics import render_metrics
+from whisperlivekit.tracing import read_trace
+from whisperlivekit.transcript_archive import get_archive
+from whisperlivekit.wire_protocol import WireProtocol
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 logging.getLogger().setLevel(logging.WARNING)
@@ -16,6 +23,7 @@ logger.setLevel(logging.DEBUG)
 
 args = parse_args()
 transcription_engine = None
+MODEL_QUERY_PARAMS = ("policy", "model", "backend", "language", "task")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):    
@@ -23,7 +31,9 @@ async def lifespan(app: FastAPI):
     transcription_engine = TranscriptionEngine(
         **vars(args),
     )
+    transcription_engine.start_inference_workers()
     yield
+    transcription_engine.stop_inference_workers()
 
 app = FastAPI(lifespan=lifespan)
 app.add_middleware(
@@ -39,14 +49,45 @@ async def get():
     return HTMLResponse(get_inline_ui_html())
 
 
-async def handle_websocket_results(websocket, results_generator):
+@app.get("/archive/{session_id}")
+async def get_archived_segments(session_id: str, from_id: int = 1, to_id: Optional[int] = None):
+    """Segments moved to the archive of a running session, with ids in [from_id, to_id]."""
+    archive = get_archive(session_id, args.archive_dir)
+    if archive is None:
+        raise HTTPException(status_code=404, detail="Unknown session or archive disabled.")
+    return {"segments": await asyncio.to_thread(archive.read, from_id, to_id)}
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus metrics of the server process (`--metrics`)."""
+    if not args.metrics:
+        raise HTTPException(status_code=404, detail="Metrics are disabled.")
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+
+@app.get("/debug/trace/{session_id}")
+async def get_session_trace(session_id: str):
+    """Timeline of the pipeline stages of a session (`--trace-sessions`), in the Chrome trace format."""
+    trace = await asyncio.to_thread(read_trace, session_id, args.trace_dir)
+    if trace is None:
+        raise HTTPException(status_code=404, detail="Unknown session or tracing disabled.")
+    return JSONResponse(
+        trace,
+        headers={"Content-Disposition": f'attachment; filename="wlk-trace-{session_id}.json"'},
+    )
+
+
+async def handle_websocket_results(websocket, results_generator, wire_protocol, tracer=None):
     """Consumes results from the audio processor and sends them via WebSocket."""
     try:
         async for response in results_generator:
-            await websocket.send_json(response.to_dict())
+            with tracer.span("websocket_send") if tracer else nullcontext():
+                await wire_protocol.send(websocket, wire_protocol.encode_response(response))
         # when the results_generator finishes it means all audio has been processed
         logger.info("Results generator finished. Sending 'ready_to_stop' to client.")
-        await websocket.send_json({"type": "ready_to_stop"})
+        await wire_protocol.send(websocket, {"type": "ready_to_stop"})
     except WebSocketDisconnect:
         logger.info("WebSocket disconnected while handling results (client likely closed connection).")
     except Exception as e:
@@ -56,19 +97,87 @@ async def handle_websocket_results(websocket, results_generator):
 @app.websocket("/asr")
 async def websocket_endpoint(websocket: WebSocket):
     global transcription_engine
-    audio_processor = AudioProcessor(
-        transcription_engine=transcription_engine,
-    )
     await websocket.accept()
-    logger.info("WebSocket connection opened.")
+    try:
+        wire_protocol = WireProtocol.from_query_params(websocket.query_params)
+    except (ValueError, ImportError) as e:
+        logger.warning(f"Rejecting WebSocket connection: {e}")
+        await websocket.close(code=1008, reason=str(e)[:120])
+        return
+    try:
+        priority = int(websocket.query_params.get("priority", 0))
+    except ValueError:
+        await websocket.close(code=1008, reason="priority must be an integer")
+        return
+    priority = min(priority, args.max_client_priority)
+    try:
+        target_lag = float(websocket.query_params.get("target_lag", 0))
+    except ValueError:
+        target_lag = math.nan
+    if not 0 <= target_lag <= MAX_TARGET_LAG:  # also rejects nan
+        await websocket.close(code=1008, reason=f"target_lag must be between 0 and {MAX_TARGET_LAG:g} seconds")
+        return
+    model_key = None
+    model_selection = {p: websocket.query_params.get(p) for p in MODEL_QUERY_PARAMS if websocket.query_params.get(p)}
+    if model_selection:
+        try:
+            model_key = transcription_engine.model_key(**model_selection)
+        except ValueError as e:
+            logger.warning(f"Rejecting WebSocket connection: {e}")
+            await websocket.close(code=1008, reason=str(e)[:120])
+            return
+    admission = transcription_engine.admission
+    if admission is not None:
+        refusal = await admission.admit()
+        if refusal is not None:
+            await websocket.close(code=1013, reason=f"Try again later: {refusal}"[:120])
+            return
+    model_lease = None
+    if model_key is not None:
+        try:
+            model_lease = await asyncio.to_thread(transcription_engine.acquire_model, model_key)
+        except Exception as e:
+            logger.error(f"Failed to load model {model_key}: {e}", exc_info=True)
+            if admission is not None:
+                admission.release()
+            await websocket.close(code=1011, reason="Failed to load the model")
+            return
+        logger.info(f"Session model: {model_key}")
+    logger.info(f"WebSocket connection opened ({wire_protocol.protocol} protocol, {wire_protocol.encoding} encoding).")
+    try:
+        audio_processor = AudioProcessor(
+            transcription_engine=transcription_engine,
+            max_update_rate=wire_protocol.max_update_rate,
+            model=model_lease,
+            priority=priority,
+            target_lag=target_lag,
+        )
+    except Exception as e:
+        logger.error(f"Failed to start the session: {e}", exc_info=True)
+        if model_lease is not None:
+            transcription_engine.release_model(model_lease)
+        if admission is not None:
+            admission.release()
+        await websocket.close(code=1011, reason="Failed to start the session")
+        return
+    if admission is not None:
+        admission.attach(audio_processor)
 
     try:
-        await websocket.send_json({"type": "config", "useAudioWorklet": bool(args.pcm_input)})
+        config = {
+            "type": "config",
+            "useAudioWorklet": bool(args.pcm_input),
+            "protocol": wire_protocol.protocol,
+            "encoding": wire_protocol.encoding,
+        }
+        if audio_processor.archive or audio_processor.tracer:
+            config["sessionId"] = audio_processor.session_id
+        await wire_protocol.send(websocket, config)
     except Exception as e:
         logger.warning(f"Failed to send config to client: {e}")
             
     results_generator = await audio_processor.create_tasks()
-    websocket_task = asyncio.create_task(handle_websocket_results(websocket, results_generator))
+    websocket_task = asyncio.create_task(handle_websocket_results(websocket, results_generator, wire_protocol, audio_processor.tracer))
 
     try:
         while True:
@@ -95,6 +204,8 @@ async def websocket_endpoint(websocket: WebSocket):
             logger.warning(f"Exception while awaiting websocket_task completion: {e}")
             
         await audio_processor.cleanup()
+        if admission is not None:
+            admission.release(audio_processor)
         logger.info("WebSocket endpoint cleaned up successfully.")
 
 def main():
@@ -108,6 +219,7 @@ def main():
         "reload": False,
         "log_level": "info",
         "lifespan": "on",
+        "ws_per_message_deflate": not args.no_ws_deflate,
     }
     
     ssl_kwargs = {}
@@ -124,7 +236,13 @@ def main():
     if args.forwarded_allow_ips:
         uvicorn_kwargs = { **uvicorn_kwargs, "forwarded_allow_ips" : args.forwarded_allow_ips }
 
-    uvicorn.run(**uvicorn_kwargs)
+    if args.workers > 1:
+        from whisperlivekit.prefork import run_prefork
+        # models are loaded once, before forking the workers
+        engine = TranscriptionEngine(**vars(args))
+        run_prefork(uvicorn.Config(**uvicorn_kwargs), args.workers, engine)
+    else:
+        uvicorn.run(**uvicorn_kwargs)
 
 if __name__ == "__main__":
     main()
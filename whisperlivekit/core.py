@@ -3,7 +3,11 @@ import sys
 from argparse import Namespace
 
 from whisperlivekit.local_agreement.online_asr import OnlineASRProcessor
-from whisperlivekit.local_agreement.whisper_online import backend_factory
+from whisperlivekit.local_agreement.whisper_online import (asr_with_language,
+                                                           backend_factory)
+from whisperlivekit.model_registry import (ModelKey, ModelLease,
+                                           ModelRegistry,
+                                           parse_language_routes)
 from whisperlivekit.simul_whisper import SimulStreamingASR
 
 
@@ -38,10 +42,42 @@ class TranscriptionEngine:
             "vac": True,
             "vac_onnx": False,
             "vac_chunk_size": 0.04,
+            "vac_batch_window": 0.0,
             "log_level": "DEBUG",
             "ssl_certfile": None,
             "ssl_keyfile": None,
             "forwarded_allow_ips": None,
+            "no_ws_deflate": False,
+            "update_coalesce": 0.02,
+            "max_update_rate": 20.0,
+            "idle_refresh": 1.0,
+            "archive_horizon": 0.0,
+            "archive_dir": None,
+            "archive_retention": 3600.0,
+            "allowed_models": [],
+            "allowed_backends": [],
+            "allowed_policies": [],
+            "model_memory_budget": 0.0,
+            "language_routes": [],
+            "workers": 1,
+            "inference_workers": 0,
+            "inference_slots": 0,
+            "max_client_priority": 0,
+            "cpu_lanes": 0,
+            "lane_threads": 0,
+            "frontend_cores": 1,
+            "pin_lanes": False,
+            "max_sessions": 0,
+            "max_load": 0.0,
+            "max_lag": 0.0,
+            "min_free_memory": 0.0,
+            "admission_timeout": 0.0,
+            "shed_load": False,
+            "target_lag": 0.0,
+            "metrics": False,
+            "trace_sessions": 0,
+            "trace_spans": 20000,
+            "trace_dir": None,
             "transcription": True,
             "vad": True,
             "pcm_input": False,
@@ -79,61 +115,117 @@ class TranscriptionEngine:
         self.tokenizer = None
         self.diarization = None
         self.vac_model = None
+        self.vad_service = None
+
+        self.cpu_topology = None
+        if self.args.cpu_lanes > 0:
+            from whisperlivekit.cpu_topology import CpuTopology
+            self.cpu_topology = CpuTopology.plan(
+                self.args.cpu_lanes,
+                lane_threads=self.args.lane_threads,
+                frontend_cores=self.args.frontend_cores,
+                pin=self.args.pin_lanes,
+            )
+            self.cpu_topology.activate()
+            logger.info(f"CPU topology: {self.cpu_topology.describe()}")
         
         if self.args.vac:
-            from whisperlivekit.silero_vad_iterator import load_silero_vad
+            from whisperlivekit.silero_vad_iterator import (VADService,
+                                                            load_silero_vad)
 
             # Use ONNX if specified, otherwise use JIT (default)
             use_onnx = kwargs.get('vac_onnx', False)
-            self.vac_model = load_silero_vad(onnx=use_onnx)
+            self.vac_model = load_silero_vad(
+                onnx=use_onnx,
+                num_threads=len(self.cpu_topology.frontend) if self.cpu_topology else 1,
+            )
+            # Shared by all sessions, each keeping its own VAD state
+            self.vad_service = VADService(self.vac_model, batch_window=self.args.vac_batch_window)
         
         backend_policy = self.args.backend_policy
+        self._transcription_common_params = transcription_common_params
+        self._simulstreaming_params = update_with_kwargs({
+            "disable_fast_encoder": False,
+            "custom_alignment_heads": None,
+            "frame_threshold": 25,
+            "beams": 1,
+            "decoder_type": None,
+            "audio_max_len": 20.0,
+            "audio_min_len": 0.0,
+            "cif_ckpt_path": None,
+            "never_fire": False,
+            "init_prompt": None,
+            "static_init_prompt": None,
+            "max_context_tokens": None,
+            "encoder_batch_window": 0.0,
+            "encoder_max_batch_size": 8,
+            "decoder_batch_window": 0.0,
+            "decoder_max_batch_size": 16,
+            "static_kv_cache": False,
+            "streaming_mel": False,
+            "audio_ctx_bucket": 0,
+        }, kwargs)
+        self._whisperstreaming_params = update_with_kwargs({
+            "buffer_trimming": "segment",
+            "confidence_validation": False,
+            "buffer_trimming_sec": 15,
+        }, kwargs)
+
+        self.model_registry = None
+        self.default_model_key = None
+        self.inference_pool = None
+        self.inference_scheduler = None
+        inference_slots = self.args.inference_slots
+        if not inference_slots and self.cpu_topology and not self.args.inference_workers:
+            # lanes run in-process: one scheduler slot per lane
+            inference_slots = self.args.cpu_lanes
+        if inference_slots > 0:
+            from whisperlivekit.inference_scheduler import InferenceScheduler
+            self.inference_scheduler = InferenceScheduler(inference_slots, topology=self.cpu_topology)
+        self.admission = None
+        if (self.args.max_sessions or self.args.max_load or self.args.max_lag
+                or self.args.min_free_memory or self.args.shed_load):
+            from whisperlivekit.admission import AdmissionController
+            self.admission = AdmissionController(
+                # number of model calls that can run in parallel
+                capacity=inference_slots or self.args.inference_workers or self.args.cpu_lanes or 1,
+                max_sessions=self.args.max_sessions,
+                max_load=self.args.max_load,
+                max_lag=self.args.max_lag,
+                min_free_memory=int(self.args.min_free_memory * 2**30),
+                queue_timeout=self.args.admission_timeout,
+                shed_load=self.args.shed_load,
+                scheduler=self.inference_scheduler,
+            )
+        if self.args.metrics:
+            from whisperlivekit.metrics import enable_metrics
+            enable_metrics(self)
+        self.language_routes = parse_language_routes(self.args.language_routes)
         if self.args.transcription:
-            if backend_policy == "simulstreaming":                 
-                simulstreaming_params = {
-                    "disable_fast_encoder": False,
-                    "custom_alignment_heads": None,
-                    "frame_threshold": 25,
-                    "beams": 1,
-                    "decoder_type": None,
-                    "audio_max_len": 20.0,
-                    "audio_min_len": 0.0,
-                    "cif_ckpt_path": None,
-                    "never_fire": False,
-                    "init_prompt": None,
-                    "static_init_prompt": None,
-                    "max_context_tokens": None,
-                }
-                simulstreaming_params = update_with_kwargs(simulstreaming_params, kwargs)
-                
-                self.tokenizer = None        
-                self.asr = SimulStreamingASR(
-                    **transcription_common_params,
-                    **simulstreaming_params,
+            self.model_registry = ModelRegistry(
+                build=self._build_asr,
+                share=self._share_asr,
+                memory_budget=int(self.args.model_memory_budget * 2**30),
+            )
+            self.default_model_key = ModelKey(
+                policy=backend_policy,
+                model=self.args.model_path or self.args.model_dir or self.args.model_size,
+                backend=self.args.backend,
+                language=self.args.lan,
+                task="translate" if self.args.direct_english_translation else "transcribe",
+            )
+            self.asr = self.model_registry.acquire(self.default_model_key, pin=True)
+            if self.language_routes and backend_policy != "simulstreaming":
+                logger.warning("Language routes are only supported by the SimulStreaming policy, ignoring them")
+                self.language_routes = {}
+            for language, model in self.language_routes.items():
+                # routed models are loaded upfront, so that sessions switch without waiting
+                self.model_registry.acquire(ModelKey(
+                    policy=backend_policy,
+                    model=model,
                     backend=self.args.backend,
-                )
-                logger.info(
-                    "Using SimulStreaming policy with %s backend",
-                    getattr(self.asr, "encoder_backend", "whisper"),
-                )
-            else:
-                
-                whisperstreaming_params = {
-                    "buffer_trimming": "segment",
-                    "confidence_validation": False,
-                    "buffer_trimming_sec": 15,
-                }
-                whisperstreaming_params = update_with_kwargs(whisperstreaming_params, kwargs)
-                
-                self.asr = backend_factory(
-                    backend=self.args.backend,
-                    **transcription_common_params,
-                    **whisperstreaming_params,
-                )
-                logger.info(
-                    "Using LocalAgreement policy with %s backend",
-                    getattr(self.asr, "backend_choice", self.asr.__class__.__name__),
-                )
+                    language="auto" if language == "*" else language,
+                ), pin=True)
 
         if self.args.diarization:
             if self.args.diarization_backend == "diart":
@@ -170,6 +262,129 @@ class TranscriptionEngine:
                 self.translation_model = load_model([self.args.lan], **translation_params) #in the future we want to handle different languages for different speakers
         TranscriptionEngine._initialized = True
 
+    def start_inference_workers(self) -> None:
+        """Start the inference worker pool (--inference-workers), in the process serving the sessions."""
+        if self.args.inference_workers > 0 and self.args.transcription and self.inference_pool is None:
+            from whisperlivekit.inference_workers import InferencePool
+            self.inference_pool = InferencePool(self, self.args.inference_workers)
+
+    def stop_inference_workers(self) -> None:
+        if self.inference_pool is not None:
+            self.inference_pool.close()
+            self.inference_pool = None
+
+    def _build_asr(self, key: ModelKey):
+        """Load the ASR of a model configuration."""
+        common_params = dict(self._transcription_common_params)
+        if key.model != self.default_model_key.model:
+            # clients can only select models by name
+            common_params.update(model_size=key.model, model_path=None, model_dir=None)
+        common_params.update(
+            lan=key.language,
+            direct_english_translation=key.task == "translate",
+        )
+        if key.policy == "simulstreaming":
+            asr = SimulStreamingASR(
+                **common_params,
+                **self._simulstreaming_params,
+                backend=key.backend,
+            )
+            logger.info(
+                "Using SimulStreaming policy with %s backend",
+                getattr(asr, "encoder_backend", "whisper"),
+            )
+        else:
+            asr = backend_factory(
+                backend=key.backend,
+                **common_params,
+                **self._whisperstreaming_params,
+            )
+            logger.info(
+                "Using LocalAgreement policy with %s backend",
+                getattr(asr, "backend_choice", asr.__class__.__name__),
+            )
+        return asr
+
+    @staticmethod
+    def _share_asr(asr, key: ModelKey):
+        translate = key.task == "translate"
+        if key.policy == "simulstreaming":
+            return asr.with_language(key.language, translate)
+        return asr_with_language(asr, key.language, translate)
+
+    def model_key(self, policy=None, model=None, backend=None, language=None, task=None) -> ModelKey:
+        """
+        Model configuration of a session: the server configuration, overridden
+        by the given values. Raises ValueError if the selection is not allowed.
+        """
+        default = self.default_model_key
+        if default is None:
+            raise ValueError("Transcription is disabled on this server")
+        policy = {"1": "simulstreaming", "2": "localagreement"}.get(policy, policy) or default.policy
+        if policy not in ("simulstreaming", "localagreement"):
+            raise ValueError(f"Unknown policy '{policy}'")
+        # each policy/backend loads its own copy of the weights: only the ones listed by the operator
+        if policy != default.policy and policy not in self.args.allowed_policies:
+            raise ValueError(f"Policy '{policy}' is not available on this server")
+        model = model or default.model
+        if model != default.model and model not in self.args.allowed_models:
+            raise ValueError(f"Model '{model}' is not available on this server")
+        backend = backend or default.backend
+        if backend != default.backend and backend not in self.args.allowed_backends:
+            raise ValueError(f"Backend '{backend}' is not available on this server")
+        language = language or (default.language if model == default.model else "auto")
+        if model.endswith(".en"):
+            language = "en"
+        task = task or default.task
+        if task not in ("transcribe", "translate"):
+            raise ValueError(f"Unknown task '{task}'")
+        if task == "translate" and language == "auto":
+            raise ValueError("Translation to English requires a source language")
+        if self.translation_model and language != self.args.lan:
+            raise ValueError("The language cannot be changed when translation is enabled")
+        return ModelKey(policy, model, backend, language, task)
+
+    def language_route(self, key: ModelKey, language: str):
+        """
+        Model configuration that a session of configuration `key` continues
+        with once its language is detected, or None if it keeps its model.
+        Only sessions on the server model with automatic language detection
+        are routed.
+        """
+        if (
+            key.policy != "simulstreaming"
+            or key.language != "auto"
+            or key.task != "transcribe"
+            or key.model != self.default_model_key.model
+        ):
+            return None
+        model = self.language_routes.get(language, self.language_routes.get("*"))
+        if model is None or model == key.model or (model.endswith(".en") and language != "en"):
+            return None
+        return ModelKey(key.policy, model, key.backend, language, key.task)
+
+    def acquire_model(self, key: ModelKey) -> ModelLease:
+        """
+        ASR and session arguments of a model configuration, loading it if
+        needed (blocking). Must be paired with `release_model`. With inference
+        workers, the model is loaded by the worker of the session instead.
+        """
+        asr = self.model_registry.acquire(key) if self.inference_pool is None else None
+        args = Namespace(**{
+            **vars(self.args),
+            "backend_policy": key.policy,
+            "backend": key.backend,
+            "lan": key.language,
+            "direct_english_translation": key.task == "translate",
+        })
+        if key.model != self.default_model_key.model:
+            args.model_size, args.model_path, args.model_dir = key.model, None, None
+        return ModelLease(key, asr, args)
+
+    def release_model(self, lease: ModelLease) -> None:
+        if lease.asr is not None:
+            self.model_registry.release(lease.key)
+
 
 def online_factory(args, asr):
     if args.backend_policy == "simulstreaming":    
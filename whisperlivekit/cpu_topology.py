@@ -0,0 +1,128 @@
+import glob
+import logging
+import os
+import re
+from dataclasses import dataclass
+from typing import List, Optional
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+_current: Optional["CpuTopology"] = None
+
+
+def current_topology() -> Optional["CpuTopology"]:
+    """Topology configured by the engine (`--cpu-lanes`), if any."""
+    return _current
+
+
+def _parse_cpulist(cpulist: str) -> List[int]:
+    cores = []
+    for part in cpulist.strip().split(","):
+        if not part:
+            continue
+        first, _, last = part.partition("-")
+        cores.extend(range(int(first), int(last or first) + 1))
+    return cores
+
+
+def available_cores() -> List[int]:
+    """Cores this process may run on, grouped by NUMA node."""
+    if hasattr(os, "sched_getaffinity"):
+        allowed = set(os.sched_getaffinity(0))
+    else:
+        allowed = set(range(os.cpu_count() or 1))
+    ordered = []
+    nodes = sorted(glob.glob("/sys/devices/system/node/node[0-9]*"), key=lambda p: int(re.findall(r"\d+$", p)[0]))
+    for node in nodes:
+        try:
+            with open(os.path.join(node, "cpulist")) as f:
+                ordered.extend(c for c in _parse_cpulist(f.read()) if c in allowed and c not in ordered)
+        except OSError:
+            continue
+    ordered.extend(sorted(allowed - set(ordered)))
+    return ordered
+
+
+def _pin(cores: List[int]) -> None:
+    if not hasattr(os, "sched_setaffinity"):
+        logger.warning("Core pinning is not supported on this platform")
+        return
+    # pins the calling thread; threads and processes it starts inherit the mask
+    os.sched_setaffinity(0, cores)
+
+
+@dataclass
+class CpuTopology:
+    """
+    Split of the cores of the machine between the frontend (event loop,
+    FFmpeg, VAD, diarization) and N inference lanes. A lane runs one
+    model call at a time (a scheduler slot, an inference worker or a
+    batcher thread) with `threads_per_lane` torch intra-op threads, so
+    that the lanes together use each core once. Lanes are contiguous
+    slices of the cores ordered by NUMA node, so they do not straddle
+    nodes when the cores divide evenly.
+    """
+    frontend: List[int]
+    lanes: List[List[int]]
+    threads_per_lane: int
+    pin: bool = False
+
+    @classmethod
+    def plan(
+        cls,
+        n_lanes: int,
+        lane_threads: int = 0,
+        frontend_cores: int = 1,
+        pin: bool = False,
+        cores: Optional[List[int]] = None,
+    ) -> "CpuTopology":
+        cores = cores if cores is not None else available_cores()
+        n_lanes = max(1, n_lanes)
+        frontend_cores = min(frontend_cores, max(0, len(cores) - n_lanes))
+        frontend = cores[:frontend_cores] or cores
+        rest = cores[frontend_cores:] or cores
+        if n_lanes >= len(rest):
+            lanes = [[rest[i % len(rest)]] for i in range(n_lanes)]
+        else:
+            size, extra = divmod(len(rest), n_lanes)
+            lanes, start = [], 0
+            for i in range(n_lanes):
+                end = start + size + (1 if i < extra else 0)
+                lanes.append(rest[start:end])
+                start = end
+        threads = lane_threads or min(len(lane) for lane in lanes)
+        return cls(frontend=frontend, lanes=lanes, threads_per_lane=threads, pin=pin)
+
+    def describe(self) -> str:
+        lanes = " ".join(f"[{','.join(map(str, lane))}]" for lane in self.lanes)
+        return (
+            f"frontend cores [{','.join(map(str, self.frontend))}], {len(self.lanes)} lanes {lanes}, "
+            f"{self.threads_per_lane} threads per lane{', pinned' if self.pin else ''}"
+        )
+
+    def lane_cores(self, index: int) -> List[int]:
+        return self.lanes[index % len(self.lanes)]
+
+    def enter_lane(self, index: int) -> None:
+        """Run the calling thread (or process) in lane `index`."""
+        torch.set_num_threads(self.threads_per_lane)
+        if self.pin:
+            _pin(self.lane_cores(index))
+
+    def enter_frontend(self) -> None:
+        if self.pin:
+            _pin(self.frontend)
+
+    def activate(self) -> None:
+        """Make this topology the one used by the threads started from now on."""
+        global _current
+        _current = self
+        try:
+            # one inter-op thread per process: the lanes provide the parallelism
+            torch.set_num_interop_threads(1)
+        except RuntimeError:
+            pass  # already set, or inter-op work already started
+        torch.set_num_threads(self.threads_per_lane)
+        self.enter_frontend()
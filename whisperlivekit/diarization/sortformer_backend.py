@@ -8,6 +8,7 @@ from typing import List, Optional
 import numpy as np
 import torch
 
+from whisperlivekit import metrics
 from whisperlivekit.timed_objects import SpeakerSegment
 
 logger = logging.getLogger(__name__)
@@ -173,7 +174,7 @@ class SortformerDiarizationOnline:
     def insert_audio_chunk(self, pcm_array: np.ndarray):
         if self.debug:
             self.audio_buffer.append(pcm_array.copy())
-        self.buffer_audio = np.concatenate([self.buffer_audio, pcm_array.copy()])
+        self.buffer_audio = np.concatenate([self.buffer_audio, pcm_array])
   
 
     async def diarize(self):
@@ -191,6 +192,7 @@ class SortformerDiarizationOnline:
         
         audio = self.buffer_audio[:threshold]
         self.buffer_audio = self.buffer_audio[threshold:]
+        diarize_start = time.perf_counter()
         
         device = self.diar_model.device
         audio_signal_chunk = torch.tensor(audio, device=device).unsqueeze(0)
@@ -225,6 +227,7 @@ class SortformerDiarizationOnline:
                 right_offset=right_offset,
             )                
         new_segments = self._process_predictions()
+        metrics.observe_stage("diarization", time.perf_counter() - diarize_start)
         
         self._chunk_index += 1
         return new_segments
@@ -4,6 +4,8 @@ import logging
 from enum import Enum
 from typing import Callable, Optional
 
+from whisperlivekit import metrics
+
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
@@ -169,6 +171,7 @@ class FFmpegManager:
             self.state = FFmpegState.RESTARTING
 
         logger.info("Restarting FFmpeg...")
+        metrics.ffmpeg_event("restart")
 
         try:
             await self.stop()
@@ -0,0 +1,106 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import threading
+import weakref
+from typing import Any, Callable, List, Optional, Tuple
+
+import torch
+
+from whisperlivekit.cpu_topology import CpuTopology
+
+logger = logging.getLogger(__name__)
+
+_schedulers: "weakref.WeakSet[InferenceScheduler]" = weakref.WeakSet()
+
+
+def _restart_schedulers() -> None:
+    # threads do not survive fork (pre-forked workers): each process gets its own slots
+    for scheduler in list(_schedulers):
+        scheduler._start()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_restart_schedulers)
+
+
+def _resolve(future: asyncio.Future, result: Any, error: BaseException) -> None:
+    if future.done():  # the session was cancelled while its call was running
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+
+class InferenceScheduler:
+    """
+    Bounded set of inference slots shared by all the sessions of the process.
+
+    Sessions submit their blocking model calls (`process_iter`, translation)
+    with a deadline: the wall-clock time at which the audio they process
+    would have been handled with no lag (`beg_loop + end_buffer`). A free
+    slot always runs the pending call with the highest priority class, then
+    the earliest deadline, i.e. the session that is furthest behind. Torch
+    intra-op threads are split between the slots, so that the CPU is not
+    oversubscribed; with a CPU topology, slot i runs in lane i.
+    """
+
+    def __init__(self, slots: int, topology: Optional[CpuTopology] = None) -> None:
+        self.slots = max(1, slots)
+        self.topology = topology
+        if topology is None:
+            torch.set_num_threads(max(1, (os.cpu_count() or 1) // self.slots))
+        self._start()
+        _schedulers.add(self)
+
+    def _start(self) -> None:
+        self._pending: List[Tuple[int, float, int, Callable, tuple, asyncio.AbstractEventLoop, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._condition = threading.Condition()
+        self.busy = 0
+        self._threads = [
+            threading.Thread(target=self._worker, args=(i,), name=f"wlk-inference-slot-{i}", daemon=True)
+            for i in range(self.slots)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    @property
+    def queue_length(self) -> int:
+        return len(self._pending)
+
+    async def run(self, fn: Callable, *args: Any, deadline: float, priority: int = 0) -> Any:
+        """Run `fn(*args)` in a slot; higher `priority` classes are always served first."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._condition:
+            heapq.heappush(self._pending, (-priority, deadline, next(self._seq), fn, args, loop, future))
+            self._condition.notify()
+        return await future
+
+    def _worker(self, index: int) -> None:
+        if self.topology is not None:
+            self.topology.enter_lane(index)
+        while True:
+            with self._condition:
+                while not self._pending:
+                    self._condition.wait()
+                _, _, _, fn, args, loop, future = heapq.heappop(self._pending)
+                if future.cancelled():
+                    continue
+                self.busy += 1
+            result, error = None, None
+            try:
+                result = fn(*args)
+            except BaseException as e:
+                error = e
+            finally:
+                with self._condition:
+                    self.busy -= 1
+            try:
+                loop.call_soon_threadsafe(_resolve, future, result, error)
+            except RuntimeError:  # the event loop was closed
+                logger.debug("Dropping the result of an inference call: event loop closed")
@@ -0,0 +1,384 @@
+import gc
+import itertools
+import logging
+import multiprocessing as mp
+import os
+import queue
+import threading
+from concurrent.futures import Future
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import torch
+
+from whisperlivekit.backend_support import (faster_backend_available,
+                                            mlx_backend_available)
+from whisperlivekit.cpu_topology import CpuTopology
+from whisperlivekit.model_registry import ModelKey
+from whisperlivekit.timed_objects import ASRToken, Transcript
+
+logger = logging.getLogger(__name__)
+
+SAMPLING_RATE = 16000
+RING_SECONDS = 30  # audio that can be in flight between a session and its worker
+
+
+class SharedAudioRing:
+    """
+    Float32 ring buffer in shared memory, written by the web process and read
+    by the inference worker of the session. Positions are absolute sample
+    counts; the writer makes sure that unread samples are not overwritten.
+    """
+
+    def __init__(self, capacity: int, name: Optional[str] = None) -> None:
+        self.capacity = capacity
+        self._shm = SharedMemory(name=name, create=name is None, size=capacity * 4)
+        if name is not None:
+            # attached by a worker: the segment is owned (and unlinked) by the web process
+            resource_tracker.unregister(self._shm._name, "shared_memory")
+        self.name = self._shm.name
+        self._samples = np.ndarray((capacity,), dtype=np.float32, buffer=self._shm.buf)
+
+    def write(self, pos: int, audio: np.ndarray) -> None:
+        start = pos % self.capacity
+        head = min(len(audio), self.capacity - start)
+        self._samples[start:start + head] = audio[:head]
+        self._samples[:len(audio) - head] = audio[head:]
+
+    def read(self, pos: int, n: int) -> np.ndarray:
+        start = pos % self.capacity
+        head = min(n, self.capacity - start)
+        if head == n:
+            return self._samples[start:start + n].copy()
+        return np.concatenate([self._samples[start:], self._samples[:n - head]])
+
+    def close(self, unlink: bool = False) -> None:
+        self._samples = None
+        self._shm.close()
+        if unlink:
+            self._shm.unlink()
+
+
+class _WorkerSession:
+    """Decoder state of a session, living in an inference worker."""
+
+    def __init__(self, engine: Any, key: Optional[ModelKey], ring_name: str, ring_capacity: int) -> None:
+        from whisperlivekit.core import online_factory
+
+        self.engine = engine
+        self.lease = engine.acquire_model(key) if key is not None else None
+        args = self.lease.args if self.lease else engine.args
+        asr = self.lease.asr if self.lease else engine.asr
+        self.online = online_factory(args, asr)
+        if engine.language_routes and args.backend_policy == "simulstreaming":
+            self.online.language_router = self._route_language
+        self.ring = SharedAudioRing(ring_capacity, name=ring_name)
+
+    def _route_language(self, language: str) -> Optional[Any]:
+        key = self.lease.key if self.lease else self.engine.default_model_key
+        routed_key = self.engine.language_route(key, language)
+        if routed_key is None:
+            return None
+        lease = self.engine.acquire_model(routed_key)
+        if self.lease:
+            self.engine.release_model(self.lease)
+        self.lease = lease
+        return lease.asr
+
+    def audio(self, pos: Optional[int], n: int, end_time: float, inline: Optional[np.ndarray]) -> None:
+        samples = inline if inline is not None else self.ring.read(pos, n)
+        self.online.insert_audio_chunk(samples, end_time)
+
+    def process_iter(self) -> Tuple[List[ASRToken], float, Transcript]:
+        tokens, processed_upto = self.online.process_iter()
+        return tokens, processed_upto, self.online.get_buffer()
+
+    def start_silence(self) -> Tuple[List[ASRToken], float, Transcript]:
+        tokens, processed_upto = self.online.start_silence()
+        return tokens, processed_upto, self.online.get_buffer()
+
+    def end_silence(self, silence_duration: float, offset: float) -> None:
+        self.online.end_silence(silence_duration, offset)
+
+    def new_speaker(self, change_speaker: Any) -> None:
+        self.online.new_speaker(change_speaker)
+
+    def trim_committed(self, before: float) -> None:
+        self.online.trim_committed(before)
+
+    def tune(self, params: Dict[str, Any]) -> None:
+        if hasattr(self.online, "tune"):
+            self.online.tune(**params)
+
+    def close(self) -> None:
+        self.ring.close()
+        if self.lease:
+            self.engine.release_model(self.lease)
+            self.lease = None
+
+
+def _worker_main(
+    conn: Any,
+    engine_kwargs: Dict[str, Any],
+    num_threads: int,
+    topology: Optional[CpuTopology],
+    index: int,
+) -> None:
+    from whisperlivekit.core import TranscriptionEngine
+
+    if topology is not None:
+        topology.enter_lane(index)
+    else:
+        torch.set_num_threads(num_threads)
+    # reused as is when forked from a loaded engine, loaded otherwise
+    engine = TranscriptionEngine(**engine_kwargs)
+    engine.inference_pool = None
+    sessions: Dict[int, _WorkerSession] = {}
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            break
+        if message is None:
+            break
+        op, session_id, request_id, payload = message
+        result: Any = None
+        try:
+            if op == "open":
+                sessions[session_id] = _WorkerSession(engine, *payload)
+            elif op == "close":
+                session = sessions.pop(session_id, None)
+                if session:
+                    session.close()
+            else:
+                result = getattr(sessions[session_id], op)(*payload)
+        except Exception as e:
+            logger.exception(f"Inference worker error in {op} for session {session_id}: {e}")
+            result = e
+        if request_id is not None:
+            conn.send((request_id, result))
+    for session in sessions.values():
+        session.close()
+
+
+class _WorkerChannel:
+    """
+    Pipe to an inference worker: requests are matched to replies by id.
+
+    Messages are written to the pipe by a sender thread, in the order they
+    are queued: `send` is called from the event loop and must not block
+    when the worker is busy and the pipe is full. Once the worker exited,
+    `error` is set: messages are dropped and calls raise it.
+    """
+
+    def __init__(self, process: Any, conn: Any) -> None:
+        self.process = process
+        self.n_sessions = 0
+        self.error: Optional[Exception] = None
+        self._closing = False
+        self._conn = conn
+        self._lock = threading.Lock()
+        self._outbox: "queue.SimpleQueue[Optional[Tuple]]" = queue.SimpleQueue()
+        self._pending: Dict[int, Future] = {}
+        self._ids = itertools.count()
+        self._sender = threading.Thread(target=self._send_messages, name=f"{process.name}-sender", daemon=True)
+        self._sender.start()
+        self._reader = threading.Thread(target=self._read_replies, name=f"{process.name}-replies", daemon=True)
+        self._reader.start()
+
+    @property
+    def alive(self) -> bool:
+        return self.error is None and self.process.is_alive()
+
+    def send(self, op: str, session_id: int, payload: Tuple = ()) -> None:
+        if self.error is None:
+            self._outbox.put((op, session_id, None, payload))
+
+    def call(self, op: str, session_id: int, payload: Tuple = ()) -> Any:
+        """Run `op` in the worker and wait for its result (blocking)."""
+        future: Future = Future()
+        with self._lock:
+            if self.error is not None:
+                raise self.error
+            request_id = next(self._ids)
+            self._pending[request_id] = future
+        self._outbox.put((op, session_id, request_id, payload))
+        result = future.result()
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def _send_messages(self) -> None:
+        while True:
+            message = self._outbox.get()
+            try:
+                self._conn.send(message)
+            except (BrokenPipeError, OSError):
+                break  # the worker exited: the reader fails the pending calls
+            if message is None:
+                break
+
+    def _read_replies(self) -> None:
+        while True:
+            try:
+                request_id, result = self._conn.recv()
+            except (EOFError, OSError):
+                break
+            future = self._pending.pop(request_id, None)
+            if future is not None:
+                future.set_result(result)
+        with self._lock:
+            self.error = RuntimeError(f"Inference worker {self.process.name} exited")
+            pending, self._pending = list(self._pending.values()), {}
+        if not self._closing:
+            logger.error(f"Inference worker {self.process.name} exited, failing its {len(pending)} pending calls")
+        for future in pending:
+            future.set_result(self.error)
+
+    def close(self) -> None:
+        self._closing = True
+        self._outbox.put(None)
+        self._sender.join(timeout=5)
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.terminate()
+        self._conn.close()
+
+
+class RemoteTranscription:
+    """
+    Online processor of a session whose decoder runs in an inference worker.
+
+    It has the interface of the local online processors used by the
+    AudioProcessor. Audio is written to a shared-memory ring and only its
+    position is sent to the worker; `process_iter` and `start_silence` block
+    until the worker replies (they are called from a thread), the other
+    calls are asynchronous and ordered after the previous ones.
+    """
+    SAMPLING_RATE = SAMPLING_RATE
+
+    def __init__(self, channel: _WorkerChannel, session_id: int, key: Optional[ModelKey], sep: str) -> None:
+        self.asr = SimpleNamespace(sep=sep)
+        self._channel = channel
+        self._session_id = session_id
+        self._ring = SharedAudioRing(RING_SECONDS * SAMPLING_RATE)
+        self._written = 0  # absolute position of the next sample written to the ring
+        self._read = 0  # samples before this position were consumed by the worker
+        self._buffer = Transcript.from_tokens([], sep="")
+        channel.n_sessions += 1
+        channel.send("open", session_id, (key, self._ring.name, self._ring.capacity))
+
+    def insert_audio_chunk(self, audio: np.ndarray, audio_stream_end_time: float) -> None:
+        audio = np.asarray(audio, dtype=np.float32)
+        if self._written + len(audio) - self._read <= self._ring.capacity:
+            self._ring.write(self._written, audio)
+            payload = (self._written, len(audio), audio_stream_end_time, None)
+            self._written += len(audio)
+        else:
+            # the worker lags behind: send the samples with the message
+            payload = (None, len(audio), audio_stream_end_time, audio)
+        self._channel.send("audio", self._session_id, payload)
+
+    def _call(self, op: str) -> Tuple[List[ASRToken], float]:
+        written = self._written
+        tokens, processed_upto, self._buffer = self._channel.call(op, self._session_id)
+        self._read = written
+        return tokens, processed_upto
+
+    def process_iter(self) -> Tuple[List[ASRToken], float]:
+        return self._call("process_iter")
+
+    def start_silence(self) -> Tuple[List[ASRToken], float]:
+        return self._call("start_silence")
+
+    def end_silence(self, silence_duration: float, offset: float) -> None:
+        self._channel.send("end_silence", self._session_id, (silence_duration, offset))
+
+    def new_speaker(self, change_speaker: Any) -> None:
+        self._channel.send("new_speaker", self._session_id, (change_speaker,))
+
+    def trim_committed(self, before: float) -> None:
+        self._channel.send("trim_committed", self._session_id, (before,))
+
+    def tune(self, **params: Any) -> None:
+        self._channel.send("tune", self._session_id, (params,))
+
+    def get_buffer(self) -> Transcript:
+        return self._buffer
+
+    def close(self) -> None:
+        self._channel.send("close", self._session_id)
+        self._channel.n_sessions -= 1
+        # the worker only closes its mapping, the segment is removed here
+        self._ring.close(unlink=True)
+
+
+def _separator(engine: Any, key: Optional[ModelKey]) -> str:
+    """Word separator of the ASR of a session, without loading it in this process."""
+    policy = key.policy if key else engine.args.backend_policy
+    if policy == "simulstreaming":
+        return ""
+    if key is None or key.weights_key == engine.default_model_key.weights_key:
+        return engine.asr.sep
+    backend = key.backend
+    if backend == "auto":
+        backend = "mlx-whisper" if mlx_backend_available() else "faster-whisper" if faster_backend_available() else "whisper"
+    return " " if backend == "whisper" else ""
+
+
+class InferencePool:
+    """
+    Processes running the transcription decoders of the sessions, so that the
+    web process only handles sockets, FFmpeg, VAD and formatting.
+
+    Workers are forked from the loaded engine and share its weights; when
+    CUDA is initialized (it cannot be forked), they are spawned and load
+    their own models. A session is assigned to the live worker with the fewest
+    sessions and keeps its decoder state there. With a CPU topology, worker
+    i runs in lane i.
+    """
+
+    def __init__(self, engine: Any, workers: int) -> None:
+        self.engine = engine
+        engine_kwargs = {
+            **vars(engine.args),
+            "diarization": False,
+            "target_language": "",
+            "inference_workers": 0,
+        }
+        start_method = "spawn" if torch.cuda.is_initialized() else "fork"
+        context = mp.get_context(start_method)
+        num_threads = max(1, (os.cpu_count() or 1) // workers)
+        if engine.cpu_topology is not None:
+            num_threads = engine.cpu_topology.threads_per_lane
+        self._session_ids = itertools.count()
+        self._channels: List[_WorkerChannel] = []
+        if start_method == "fork":
+            gc.collect()
+            gc.freeze()
+        for i in range(workers):
+            parent_conn, child_conn = context.Pipe()
+            process = context.Process(
+                target=_worker_main,
+                args=(child_conn, engine_kwargs, num_threads, engine.cpu_topology, i),
+                name=f"wlk-inference-{i}",
+                daemon=True,
+            )
+            process.start()
+            child_conn.close()
+            self._channels.append(_WorkerChannel(process, parent_conn))
+        logger.info(f"Started {workers} inference workers ({start_method}, {num_threads} threads each)")
+
+    def open_session(self, key: Optional[ModelKey] = None) -> RemoteTranscription:
+        channels = [channel for channel in self._channels if channel.alive]
+        if not channels:
+            raise RuntimeError("No inference worker left")
+        channel = min(channels, key=lambda c: c.n_sessions)
+        return RemoteTranscription(channel, next(self._session_ids), key, _separator(self.engine, key))
+
+    def close(self) -> None:
+        for channel in self._channels:
+            channel.close()
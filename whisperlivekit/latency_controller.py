@@ -0,0 +1,119 @@
+import logging
+import math
+from time import monotonic
+from typing import Any, Dict, Optional
+
+from whisperlivekit.whisper.audio import TOKENS_PER_SECOND
+
+logger = logging.getLogger(__name__)
+
+EMA_WEIGHT = 0.3  # weight of the last measure in the smoothed latency and compute time
+HEADROOM = 0.7  # the settings are relaxed while the latency is under HEADROOM x target
+TIGHTEN_INTERVAL = 1.0  # minimum seconds between two tightening steps
+RELAX_INTERVAL = 3.0  # minimum seconds between two relaxing steps
+MIN_CONTEXT_SCALE = 0.25
+MIN_AUDIO_SCALE = 0.5
+MAX_TARGET_LAG = 30.0  # seconds; a larger budget is not a live session
+
+
+class LatencyController:
+    """
+    Feedback controller keeping the caption latency of a session under its
+    `target_lag` while spending as little compute as the budget allows.
+
+    The latency is estimated after each decoder call as the lag of the
+    processed audio behind the stream plus the audio that `frame_threshold`
+    keeps undecoded. Over the target, the settings are tightened at once:
+    the decoder runs on every chunk, `frame_threshold` is lowered and, when
+    the calls themselves are slow, the text context and audio buffer are
+    shortened. With headroom, they are relaxed one step at a time, cheapest
+    to restore first: context and audio buffer back to their configured
+    size, then a larger `frame_threshold` (fewer corrections), then a
+    longer decode cadence (fewer encoder passes).
+
+    `frame_threshold` is None for backends that don't have it (LocalAgreement):
+    only the cadence is controlled.
+    """
+
+    def __init__(self, target_lag: float, min_chunk_size: float, frame_threshold: Optional[int] = None) -> None:
+        if not (math.isfinite(target_lag) and 0 < target_lag <= MAX_TARGET_LAG):
+            raise ValueError(f"target_lag must be between 0 and {MAX_TARGET_LAG:g} seconds, got {target_lag}")
+        self.target_lag = target_lag
+        self.min_chunk_size = min_chunk_size
+        self.max_cadence = max(0.0, target_lag / 2)
+        self.cadence = 0.0  # seconds of audio between decoder calls, 0: every chunk
+        self.base_frame_threshold = frame_threshold
+        self.frame_threshold = frame_threshold
+        if frame_threshold is not None:
+            self.min_frame_threshold = max(4, frame_threshold // 2)
+            # the undecoded audio may use up to half of the budget
+            self.max_frame_threshold = max(frame_threshold, int(target_lag * TOKENS_PER_SECOND / 2))
+        self.context_scale = 1.0
+        self.audio_scale = 1.0
+        self.latency: Optional[float] = None
+        self.compute_time: Optional[float] = None
+        self._last_change = monotonic()
+
+    def _smooth(self, previous: Optional[float], value: float) -> float:
+        return value if previous is None else (1 - EMA_WEIGHT) * previous + EMA_WEIGHT * value
+
+    def decoder_params(self) -> Dict[str, Any]:
+        """Settings of the decoder, passed to the `tune` method of the online processor."""
+        return {
+            "frame_threshold": self.frame_threshold,
+            "context_scale": self.context_scale,
+            "audio_scale": self.audio_scale,
+        }
+
+    def update(self, lag: float, compute_time: float) -> bool:
+        """
+        Account for a decoder call that took `compute_time` seconds, after
+        which the processed audio is `lag` seconds behind the stream.
+        Returns True when the decoder settings changed.
+        """
+        undecoded = (self.frame_threshold or 0) / TOKENS_PER_SECOND
+        self.latency = self._smooth(self.latency, lag + undecoded)
+        self.compute_time = self._smooth(self.compute_time, compute_time)
+        now = monotonic()
+        if self.latency > self.target_lag:
+            if now - self._last_change < TIGHTEN_INTERVAL:
+                return False
+            self._last_change = now
+            return self._tighten()
+        if self.latency < HEADROOM * self.target_lag:
+            if now - self._last_change < RELAX_INTERVAL:
+                return False
+            self._last_change = now
+            return self._relax()
+        return False
+
+    def _tighten(self) -> bool:
+        before = self.decoder_params()
+        self.cadence = 0.0
+        if self.frame_threshold is not None:
+            self.frame_threshold = max(self.min_frame_threshold, self.frame_threshold - 4)
+        # the calls take most of the time between two chunks: make them cheaper
+        if self.compute_time > self.min_chunk_size / 2:
+            self.context_scale = max(MIN_CONTEXT_SCALE, self.context_scale * 0.75)
+            self.audio_scale = max(MIN_AUDIO_SCALE, self.audio_scale - 0.1)
+        changed = self.decoder_params() != before
+        logger.debug(f"Latency {self.latency:.2f}s over target {self.target_lag:.2f}s: {self.describe()}")
+        return changed
+
+    def _relax(self) -> bool:
+        if self.context_scale < 1.0 or self.audio_scale < 1.0:
+            self.context_scale = min(1.0, self.context_scale / 0.75)
+            self.audio_scale = min(1.0, self.audio_scale + 0.1)
+            return True
+        if self.frame_threshold is not None and self.frame_threshold < self.max_frame_threshold:
+            self.frame_threshold = min(self.max_frame_threshold, self.frame_threshold + 2)
+            return True
+        if self.cadence < self.max_cadence:
+            self.cadence = min(self.max_cadence, self.cadence + self.min_chunk_size)
+        return False
+
+    def describe(self) -> str:
+        return (
+            f"cadence {self.cadence:.2f}s, frame_threshold {self.frame_threshold}, "
+            f"context x{self.context_scale:.2f}, audio x{self.audio_scale:.2f}"
+        )
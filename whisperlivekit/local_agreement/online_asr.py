@@ -203,6 +203,23 @@ class OnlineASRProcessor:
         context_text = self.asr.sep.join(token.text for token in non_prompt_tokens)
         return self.asr.sep.join(prompt_list[::-1]), context_text
 
+    def trim_committed(self, before: float):
+        """
+        Forget the committed tokens ending before `before` (long sessions),
+        except the ones still used by the prompt.
+        """
+        k = len(self.committed)
+        while k > 0 and self.committed[k - 1].end > self.buffer_time_offset:
+            k -= 1
+        length_count = 0
+        while k > 0 and length_count < 200:
+            k -= 1
+            length_count += len(self.committed[k].text) + 1
+        n = 0
+        while n < k and self.committed[n].end <= before:
+            n += 1
+        del self.committed[:n]
+
     def get_buffer(self):
         """
         Get the unvalidated buffer in string format.
@@ -1,4 +1,5 @@
 #!/usr/bin/env python3
+import copy
 import logging
 import platform
 import sys
@@ -159,6 +160,18 @@ def backend_factory(
     return asr
 
 
+def asr_with_language(asr, lan, direct_english_translation=False):
+    """Copy of a LocalAgreement ASR for another language or task, sharing the loaded model."""
+    shared = copy.copy(asr)
+    shared.transcribe_kargs = dict(asr.transcribe_kargs)
+    shared.original_language = None if lan == "auto" else lan
+    if hasattr(asr, "direct_english_translation"):
+        shared.direct_english_translation = direct_english_translation
+    if asr.buffer_trimming == "sentence":
+        shared.tokenizer = create_tokenizer("en" if direct_english_translation else lan)
+    return shared
+
+
 def _normalize_backend_choice(
     preferred_backend,
     resolved_root,
@@ -0,0 +1,164 @@
+import logging
+import os
+import weakref
+from collections import Counter, defaultdict
+from time import perf_counter
+from typing import Any, Callable, Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# duration of a call, from sub-millisecond VAD calls to a slow encoder pass
+STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_metrics: Optional["_Metrics"] = None
+_sessions: "weakref.WeakSet[Any]" = weakref.WeakSet()
+QUEUES = ("transcription", "diarization", "translation")
+
+
+class _SessionCollector:
+    """
+    Gauges computed from the live sessions of this process at scrape time,
+    aggregated so that their cardinality doesn't grow with the sessions.
+    """
+
+    def __init__(self, engine: Any) -> None:
+        self.engine = engine
+
+    def _configuration(self, session: Any) -> Tuple[str, ...]:
+        key = session.model_lease.key if session.model_lease else self.engine.default_model_key
+        if key is None:  # --no-transcription
+            model = ("none", "", "", "", "")
+        else:
+            model = (key.policy, key.model, key.backend, key.language, key.task)
+        return model + (str(bool(session.args.diarization)), str(session.translation is not None))
+
+    def collect(self) -> Iterator[Any]:
+        from prometheus_client.core import GaugeMetricFamily
+
+        lags = []
+        depths = defaultdict(list)
+        configurations: Counter = Counter()
+        for session in list(_sessions):
+            lags.append(session.transcription_lag() or 0.0)
+            for name in QUEUES:
+                queue = getattr(session, f"{name}_queue")
+                if queue is not None:
+                    depths[name].append(queue.qsize())
+            configurations[self._configuration(session)] += 1
+        lag = GaugeMetricFamily(
+            "wlk_session_lag_seconds",
+            "Lag of the transcription of the live sessions behind their audio (0 while silent)",
+            labels=["aggregate"],
+        )
+        lag.add_metric(["max"], max(lags, default=0.0))
+        lag.add_metric(["sum"], sum(lags))
+        depth = GaugeMetricFamily(
+            "wlk_session_queue_depth",
+            "Items waiting in a queue of the live sessions",
+            labels=["queue", "aggregate"],
+        )
+        for name in QUEUES:
+            depth.add_metric([name, "max"], max(depths[name], default=0))
+            depth.add_metric([name, "sum"], sum(depths[name]))
+        active = GaugeMetricFamily(
+            "wlk_active_sessions",
+            "Live sessions by configuration",
+            labels=["policy", "model", "backend", "language", "task", "diarization", "translation"],
+        )
+        for configuration, count in configurations.items():
+            active.add_metric(list(configuration), count)
+        yield lag
+        yield depth
+        yield active
+
+        scheduler = self.engine.inference_scheduler
+        if scheduler is not None:
+            yield GaugeMetricFamily(
+                "wlk_inference_queue_length", "Model calls waiting for a scheduler slot", value=scheduler.queue_length
+            )
+            yield GaugeMetricFamily(
+                "wlk_inference_busy_slots", "Scheduler slots running a model call", value=scheduler.busy
+            )
+
+
+class _Metrics:
+    def __init__(self, engine: Any) -> None:
+        try:
+            from prometheus_client import REGISTRY, Counter, Histogram
+        except ImportError:
+            raise ImportError("--metrics requires prometheus-client: `pip install prometheus-client`")
+
+        self.stage_seconds = Histogram(
+            "wlk_stage_seconds",
+            "Duration of the calls of a pipeline stage",
+            ["stage"],
+            buckets=STAGE_BUCKETS,
+        )
+        self.tokens = Counter("wlk_tokens", "Transcription tokens emitted")
+        self.ffmpeg_events = Counter("wlk_ffmpeg_events", "FFmpeg restarts and failures", ["event"])
+        self.session_collector = _SessionCollector(engine)
+        if not os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+            REGISTRY.register(self.session_collector)
+
+
+def enable_metrics(engine: Any) -> None:
+    """Start collecting metrics in this process (`--metrics`)."""
+    global _metrics
+    if _metrics is None:
+        _metrics = _Metrics(engine)
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """
+    Metrics in the Prometheus text format, and its content type.
+
+    With several processes (`--workers`, `--inference-workers`), set
+    PROMETHEUS_MULTIPROC_DIR to an empty directory before starting the
+    server: histograms and counters are then aggregated over all the
+    processes, while session gauges are those of the process answering.
+    """
+    from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY,
+                                   CollectorRegistry, generate_latest)
+
+    registry = REGISTRY
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        registry.register(_metrics.session_collector)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def observe_stage(stage: str, seconds: float) -> None:
+    if _metrics is not None:
+        _metrics.stage_seconds.labels(stage).observe(seconds)
+
+
+def timed(stage: str, fn: Callable) -> Callable:
+    """Wrap a blocking call so that its duration is observed for `stage`."""
+    if _metrics is None:
+        return fn
+
+    def call(*args: Any) -> Any:
+        start = perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            _metrics.stage_seconds.labels(stage).observe(perf_counter() - start)
+    return call
+
+
+def count_tokens(n: int) -> None:
+    if _metrics is not None and n:
+        _metrics.tokens.inc(n)
+
+
+def ffmpeg_event(event: str) -> None:
+    if _metrics is not None:
+        _metrics.ffmpeg_events.labels(event).inc()
+
+
+def track_session(session: Any) -> None:
+    if _metrics is not None:
+        _sessions.add(session)
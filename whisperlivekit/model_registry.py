@@ -0,0 +1,183 @@
+import gc
+import logging
+import threading
+from argparse import Namespace
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from itertools import chain
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+# approximate number of parameters, for weights that are not torch modules (faster-whisper, MLX)
+APPROX_PARAMETERS = {
+    "tiny": 39e6,
+    "base": 74e6,
+    "small": 244e6,
+    "medium": 769e6,
+    "large-v3-turbo": 809e6,
+    "large": 1550e6,
+}
+
+
+@dataclass(frozen=True)
+class ModelKey:
+    """Configuration of a transcription model, as selected by a session."""
+    policy: str  # "simulstreaming" or "localagreement"
+    model: str
+    backend: str
+    language: str
+    task: str = "transcribe"  # or "translate" (to English)
+
+    @property
+    def weights_key(self) -> Tuple[str, str, str]:
+        """Entries with the same weights key only differ by language/task and share their weights."""
+        return self.policy, self.model, self.backend
+
+
+@dataclass
+class ModelLease:
+    """A model acquired by a session, with the arguments of the session."""
+    key: ModelKey
+    asr: Any
+    args: Namespace
+
+
+def parse_language_routes(routes: List[str]) -> Dict[str, str]:
+    """Parse `language=model` routes (`*` for the other languages) into a dict."""
+    parsed = {}
+    for route in routes:
+        language, sep, model = route.partition("=")
+        language, model = language.strip(), model.strip()
+        if not sep or not language or not model:
+            raise ValueError(f"Invalid language route '{route}', expected language=model (e.g. en=base.en)")
+        if model.endswith(".en") and language != "en":
+            raise ValueError(f"Invalid language route '{route}': {model} is an English-only model")
+        parsed[language] = model
+    return parsed
+
+
+def _module_nbytes(obj: Any) -> int:
+    if not isinstance(obj, torch.nn.Module):
+        return 0
+    return sum(t.numel() * t.element_size() for t in chain(obj.parameters(), obj.buffers()))
+
+
+def estimate_weights_nbytes(asr: Any, model_name: str) -> int:
+    """Memory held by the weights of an ASR object (torch modules are measured, other weights estimated)."""
+    nbytes = _module_nbytes(getattr(asr, "shared_model", None)) + _module_nbytes(getattr(asr, "model", None))
+    has_foreign_weights = getattr(asr, "fw_encoder", None) is not None or getattr(asr, "mlx_encoder", None) is not None
+    if has_foreign_weights or nbytes == 0:
+        name = model_name.split("/")[-1].replace(".en", "")
+        params = next((n for prefix, n in APPROX_PARAMETERS.items() if name.startswith(prefix)), 0)
+        nbytes += int(params * 2)  # float16
+    return nbytes
+
+
+class ModelRegistry:
+    """
+    Lazily loaded transcription models, keyed by `ModelKey`.
+
+    `build(key)` loads the weights of a new configuration. A configuration
+    that only differs from a loaded one by language or task gets a copy
+    sharing its weights (`share(asr, key)`), so that a model is loaded once.
+    Entries are kept in LRU order: when the weights exceed `memory_budget`
+    bytes (0: no limit), the least recently used weights that no session is
+    using, and that are not pinned, are released.
+
+    `acquire` may load a model and is blocking; it is meant to be called
+    from a thread. Each `acquire` must be paired with a `release`.
+    """
+
+    def __init__(
+        self,
+        build: Callable[[ModelKey], Any],
+        share: Callable[[Any, ModelKey], Any],
+        memory_budget: int = 0,
+    ):
+        self._build = build
+        self._share = share
+        self.memory_budget = memory_budget
+        self._entries: "OrderedDict[ModelKey, Any]" = OrderedDict()
+        self._weights_nbytes: Dict[Tuple[str, str, str], int] = {}
+        self._in_use: Counter = Counter()
+        self._pinned: Set[Tuple[str, str, str]] = set()
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+
+    def __contains__(self, key: ModelKey) -> bool:
+        return key in self._entries
+
+    @property
+    def weights_nbytes(self) -> int:
+        return sum(self._weights_nbytes.values())
+
+    def _hit(self, key: ModelKey) -> Optional[Any]:
+        asr = self._entries.get(key)
+        if asr is not None:
+            self._entries.move_to_end(key)
+            self._in_use[key] += 1
+        return asr
+
+    def acquire(self, key: ModelKey, pin: bool = False) -> Any:
+        with self._lock:
+            asr = self._hit(key)
+        if asr is not None:
+            return asr
+        with self._load_lock:
+            with self._lock:
+                asr = self._hit(key)
+                if asr is not None:
+                    return asr
+                base = next(
+                    (a for k, a in self._entries.items() if k.weights_key == key.weights_key), None
+                )
+            if base is not None:
+                logger.info(f"Sharing the weights of {key.model} ({key.policy}, {key.backend}) for {key}")
+                asr = self._share(base, key)
+            else:
+                logger.info(f"Loading model {key}")
+                asr = self._build(key)
+            with self._lock:
+                self._entries[key] = asr
+                if key.weights_key not in self._weights_nbytes:
+                    nbytes = estimate_weights_nbytes(asr, key.model)
+                    self._weights_nbytes[key.weights_key] = nbytes
+                    logger.info(f"Model {key.model} loaded, about {nbytes / 2**20:.0f} MiB of weights")
+                if pin:
+                    self._pinned.add(key.weights_key)
+                self._in_use[key] += 1
+                self._evict()
+        return asr
+
+    def release(self, key: ModelKey) -> None:
+        with self._lock:
+            self._in_use[key] -= 1
+            if self._in_use[key] <= 0:
+                del self._in_use[key]
+            self._evict()
+
+    def _evict(self) -> None:
+        if not self.memory_budget:
+            return
+        evicted = False
+        while self.weights_nbytes > self.memory_budget:
+            busy = {k.weights_key for k in self._in_use} | self._pinned
+            victim = next((k.weights_key for k in self._entries if k.weights_key not in busy), None)
+            if victim is None:
+                logger.warning(
+                    f"Model weights ({self.weights_nbytes / 2**20:.0f} MiB) exceed the memory budget "
+                    f"({self.memory_budget / 2**20:.0f} MiB), but all loaded models are in use"
+                )
+                break
+            for k in [k for k in self._entries if k.weights_key == victim]:
+                logger.info(f"Evicting model {k}")
+                del self._entries[k]
+            del self._weights_nbytes[victim]
+            evicted = True
+        if evicted:
+            gc.collect()
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
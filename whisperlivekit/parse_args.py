@@ -152,6 +152,12 @@ def parse_args():
     parser.add_argument(
         "--vac-chunk-size", type=float, default=0.04, help="VAC sample size in seconds."
     )
+    parser.add_argument(
+        "--vac-batch-window",
+        type=float,
+        default=0.0,
+        help="Wait this many seconds to evaluate the VAC windows of all sessions as one batch. 0 batches the sessions whose audio arrives in the same event loop iteration.",
+    )
 
     parser.add_argument(
         "--no-vad",
@@ -183,6 +189,198 @@ def parse_args():
     parser.add_argument("--ssl-certfile", type=str, help="Path to the SSL certificate file.", default=None)
     parser.add_argument("--ssl-keyfile", type=str, help="Path to the SSL private key file.", default=None)
     parser.add_argument("--forwarded-allow-ips", type=str, help="Allowed ips for reverse proxying.", default=None)
+    parser.add_argument(
+        "--no-ws-deflate",
+        action="store_true",
+        default=False,
+        help="Disable the permessage-deflate WebSocket compression.",
+    )
+    parser.add_argument(
+        "--update-coalesce",
+        type=float,
+        default=0.02,
+        help="Seconds to wait after a result change, so that the changes arriving meanwhile are sent in the same update.",
+    )
+    parser.add_argument(
+        "--max-update-rate",
+        type=float,
+        default=20.0,
+        help="Maximum number of result updates sent per second to each client. Clients can request a lower rate with the max_update_rate query parameter.",
+    )
+    parser.add_argument(
+        "--idle-refresh",
+        type=float,
+        default=1.0,
+        help="Seconds between result updates while a silence is ongoing and nothing else changes.",
+    )
+    parser.add_argument(
+        "--archive-horizon",
+        type=float,
+        default=0.0,
+        help="Long-session mode: final lines older than this many seconds of audio are moved from memory to an on-disk archive, that clients can fetch from /archive/<session id>. 0 disables it.",
+    )
+    parser.add_argument(
+        "--archive-dir",
+        type=str,
+        default=None,
+        help="Directory of the transcript archives (one JSONL file per session). Defaults to a whisperlivekit-archive directory in the system temporary directory.",
+    )
+    parser.add_argument(
+        "--archive-retention",
+        type=float,
+        default=3600.0,
+        help="When a session ends, delete the transcript archives of ended sessions not written for this many seconds. 0 deletes the archive of a session when it ends.",
+    )
+    parser.add_argument(
+        "--allowed-models",
+        type=str,
+        nargs="*",
+        default=[],
+        help="Models that clients can select per connection with the `model` query parameter of /asr (e.g. small large-v3-turbo), in addition to the default model. Language and task can be selected per connection too; models are loaded on first use.",
+    )
+    parser.add_argument(
+        "--allowed-backends",
+        type=str,
+        nargs="*",
+        default=[],
+        choices=["auto", "whisper", "faster-whisper", "mlx-whisper"],
+        help="Backends that clients can select per connection with the `backend` query parameter, in addition to --backend. Each backend loads its own copy of the weights.",
+    )
+    parser.add_argument(
+        "--allowed-policies",
+        type=str,
+        nargs="*",
+        default=[],
+        choices=["simulstreaming", "localagreement"],
+        help="Policies that clients can select per connection with the `policy` query parameter, in addition to --backend-policy. Each policy loads its own copy of the weights.",
+    )
+    parser.add_argument(
+        "--model-memory-budget",
+        type=float,
+        default=0.0,
+        help="Memory budget of the loaded model weights, in GB. When exceeded, the least recently used models that no session is using are unloaded. 0 means no limit.",
+    )
+    parser.add_argument(
+        "--language-routes",
+        type=str,
+        nargs="*",
+        default=[],
+        help="With --lan auto (SimulStreaming policy), model to continue a session with once its language is detected, as language=model entries, `*` matching the other languages (e.g. en=base.en '*=small'). Routed models are loaded at startup.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of server processes. Models are loaded once, then the workers are forked and share their weights (CPU inference only).",
+    )
+    parser.add_argument(
+        "--inference-workers",
+        type=int,
+        default=0,
+        help="Number of inference processes running the transcription decoders of the sessions (audio is passed through shared memory), so that the server process only handles sockets, FFmpeg and formatting. 0 runs them in the server process.",
+    )
+    parser.add_argument(
+        "--inference-slots",
+        type=int,
+        default=0,
+        help="Number of model calls that run at the same time, across all sessions. Pending calls are served by priority class, then earliest deadline first (the session with the most lag first), and torch threads are split between the slots. 0 runs each call in its own thread as soon as it is issued.",
+    )
+    parser.add_argument(
+        "--max-client-priority",
+        type=int,
+        default=0,
+        help="Highest priority class that clients can request with the `priority` query parameter of /asr (default class: 0, higher classes are served first by the inference scheduler).",
+    )
+    parser.add_argument(
+        "--cpu-lanes",
+        type=int,
+        default=0,
+        help="Split the cores into this many inference lanes, each running one model call at a time (inference slots, inference workers and batcher threads are assigned to lanes). Without --inference-slots or --inference-workers, one inference slot is created per lane. 0 disables the partitioning.",
+    )
+    parser.add_argument(
+        "--lane-threads",
+        type=int,
+        default=0,
+        help="Torch intra-op threads per lane. 0 uses the number of cores of a lane.",
+    )
+    parser.add_argument(
+        "--frontend-cores",
+        type=int,
+        default=1,
+        help="With --cpu-lanes, cores kept out of the lanes for the event loop, FFmpeg, VAD and diarization.",
+    )
+    parser.add_argument(
+        "--pin-lanes",
+        action="store_true",
+        default=False,
+        help="With --cpu-lanes, pin the lanes and the frontend to their cores (Linux). Lanes follow the NUMA nodes.",
+    )
+    parser.add_argument(
+        "--max-sessions",
+        type=int,
+        default=0,
+        help="Maximum number of concurrent sessions per server process. 0 means no limit.",
+    )
+    parser.add_argument(
+        "--max-load",
+        type=float,
+        default=0.0,
+        help="Refuse new sessions when the time spent in model calls over the last 10s, per inference slot/worker/lane, exceeds this fraction (e.g. 0.9). 0 disables it.",
+    )
+    parser.add_argument(
+        "--max-lag",
+        type=float,
+        default=0.0,
+        help="Refuse new sessions when a live session lags more than this many seconds behind its audio. 0 disables it.",
+    )
+    parser.add_argument(
+        "--min-free-memory",
+        type=float,
+        default=0.0,
+        help="Refuse new sessions when less than this much memory (GB) is available. 0 disables it.",
+    )
+    parser.add_argument(
+        "--admission-timeout",
+        type=float,
+        default=0.0,
+        help="Seconds a new session waits for capacity before being refused (close code 1013). 0 refuses it right away.",
+    )
+    parser.add_argument(
+        "--shed-load",
+        action="store_true",
+        default=False,
+        help="Under sustained overload (--max-load, --max-lag), degrade the live sessions in order: pause translation, then diarization, then decode less often.",
+    )
+    parser.add_argument(
+        "--target-lag",
+        type=float,
+        default=0.0,
+        help="Default latency budget of the sessions, in seconds (e.g. 1.5): the decode cadence, frame threshold and context size of each session are tuned at runtime to stay under it with as little compute as possible. Sessions can set their own with the target_lag query parameter. 0 keeps the startup settings.",
+    )
+    parser.add_argument(
+        "--metrics",
+        action="store_true",
+        default=False,
+        help="Serve Prometheus metrics at /metrics (per-stage latency histograms, session lag and queues, tokens, FFmpeg errors). Requires prometheus-client.",
+    )
+    parser.add_argument(
+        "--trace-sessions",
+        type=int,
+        default=0,
+        help="Record a timeline of the pipeline stages of each session, downloadable as a Chrome trace from /debug/trace/<sessionId>, for the last N sessions. 0 disables tracing.",
+    )
+    parser.add_argument(
+        "--trace-spans",
+        type=int,
+        default=20000,
+        help="With --trace-sessions, number of most recent spans kept per session.",
+    )
+    parser.add_argument(
+        "--trace-dir",
+        type=str,
+        default=None,
+        help="Directory where the traces of ended sessions are saved, so that any worker can serve them (--workers). Defaults to a whisperlivekit-traces directory in the system temporary directory.",
+    )
     parser.add_argument(
         "--pcm-input",
         action="store_true",
@@ -288,6 +486,62 @@ def parse_args():
         help="Max context tokens for the model. Default is 0.",
     )
     
+    simulstreaming_group.add_argument(
+        "--encoder-batch-window",
+        type=float,
+        default=0.0,
+        dest="encoder_batch_window",
+        help="Collect the encoder inputs of all live sessions during this many seconds and run them as one batch. 0 disables cross-session batching. Only used with the whisper encoder backend.",
+    )
+
+    simulstreaming_group.add_argument(
+        "--encoder-max-batch-size",
+        type=int,
+        default=8,
+        dest="encoder_max_batch_size",
+        help="Maximum number of sessions encoded in one batched encoder pass.",
+    )
+
+    simulstreaming_group.add_argument(
+        "--decoder-batch-window",
+        type=float,
+        default=0.0,
+        dest="decoder_batch_window",
+        help="Wait up to this many seconds for other decoding sessions and run their next-token steps as one batched decoder pass. 0 disables cross-session batching.",
+    )
+
+    simulstreaming_group.add_argument(
+        "--decoder-max-batch-size",
+        type=int,
+        default=16,
+        dest="decoder_max_batch_size",
+        help="Maximum number of sessions stepped in one batched decoder pass.",
+    )
+
+    simulstreaming_group.add_argument(
+        "--static-kv-cache",
+        action="store_true",
+        default=False,
+        dest="static_kv_cache",
+        help="Preallocate each session's decoder kv cache to the full text context and write keys/values in place instead of growing it at every token.",
+    )
+
+    simulstreaming_group.add_argument(
+        "--streaming-mel",
+        action="store_true",
+        default=False,
+        dest="streaming_mel",
+        help="Compute the log-mel spectrogram incrementally, only for the newly received audio, instead of over the whole buffer at every chunk. Only used with the whisper encoder backend.",
+    )
+
+    simulstreaming_group.add_argument(
+        "--audio-ctx-bucket",
+        type=int,
+        default=0,
+        dest="audio_ctx_bucket",
+        help="Encode only the buffered audio, rounded up to a multiple of this many encoder positions (20ms each), instead of the full 30s context. Faster on short buffers, at some cost in accuracy. 0 disables. Only used with the whisper encoder backend.",
+    )
+    
     simulstreaming_group.add_argument(
         "--model-path",
         type=str,
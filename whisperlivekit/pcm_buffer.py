@@ -0,0 +1,57 @@
+from typing import Union
+
+import numpy as np
+
+
+class PCMBuffer:
+    """
+    Per-session buffer of incoming s16le PCM, stored as float32 samples.
+
+    Incoming bytes are converted in place into a preallocated float32 slab
+    (no intermediate int16/float64 arrays). `read()` hands out contiguous,
+    read-only views of the slab that are shared by every consumer (VAC,
+    transcription and diarization queues) instead of per-consumer copies.
+
+    Slots are never overwritten while a view may still reference them: when
+    the slab is full, a new one is allocated and only the unread samples are
+    moved to it. The old slab is freed once the consumers drop their chunks.
+    """
+
+    def __init__(self, slab_samples: int = 16000 * 30):
+        self.slab_samples = slab_samples
+        self._slab = np.empty(slab_samples, dtype=np.float32)
+        self._read = 0
+        self._write = 0
+        self._odd_byte = b""
+
+    def __len__(self) -> int:
+        """Number of buffered samples not read yet."""
+        return self._write - self._read
+
+    def _new_slab(self, n_incoming: int) -> None:
+        unread = self._slab[self._read:self._write]
+        slab = np.empty(max(self.slab_samples, 2 * (len(unread) + n_incoming)), dtype=np.float32)
+        slab[:len(unread)] = unread
+        self._slab = slab
+        self._read, self._write = 0, len(unread)
+
+    def write(self, data: Union[bytes, bytearray, memoryview]) -> None:
+        if self._odd_byte:
+            data = self._odd_byte + bytes(data)
+        n = len(data) // 2
+        self._odd_byte = bytes(data[2 * n:])
+        if n == 0:
+            return
+        if self._write + n > len(self._slab):
+            self._new_slab(n)
+        samples = np.frombuffer(data, dtype=np.int16, count=n)
+        np.multiply(samples, 1.0 / 32768.0, out=self._slab[self._write:self._write + n], casting="unsafe")
+        self._write += n
+
+    def read(self, n: int) -> np.ndarray:
+        """Read-only view of the next `n` samples (at most the buffered ones)."""
+        n = min(n, len(self))
+        view = self._slab[self._read:self._read + n]
+        view.flags.writeable = False
+        self._read += n
+        return view
@@ -0,0 +1,150 @@
+import gc
+import logging
+import os
+import signal
+import time
+from typing import Any, Dict, Optional, Set
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+FAST_EXIT = 10.0  # a worker exiting within FAST_EXIT seconds of its start failed to start
+MAX_FAST_EXITS = 5  # consecutive fast exits after which a worker is not restarted
+RESTART_DELAY = 0.5  # seconds before restarting a worker after a fast exit, doubled each time
+
+
+def _modules_of(obj: Any, depth: int = 2):
+    """Torch modules held by `obj` or by its attributes, down to `depth` levels."""
+    if isinstance(obj, torch.nn.Module):
+        yield obj
+        return
+    if depth == 0 or not hasattr(obj, "__dict__"):
+        return
+    for value in vars(obj).values():
+        yield from _modules_of(value, depth - 1)
+
+
+def share_model_weights(engine: Any) -> int:
+    """
+    Move the weights of the models loaded by the engine (ASR models of the
+    registry, VAD, diarization) to shared memory, so that forked workers
+    map the same pages instead of copying them on write. Returns the number
+    of bytes shared.
+    """
+    roots = [engine.vac_model, getattr(engine, "diarization_model", None), engine.translation_model]
+    if engine.model_registry is not None:
+        roots += list(engine.model_registry._entries.values())
+    seen: Set[int] = set()
+    nbytes = 0
+    for root in roots:
+        for module in _modules_of(root):
+            if id(module) in seen:
+                continue
+            seen.add(id(module))
+            module.share_memory()
+            nbytes += sum(t.numel() * t.element_size() for t in module.state_dict().values())
+    return nbytes
+
+
+def _run_worker(config: Any, sock: Any, threads_per_worker: Optional[int]) -> None:
+    import uvicorn
+
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    if threads_per_worker is not None:
+        torch.set_num_threads(threads_per_worker)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def run_prefork(config: Any, workers: int, engine: Any) -> None:
+    """
+    Serve the app with `workers` forked processes sharing the listening socket.
+
+    The engine must be loaded in this (master) process before forking: its
+    weights are moved to shared memory and the objects that exist at fork
+    time are frozen out of the garbage collector, so that the workers don't
+    touch (and copy) their pages. Each worker runs its own event loop and
+    reuses the engine, so the models are loaded once per node. A worker
+    that exits unexpectedly is restarted, after an increasing delay when it
+    keeps failing at startup, and not at all after `MAX_FAST_EXITS` failures
+    in a row.
+    """
+    if torch.cuda.is_initialized():
+        raise RuntimeError("--workers cannot be used with CUDA: forked processes cannot reuse the CUDA context")
+    if engine.args.diarization and engine.args.diarization_backend == "diart":
+        raise RuntimeError("--workers cannot be used with the diart diarization backend, which runs a thread shared by all sessions")
+
+    nbytes = share_model_weights(engine)
+    logger.info(f"Shared {nbytes / 2**20:.0f} MiB of model weights with the workers")
+    sock = config.bind_socket()
+    # with --cpu-lanes, the threads are set by the lanes
+    threads_per_worker = None if engine.cpu_topology else max(1, (os.cpu_count() or 1) // workers)
+
+    children: Dict[int, int] = {}  # pid -> worker index
+    started: Dict[int, float] = {}  # worker index -> start time
+    fast_exits: Dict[int, int] = {}  # worker index -> consecutive fast exits
+    stopping = False
+
+    def spawn(index: int) -> None:
+        gc.collect()
+        gc.freeze()
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                _run_worker(config, sock, threads_per_worker)
+                code = 0
+            except SystemExit as e:
+                code = e.code if isinstance(e.code, int) else 1
+            except BaseException:
+                logger.exception(f"Worker {index} failed")
+            finally:
+                os._exit(code)
+        children[pid] = index
+        started[index] = time.monotonic()
+        logger.info(f"Started worker {index} (pid {pid})")
+
+    def stop(signum, frame) -> None:
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    for index in range(workers):
+        spawn(index)
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        index = children.pop(pid, None)
+        if index is None:
+            continue
+        if stopping:
+            logger.info(f"Worker {index} (pid {pid}) stopped")
+            continue
+        code = os.waitstatus_to_exitcode(status)
+        if time.monotonic() - started[index] < FAST_EXIT:
+            fast_exits[index] = fast_exits.get(index, 0) + 1
+        else:
+            fast_exits[index] = 0
+        if fast_exits[index] >= MAX_FAST_EXITS:
+            logger.error(f"Worker {index} (pid {pid}) exited with status {code}, {MAX_FAST_EXITS} times in a row at startup: not restarting it")
+            continue
+        delay = RESTART_DELAY * 2 ** (fast_exits[index] - 1) if fast_exits[index] else 0.0
+        logger.warning(f"Worker {index} (pid {pid}) exited with status {code}, restarting it in {delay:.1f}s")
+        time.sleep(delay)
+        if not stopping:
+            spawn(index)
+    sock.close()
+    if not stopping:
+        raise RuntimeError("All the workers failed")
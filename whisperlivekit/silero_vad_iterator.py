@@ -1,9 +1,14 @@
+import asyncio
 import warnings
 from pathlib import Path
+from time import perf_counter
+from typing import List, Optional, Sequence, Tuple
 
 import numpy as np
 import torch
 
+from whisperlivekit import metrics
+
 """
 Code is adapted from silero-vad v6: https://github.com/snakers4/silero-vad
 """
@@ -18,14 +23,14 @@ def init_jit_model(model_path: str, device=torch.device('cpu')):
 class OnnxWrapper():
     """ONNX Runtime wrapper for Silero VAD model."""
 
-    def __init__(self, path, force_onnx_cpu=False):
+    def __init__(self, path, force_onnx_cpu=False, num_threads=1):
         global np
         import numpy as np
         import onnxruntime
 
         opts = onnxruntime.SessionOptions()
         opts.inter_op_num_threads = 1
-        opts.intra_op_num_threads = 1
+        opts.intra_op_num_threads = num_threads
 
         if force_onnx_cpu and 'CPUExecutionProvider' in onnxruntime.get_available_providers():
             self.session = onnxruntime.InferenceSession(path, providers=['CPUExecutionProvider'], sess_options=opts)
@@ -101,7 +106,7 @@ class OnnxWrapper():
         return out
 
 
-def load_silero_vad(model_path: str = None, onnx: bool = False, opset_version: int = 16):
+def load_silero_vad(model_path: str = None, onnx: bool = False, opset_version: int = 16, num_threads: int = 1):
     """
     Load Silero VAD model (JIT or ONNX).
     
@@ -113,6 +118,8 @@ def load_silero_vad(model_path: str = None, onnx: bool = False, opset_version: i
         Whether to use ONNX runtime (requires onnxruntime package).
     opset_version : int, default 16
         ONNX opset version (15 or 16). Only used if onnx=True.
+    num_threads : int, default 1
+        ONNX Runtime intra-op threads. Only used if onnx=True.
     
     Returns
     -------
@@ -145,7 +152,7 @@ def load_silero_vad(model_path: str = None, onnx: bool = False, opset_version: i
         model_path = Path(model_path)
     if onnx:
         try:
-            model = OnnxWrapper(str(model_path), force_onnx_cpu=True)
+            model = OnnxWrapper(str(model_path), force_onnx_cpu=True, num_threads=num_threads)
         except ImportError:
             raise ImportError(
                 "ONNX runtime not available. Install with: pip install onnxruntime\n"
@@ -231,9 +238,12 @@ class VADIterator:
                 raise TypeError("Audio cannot be casted to tensor. Cast it manually")
 
         window_size_samples = len(x[0]) if x.dim() == 2 else len(x)
-        self.current_sample += window_size_samples
-
         speech_prob = self.model(x, self.sampling_rate).item()
+        return self._step(speech_prob, window_size_samples, return_seconds, time_resolution)
+
+    def _step(self, speech_prob: float, window_size_samples: int, return_seconds=False, time_resolution: int = 1):
+        """Update the speech/silence state machine with the probability of the next window."""
+        self.current_sample += window_size_samples
 
         if (speech_prob >= self.threshold) and self.temp_end:
             self.temp_end = 0
@@ -272,15 +282,152 @@ class FixedVADIterator(VADIterator):
         while len(self.buffer) >= 512:
             r = super().__call__(self.buffer[:512], return_seconds=return_seconds)
             self.buffer = self.buffer[512:]
-            if ret is None:
-                ret = r
-            elif r is not None:
-                if "end" in r:
-                    ret["end"] = r["end"]
-                if "start" in r:
-                    ret["start"] = r["start"]
-                    if "end" in ret:
-                        del ret["end"]
+            ret = self._merge(ret, r)
+        return ret if ret != {} else None
+
+    @staticmethod
+    def _merge(ret, r):
+        """Merge the events of consecutive windows into one event dict."""
+        if ret is None:
+            return r
+        if r is not None:
+            if "end" in r:
+                ret["end"] = r["end"]
+            if "start" in r:
+                ret["start"] = r["start"]
+                if "end" in ret:
+                    del ret["end"]
+        return ret
+
+
+class VADSession:
+    """Recurrent state and audio context of one stream in a VADService."""
+
+    def __init__(self, context_size: int = 64):
+        self.state = torch.zeros((2, 1, 128))
+        self.context = torch.zeros((1, context_size))
+
+
+class VADService:
+    """
+    Evaluates the Silero VAD model for all sessions, one batch per event loop tick.
+
+    Each session keeps its own recurrent state and audio context
+    (`VADSession`) instead of sharing the internal state of the loaded model.
+    The windows submitted by all sessions within `batch_window` seconds (by
+    default, during the same event loop iteration) are evaluated together:
+    the i-th pending window of every session is stacked into one model call.
+    Only 16 kHz audio is supported.
+    """
+
+    window_size = 512
+    context_size = 64
+
+    def __init__(self, model, batch_window: float = 0.0, max_batch_size: int = 64):
+        self.model = model
+        self.batch_window = batch_window
+        self.max_batch_size = max(1, max_batch_size)
+        self._pending: List[Tuple[VADSession, Sequence[np.ndarray], asyncio.Future]] = []
+        self._flush_handle: Optional[asyncio.Handle] = None
+
+    def new_session(self) -> VADSession:
+        return VADSession(self.context_size)
+
+    async def speech_probs(self, session: VADSession, windows: Sequence[np.ndarray]) -> np.ndarray:
+        """
+        Speech probability of each 512-sample window, evaluated in order
+        against the session state.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((session, windows, future))
+        if self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.batch_window, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        self._flush_handle = None
+        pending, self._pending = self._pending, []
+        try:
+            results = self._run(pending)
+        except Exception as e:
+            for _, _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, _, future), probs in zip(pending, results):
+            if not future.done():
+                future.set_result(probs)
+
+    def _forward(self, x: torch.Tensor, state: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+        if isinstance(self.model, OnnxWrapper):
+            ort_inputs = {'input': x.numpy(), 'state': state.numpy(), 'sr': np.array(16000, dtype='int64')}
+            out, state = self.model.session.run(None, ort_inputs)
+            return torch.from_numpy(out), torch.from_numpy(state)
+        return self.model._model(x, state)
+
+    @torch.no_grad()
+    def _run(self, pending: List[Tuple[VADSession, Sequence[np.ndarray], asyncio.Future]]) -> List[np.ndarray]:
+        probs = [np.empty(len(windows), dtype=np.float32) for _, windows, _ in pending]
+        n_steps = max((len(windows) for _, windows, _ in pending), default=0)
+        for step in range(n_steps):
+            rows = [i for i, (_, windows, _) in enumerate(pending) if len(windows) > step]
+            for start in range(0, len(rows), self.max_batch_size):
+                batch = rows[start:start + self.max_batch_size]
+                sessions = [pending[i][0] for i in batch]
+                audio = torch.from_numpy(np.stack([pending[i][1][step] for i in batch]).astype(np.float32))
+                x = torch.cat([torch.cat([s.context for s in sessions]), audio], dim=1)
+                forward_start = perf_counter()
+                out, state = self._forward(x, torch.cat([s.state for s in sessions], dim=1))
+                metrics.observe_stage("vad", perf_counter() - forward_start)
+                out = out[:, 0].numpy()
+                for k, (i, session) in enumerate(zip(batch, sessions)):
+                    session.state = state[:, k:k + 1].clone()
+                    session.context = x[k:k + 1, -self.context_size:].clone()
+                    probs[i][step] = out[k]
+        return probs
+
+
+class BatchedVADIterator(FixedVADIterator):
+    """
+    FixedVADIterator whose speech probabilities are computed by a shared
+    VADService, with its own recurrent state. Must be awaited.
+    """
+
+    def __init__(self, service: VADService, **kwargs):
+        self.service = service
+        super().__init__(service.model, **kwargs)
+
+    def reset_states(self):
+        # the model is shared: only reset this stream's state
+        self.session = self.service.new_session()
+        self.triggered = False
+        self.temp_end = 0
+        self.current_sample = 0
+        self.buffer = np.array([], dtype=np.float32)
+
+    async def __call__(self, x, return_seconds=False):
+        window_size = self.service.window_size
+        windows = []
+        if len(self.buffer):
+            # complete the leftover of the previous chunk
+            take = min(window_size - len(self.buffer), len(x))
+            head = np.concatenate([self.buffer, x[:take]])
+            x = x[take:]
+            if len(head) < window_size:
+                self.buffer = head
+                return None
+            windows.append(head)
+        n_windows = len(x) // window_size
+        # views of the chunk, no copy
+        windows.extend(x[i * window_size:(i + 1) * window_size] for i in range(n_windows))
+        self.buffer = np.array(x[n_windows * window_size:], dtype=np.float32)
+        if not windows:
+            return None
+        ret = None
+        for speech_prob in await self.service.speech_probs(self.session, windows):
+            r = self._step(float(speech_prob), window_size, return_seconds=return_seconds)
+            ret = self._merge(ret, r)
         return ret if ret != {} else None
 
 
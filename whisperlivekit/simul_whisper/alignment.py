@@ -0,0 +1,81 @@
+from typing import Dict, List, Optional, Tuple
+
+import torch
+import torch.nn.functional as F
+
+from whisperlivekit.whisper.timing import median_filter
+
+
+class AlignmentTracker:
+    """
+    Incremental processing of the alignment heads' cross-attention.
+
+    AlignAtt normalizes each alignment head over all decoded query rows
+    (per audio frame), median-filters along the audio axis and averages the
+    heads, but only ever reads the newest row. This tracker keeps the running
+    mean and sum of squared deviations per (beam, head, frame), so that every
+    decoding step only softmaxes, normalizes and filters its new rows.
+    """
+
+    def __init__(
+        self,
+        align_source: Dict[int, List[Tuple[int, int]]],
+        num_align_heads: int,
+        filter_width: int = 7,
+    ):
+        self.align_source = align_source
+        self.num_align_heads = num_align_heads
+        self.filter_width = filter_width
+        self.count = 0
+        self.mean: Optional[torch.Tensor] = None
+        self.m2: Optional[torch.Tensor] = None
+        self.last_row: Optional[torch.Tensor] = None
+
+    def append(self, cross_attns: List[torch.Tensor]) -> None:
+        """
+        Add the query rows of one decoder forward pass.
+
+        Args:
+            cross_attns: Cross-attention weights of each decoder layer,
+                         each of shape (batch, n_head, seq_len, audio_len)
+        """
+        heads: List[Optional[torch.Tensor]] = [None] * self.num_align_heads
+        for layer_rank, attn_mat in enumerate(cross_attns):
+            align_heads_in_layer = self.align_source.get(layer_rank, [])
+            if len(align_heads_in_layer) == 0:
+                continue
+            attn_mat = F.softmax(attn_mat, dim=-1)
+            if attn_mat.dim() == 3:
+                attn_mat = attn_mat.unsqueeze(0)
+            for align_head_rank, head_id in align_heads_in_layer:
+                heads[align_head_rank] = attn_mat[:, head_id, :, :]  # (batch, seq_len, audio_len)
+        heads = [h for h in heads if h is not None]
+        if not heads:
+            return
+
+        rows = torch.stack(heads, dim=1)  # (batch, num_align_heads, seq_len, audio_len)
+        n_new = rows.shape[-2]
+        new_mean = rows.mean(dim=-2)
+        new_m2 = ((rows - new_mean.unsqueeze(-2)) ** 2).sum(dim=-2)
+        if self.count == 0:
+            self.mean, self.m2 = new_mean, new_m2
+        else:
+            # Chan et al. parallel update of mean / M2
+            total = self.count + n_new
+            delta = new_mean - self.mean
+            self.mean = self.mean + delta * (n_new / total)
+            self.m2 = self.m2 + new_m2 + delta ** 2 * (self.count * n_new / total)
+        self.count += n_new
+        self.last_row = rows[:, :, -1, :]
+
+    def attention(self, content_mel_len: int, batch_size: int = 1, device=None) -> torch.Tensor:
+        """
+        Returns the processed attention of the newest row, shape (batch, 1, content_mel_len)
+        """
+        if self.last_row is None:
+            return torch.zeros(batch_size, 1, content_mel_len, device=device)
+        std = (self.m2 / self.count).sqrt()
+        row = (self.last_row - self.mean) / (std + 1e-8)
+        row = median_filter(row.unsqueeze(-2), self.filter_width)  # (batch, num_align_heads, 1, audio_len)
+        row = row.mean(dim=1)
+        return row[:, :, :content_mel_len]
@@ -0,0 +1,86 @@
+from collections import deque
+from typing import Union
+
+import numpy as np
+import torch
+
+from whisperlivekit.whisper.audio import N_SAMPLES, SAMPLE_RATE
+
+
+class AudioRingBuffer:
+    """
+    Per-session audio store of SimulStreaming.
+
+    Chunks are copied into one preallocated float32 tensor holding twice the
+    capacity, so that appending a chunk and evicting the oldest one are O(1)
+    (amortized: live samples are moved back to the front once the end of the
+    storage is reached) and `view()` is always contiguous. Chunk lengths are
+    kept so that eviction still happens chunk by chunk.
+    """
+
+    def __init__(self, capacity: int = N_SAMPLES):
+        self.capacity = max(1, capacity)
+        self._storage = torch.zeros(2 * self.capacity, dtype=torch.float32)
+        self._start = 0
+        self._end = 0
+        self._chunk_lengths = deque()
+        # absolute number of samples dropped from the front since creation
+        self.evicted_samples = 0
+
+    def __len__(self):
+        """Number of chunks currently held."""
+        return len(self._chunk_lengths)
+
+    @property
+    def n_samples(self) -> int:
+        return self._end - self._start
+
+    def duration(self) -> float:
+        return self.n_samples / SAMPLE_RATE
+
+    def _make_room(self, n: int) -> None:
+        size = self.n_samples
+        if size + n > self._storage.shape[0]:
+            storage = torch.zeros(2 * (size + n), dtype=torch.float32)
+        else:
+            storage = self._storage
+        storage[:size] = self._storage[self._start:self._end].clone()
+        self._storage = storage
+        self._start, self._end = 0, size
+
+    def append(self, chunk: Union[torch.Tensor, np.ndarray]) -> None:
+        n = chunk.shape[0]
+        if self._end + n > self._storage.shape[0]:
+            self._make_room(n)
+        if isinstance(chunk, np.ndarray):
+            self._storage[self._end:self._end + n].numpy()[:] = chunk
+        else:
+            self._storage[self._end:self._end + n] = chunk
+        self._end += n
+        self._chunk_lengths.append(n)
+
+    def first_chunk_len(self) -> int:
+        return self._chunk_lengths[0]
+
+    def pop_first_chunk(self) -> int:
+        """Evict the oldest chunk and return its number of samples."""
+        n = self._chunk_lengths.popleft()
+        self._start += n
+        self.evicted_samples += n
+        return n
+
+    def keep_last_chunks(self, num: int) -> None:
+        while len(self._chunk_lengths) > num:
+            self.pop_first_chunk()
+
+    def clear(self) -> None:
+        self.evicted_samples += self.n_samples
+        self._start = self._end = 0
+        self._chunk_lengths.clear()
+
+    def view(self) -> torch.Tensor:
+        """
+        Contiguous view of the buffered audio. It is only valid until the
+        next `append`, which may move the samples.
+        """
+        return self._storage[self._start:self._end]
@@ -1,10 +1,12 @@
+import copy
 import gc
 import logging
 import os
 import platform
 import sys
+from dataclasses import replace
 from pathlib import Path
-from typing import List, Optional, Tuple
+from typing import Callable, List, Optional, Tuple
 
 import numpy as np
 import torch
@@ -12,6 +14,8 @@ import torch
 from whisperlivekit.backend_support import (faster_backend_available,
                                             mlx_backend_available)
 from whisperlivekit.model_paths import model_path_and_type, resolve_model_path
+from whisperlivekit.simul_whisper.batching import (DecoderBatcher,
+                                                    EncoderBatcher)
 from whisperlivekit.simul_whisper.config import AlignAttConfig
 from whisperlivekit.simul_whisper.simul_whisper import AlignAtt
 from whisperlivekit.timed_objects import ASRToken, ChangeSpeaker, Transcript
@@ -49,6 +53,11 @@ class SimulStreamingOnlineProcessor:
         self.buffer = []
         self.committed: List[ASRToken] = []
         self.last_result_tokens: List[ASRToken] = []
+        # Called once with the detected language (`--lan auto`); may return the ASR to continue with
+        self.language_router: Optional[Callable[[str], Optional["SimulStreamingASR"]]] = None
+        # settings of this session set at runtime (see tune), kept across ASR switches
+        self.tuning: Optional[dict] = None
+        self.tracer = None
         self.load_new_alignatt_instance()
         
         if asr.tokenizer:
@@ -61,7 +70,63 @@ class SimulStreamingOnlineProcessor:
             loaded_model=self.asr.shared_model,
             mlx_encoder=self.asr.mlx_encoder,
             fw_encoder=self.asr.fw_encoder,
+            encoder_batcher=self.asr.encoder_batcher,
+            decoder_batcher=self.asr.decoder_batcher,
         )
+        if self.tuning:
+            self._apply_tuning()
+        self.model.tracer = self.tracer
+
+    def set_tracer(self, tracer):
+        """Record the encoder, decoder steps and alignment of this session (see SessionTracer)."""
+        self.tracer = tracer
+        self.model.tracer = tracer
+
+    def tune(self, frame_threshold: Optional[int] = None, context_scale: float = 1.0, audio_scale: float = 1.0):
+        """
+        Change the decoder settings of this session only: `frame_threshold`,
+        and the text context and audio buffer as fractions of their
+        configured size. Used by the latency controller.
+        """
+        self.tuning = {
+            "frame_threshold": frame_threshold,
+            "context_scale": context_scale,
+            "audio_scale": audio_scale,
+        }
+        self._apply_tuning()
+
+    def _apply_tuning(self):
+        base = self.asr.cfg
+        # the config is shared by the sessions of the ASR: the session gets its own copy
+        cfg = replace(
+            base,
+            audio_max_len=max(base.audio_min_len, base.audio_max_len * self.tuning["audio_scale"]),
+        )
+        if self.tuning["frame_threshold"] is not None:
+            cfg.frame_threshold = self.tuning["frame_threshold"]
+        self.model.cfg = cfg
+        max_context_tokens = base.max_context_tokens or self.model.max_text_len
+        self.model.max_context_tokens = max(1, int(max_context_tokens * self.tuning["context_scale"]))
+
+    def switch_asr(self, asr):
+        """
+        Continue the session with another ASR (e.g. the model routed for the
+        detected language). The buffered audio, time offsets and speaker are
+        moved to a new decoder; the hypothesis of the buffered audio is
+        decoded again by the new model.
+        """
+        old_state = self.model.state
+        self.asr = asr
+        self.load_new_alignatt_instance()
+        if asr.tokenizer:
+            self.model.tokenizer = asr.tokenizer
+        state = self.model.state
+        state.segments = old_state.segments
+        state.global_time_offset = old_state.global_time_offset
+        state.cumulative_time_offset = old_state.cumulative_time_offset
+        state.first_timestamp = old_state.first_timestamp
+        state.speaker = old_state.speaker
+        self.buffer = []
 
     def start_silence(self):
         tokens, processed_upto = self.process_iter(is_last=True)
@@ -88,10 +153,10 @@ class SimulStreamingOnlineProcessor:
     def insert_audio_chunk(self, audio: np.ndarray, audio_stream_end_time):
         """Append an audio chunk to be processed by SimulStreaming."""
             
-        # Convert numpy array to torch tensor
-        audio_tensor = torch.from_numpy(audio).float()
+        # The chunk may be a read-only view shared with other consumers:
+        # the session audio buffer copies it, no tensor conversion needed.
         self.end = audio_stream_end_time  # Aligned with whisperstreaming backend behavior
-        self.model.insert_audio(audio_tensor)
+        self.model.insert_audio(audio)
 
     def new_speaker(self, change_speaker: ChangeSpeaker):
         """Handle speaker change event."""
@@ -104,6 +169,13 @@ class SimulStreamingOnlineProcessor:
         concat_buffer = Transcript.from_tokens(tokens= self.buffer, sep='')
         return concat_buffer
 
+    def trim_committed(self, before: float):
+        """Forget the committed tokens ending before `before` (long sessions)."""
+        k = 0
+        while k < len(self.committed) and self.committed[k].end <= before:
+            k += 1
+        del self.committed[:k]
+
     def process_iter(self, is_last=False) -> Tuple[List[ASRToken], float]:
         """
         Process accumulated audio chunks using SimulStreaming.
@@ -119,6 +191,13 @@ class SimulStreamingOnlineProcessor:
             if self.model.cfg.language == "auto" and timestamped_words[0].detected_language is None:
                 self.buffer.extend(timestamped_words)
                 return [], self.end
+
+            if self.language_router is not None and self.model.cfg.language == "auto":
+                router, self.language_router = self.language_router, None
+                routed_asr = router(timestamped_words[0].detected_language)
+                if routed_asr is not None:
+                    self.switch_asr(routed_asr)
+                    return [], self.end
             
             self.committed.extend(timestamped_words)
             self.buffer = []
@@ -217,6 +296,9 @@ class SimulStreamingASR():
                 init_prompt=self.init_prompt,
                 max_context_tokens=self.max_context_tokens,
                 static_init_prompt=self.static_init_prompt,
+                static_kv_cache=self.static_kv_cache,
+                streaming_mel=self.streaming_mel,
+                audio_ctx_bucket=self.audio_ctx_bucket,
         )  
         
         # Set up tokenizer for translation if needed
@@ -250,6 +332,29 @@ class SimulStreamingASR():
             )
         self.shared_model = self.load_model()
 
+        self.encoder_batcher = None
+        if self.encoder_batch_window > 0 and self.encoder_backend == "whisper":
+            logger.info(
+                f"Batching encoder passes across sessions (window={self.encoder_batch_window}s, "
+                f"max batch={self.encoder_max_batch_size})"
+            )
+            self.encoder_batcher = EncoderBatcher(
+                self.shared_model.encoder,
+                batch_window=self.encoder_batch_window,
+                max_batch_size=self.encoder_max_batch_size,
+            )
+
+        self.decoder_batcher = None
+        if self.decoder_batch_window > 0:
+            logger.info(
+                f"Batching decoder steps across sessions (window={self.decoder_batch_window}s, "
+                f"max batch={self.decoder_max_batch_size})"
+            )
+            self.decoder_batcher = DecoderBatcher(
+                self.shared_model.decoder,
+                batch_window=self.decoder_batch_window,
+                max_batch_size=self.decoder_max_batch_size,
+            )
 
     def _resolve_encoder_backend(self, preferred_backend, compatible_whisper_mlx, compatible_faster_whisper):
         choice = preferred_backend or "auto"
@@ -313,6 +418,15 @@ class SimulStreamingASR():
                 whisper_model.transcribe(warmup_audio, language=self.lan if self.lan != 'auto' else None)
         return whisper_model
 
+    def with_language(self, lan, direct_english_translation=False):
+        """Copy for another language or task, sharing the loaded model, encoders and batchers."""
+        asr = copy.copy(self)
+        asr.lan = lan
+        asr.direct_english_translation = direct_english_translation
+        asr.cfg = replace(self.cfg, language=lan, task=direct_english_translation)
+        asr.tokenizer = asr.set_translate_task() if direct_english_translation else None
+        return asr
+
     def set_translate_task(self):
         """Set up translation task."""
         if self.cfg.language == 'auto':
@@ -0,0 +1,227 @@
+import logging
+import os
+import threading
+import weakref
+from concurrent.futures import Future
+from time import time
+from typing import Any, Dict, Hashable, List, Tuple
+
+import torch
+
+from whisperlivekit.cpu_topology import current_topology
+from whisperlivekit.whisper.model import StaticKVCache
+
+logger = logging.getLogger(__name__)
+
+_batchers: "weakref.WeakSet[MicroBatcher]" = weakref.WeakSet()
+
+
+def _restart_batchers() -> None:
+    # threads do not survive fork (pre-forked workers): each process gets its own workers
+    for batcher in list(_batchers):
+        batcher._start()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_restart_batchers)
+
+
+class MicroBatcher:
+    """
+    Background worker that groups requests submitted by concurrent sessions.
+
+    Sessions run `AlignAtt.infer()` on their own threads and block on the
+    returned future. The worker waits at most `batch_window` seconds after the
+    first pending request, then runs one batched call per compatible group
+    (requests sharing the same key).
+    """
+
+    def __init__(self, batch_window: float, max_batch_size: int, name: str = "wlk-batcher", lane: int = 0):
+        self.batch_window = batch_window
+        self.max_batch_size = max(1, max_batch_size)
+        self.name = name
+        self.lane = lane  # inference lane of the worker thread, with --cpu-lanes
+        self._start()
+        _batchers.add(self)
+
+    def _start(self) -> None:
+        self._pending: List[Tuple[Hashable, Any, Future]] = []
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._worker, name=self.name, daemon=True)
+        self._thread.start()
+
+    def submit(self, key: Hashable, payload: Any) -> Future:
+        future = Future()
+        with self._condition:
+            self._pending.append((key, payload, future))
+            self._condition.notify()
+        return future
+
+    def run_batch(self, payloads: List[Any]) -> List[Any]:
+        """Process a group of compatible payloads, returning one result per payload."""
+        raise NotImplementedError
+
+    def _batch_full(self) -> bool:
+        return len(self._pending) >= self.max_batch_size
+
+    def _collect(self) -> List[Tuple[Hashable, Any, Future]]:
+        with self._condition:
+            while not self._pending:
+                self._condition.wait()
+            deadline = time() + self.batch_window
+            while not self._batch_full():
+                remaining = deadline - time()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            requests, self._pending = self._pending, []
+        return requests
+
+    def _worker(self) -> None:
+        topology = current_topology()
+        if topology is not None:
+            topology.enter_lane(self.lane)
+        while True:
+            requests = self._collect()
+            groups: Dict[Hashable, List[Tuple[Any, Future]]] = {}
+            for key, payload, future in requests:
+                groups.setdefault(key, []).append((payload, future))
+            for group in groups.values():
+                for i in range(0, len(group), self.max_batch_size):
+                    self._dispatch(group[i:i + self.max_batch_size])
+
+    def _dispatch(self, group: List[Tuple[Any, Future]]) -> None:
+        payloads = [payload for payload, _ in group]
+        try:
+            with torch.no_grad():
+                results = self.run_batch(payloads)
+        except Exception as e:
+            logger.exception(f"Batched call failed for {len(group)} request(s): {e}")
+            for _, future in group:
+                future.set_exception(e)
+            return
+        for (_, future), result in zip(group, results):
+            future.set_result(result)
+
+
+class EncoderBatcher(MicroBatcher):
+    """Runs one batched `AudioEncoder.forward` over the padded mel windows of all sessions."""
+
+    def __init__(self, encoder: torch.nn.Module, batch_window: float = 0.01, max_batch_size: int = 8):
+        self.encoder = encoder
+        super().__init__(batch_window, max_batch_size, name="wlk-encoder-batcher", lane=0)
+
+    def encode(self, mel: torch.Tensor) -> torch.Tensor:
+        """
+        Encode a mel window of shape (batch, n_mels, n_frames).
+
+        Blocks until the batch containing this window has been encoded and
+        returns this session's slice of the encoder features.
+        """
+        key = (tuple(mel.shape[1:]), mel.dtype, str(mel.device))
+        return self.submit(key, mel).result()
+
+    def run_batch(self, mels: List[torch.Tensor]) -> List[torch.Tensor]:
+        if len(mels) == 1:
+            return [self.encoder(mels[0])]
+        features = self.encoder(torch.cat(mels, dim=0))
+        return list(features.split([mel.shape[0] for mel in mels], dim=0))
+
+
+class DecoderBatcher(MicroBatcher):
+    """
+    Runs one `TextDecoder` step for every session that is mid-decode.
+
+    Only single-token steps on an already filled kv_cache are batched: token
+    queries are stacked so that the projections, MLPs and logits run once for
+    all sessions, while self- and cross-attention are computed per session on
+    its own (ragged) kv_cache. Sessions announce their decoding loop with
+    `begin()`/`end()` so that a batch is dispatched as soon as every active
+    session has submitted its step.
+    """
+
+    def __init__(self, decoder: torch.nn.Module, batch_window: float = 0.002, max_batch_size: int = 16):
+        self.decoder = decoder
+        self._active = 0
+        super().__init__(batch_window, max_batch_size, name="wlk-decoder-batcher", lane=1)
+
+    def begin(self) -> None:
+        with self._condition:
+            self._active += 1
+
+    def end(self) -> None:
+        with self._condition:
+            self._active = max(0, self._active - 1)
+            self._condition.notify()
+
+    def _batch_full(self) -> bool:
+        return len(self._pending) >= min(self.max_batch_size, max(1, self._active))
+
+    def step(self, tokens: torch.Tensor, kv_cache: dict) -> Tuple[torch.Tensor, List[torch.Tensor]]:
+        """
+        Decode one token per row of `tokens` (shape (n_rows, 1)) against `kv_cache`.
+
+        Returns the same `(logits, cross_attns)` pair as
+        `TextDecoder.forward(..., return_cross_attn=True)` and updates the
+        self-attention entries of `kv_cache` in place.
+        """
+        cross_key = kv_cache[self.decoder.blocks[0].cross_attn.key_cache_id]
+        key = (cross_key.shape[1], cross_key.dtype, str(cross_key.device))
+        return self.submit(key, (tokens, kv_cache)).result()
+
+    def run_batch(self, payloads: List[Tuple[torch.Tensor, dict]]) -> List[Tuple[torch.Tensor, List[torch.Tensor]]]:
+        decoder = self.decoder
+        first_self_attn_key = decoder.blocks[0].attn.key_cache_id
+        rows, positions, start = [], [], 0
+        for tokens, kv_cache in payloads:
+            rows.append(slice(start, start + tokens.shape[0]))
+            if isinstance(kv_cache, StaticKVCache):
+                offset = kv_cache.offset
+            else:
+                offset = kv_cache[first_self_attn_key].shape[1]
+            positions += [offset] * tokens.shape[0]
+            start += tokens.shape[0]
+
+        tokens = torch.cat([tokens for tokens, _ in payloads], dim=0)
+        positions = torch.tensor(positions, device=tokens.device)
+        dtype = payloads[0][1][decoder.blocks[0].cross_attn.key_cache_id].dtype
+        x = decoder.token_embedding(tokens) + decoder.positional_embedding[positions].unsqueeze(1)
+        x = x.to(dtype)
+
+        cross_attns: List[List[torch.Tensor]] = [[] for _ in payloads]
+        for block in decoder.blocks:
+            attn = block.attn
+            h = block.attn_ln(x)
+            q, k, v = attn.query(h), attn.key(h), attn.value(h)
+            wv = []
+            for r, (_, kv_cache) in zip(rows, payloads):
+                if isinstance(kv_cache, StaticKVCache):
+                    session_k = kv_cache.write(attn.key_cache_id, k[r].detach())
+                    session_v = kv_cache.write(attn.value_cache_id, v[r].detach())
+                else:
+                    session_k = torch.cat([kv_cache[attn.key_cache_id], k[r]], dim=1).detach()
+                    session_v = torch.cat([kv_cache[attn.value_cache_id], v[r]], dim=1).detach()
+                    kv_cache[attn.key_cache_id] = session_k
+                    kv_cache[attn.value_cache_id] = session_v
+                wv.append(attn.qkv_attention(q[r], session_k, session_v)[0])
+            x = x + attn.out(torch.cat(wv, dim=0))
+
+            cross_attn = block.cross_attn
+            q = cross_attn.query(block.cross_attn_ln(x))
+            wv = []
+            for i, (r, (_, kv_cache)) in enumerate(zip(rows, payloads)):
+                out, qk = cross_attn.qkv_attention(
+                    q[r], kv_cache[cross_attn.key_cache_id], kv_cache[cross_attn.value_cache_id]
+                )
+                wv.append(out)
+                cross_attns[i].append(qk)
+            x = x + cross_attn.out(torch.cat(wv, dim=0))
+            x = x + block.mlp(block.mlp_ln(x))
+
+        for _, kv_cache in payloads:
+            if isinstance(kv_cache, StaticKVCache):
+                kv_cache.advance(1)
+
+        x = decoder.ln(x)
+        logits = (x @ torch.transpose(decoder.token_embedding.weight.to(x.dtype), 0, 1)).float()
+        return [(logits[r], session_cross_attns) for r, session_cross_attns in zip(rows, cross_attns)]
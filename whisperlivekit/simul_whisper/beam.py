@@ -1,6 +1,7 @@
 from torch import Tensor
 
 from whisperlivekit.whisper.decoding import PyTorchInference
+from whisperlivekit.whisper.model import StaticKVCache
 
 
 class BeamPyTorchInference(PyTorchInference):
@@ -14,6 +15,9 @@ class BeamPyTorchInference(PyTorchInference):
 
     def rearrange_kv_cache(self, source_indices):
         if source_indices != list(range(len(source_indices))):
+            if isinstance(self.kv_cache, StaticKVCache):
+                self.kv_cache.rearrange(source_indices)
+                return
             for cache_id in self._kv_cache_ids():
                 if cache_id in self.kv_cache:
                     self.kv_cache[cache_id] = self.kv_cache[cache_id][source_indices].detach()
@@ -21,4 +21,7 @@ class AlignAttConfig():
     init_prompt: str = field(default=None)
     static_init_prompt: str = field(default=None)
     max_context_tokens: int = field(default=None)
+    static_kv_cache: bool = False
+    streaming_mel: bool = False
+    audio_ctx_bucket: int = field(default=0, metadata = {"help": "0 encodes the full 30s context, otherwise the content rounded up to a multiple of this many encoder positions"})
     
\ No newline at end of file
@@ -2,6 +2,10 @@ from dataclasses import dataclass, field
 from typing import Any, Dict, List, Optional, Tuple
 import torch
 
+from whisperlivekit.whisper.model import StaticKVCache
+
+from .audio_buffer import AudioRingBuffer
+
 
 @dataclass
 class DecoderState:
@@ -20,7 +24,8 @@ class DecoderState:
     align_source: Dict[int, List[Tuple[int, int]]] = field(default_factory=dict)
     num_align_heads: int = 0
     
-    segments: List[torch.Tensor] = field(default_factory=list)
+    segments: AudioRingBuffer = field(default_factory=AudioRingBuffer)
+    mel: Any = None
     
     context: Any = None
     
@@ -47,12 +52,19 @@ class DecoderState:
     
     def clean_cache(self):
         """Clean the kv_cache after each inference step."""
-        self.kv_cache = {}
+        self._clear_kv_cache()
         if self.decoder_type == "beam" and self.inference is not None:
             self.inference.kv_cache = self.kv_cache
             if self.token_decoder is not None:
                 self.token_decoder.reset()
     
+    def _clear_kv_cache(self):
+        """Empty the kv_cache, keeping the preallocated buffers of a StaticKVCache."""
+        if isinstance(self.kv_cache, StaticKVCache):
+            self.kv_cache.reset()
+        else:
+            self.kv_cache = {}
+
     def reset(self, rewind_threshold: int = 200):
         """
         Reset transient state for a new segment.
@@ -73,8 +85,8 @@ class DecoderState:
             rewind_threshold: Value for resetting last_attend_frame
         """
         self.reset(rewind_threshold)
-        self.segments = []
+        self.segments.clear()
         self.tokens = []
-        self.kv_cache = {}
+        self._clear_kv_cache()
         self.first_timestamp = None
 
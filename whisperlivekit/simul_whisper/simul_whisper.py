@@ -5,8 +5,8 @@ from typing import List, Optional, Tuple
 
 import numpy as np
 import torch
-import torch.nn.functional as F
 
+from whisperlivekit import metrics
 from whisperlivekit.backend_support import (faster_backend_available,
                                             mlx_backend_available)
 from whisperlivekit.timed_objects import ASRToken
@@ -16,13 +16,16 @@ from whisperlivekit.whisper.audio import (N_FRAMES, N_SAMPLES,
                                           log_mel_spectrogram, pad_or_trim)
 from whisperlivekit.whisper.decoding import (BeamSearchDecoder, GreedyDecoder,
                                              SuppressTokens)
-from whisperlivekit.whisper.timing import median_filter
+from whisperlivekit.whisper.model import StaticKVCache
 
 from ..timed_objects import PUNCTUATION_MARKS
+from .alignment import AlignmentTracker
+from .audio_buffer import AudioRingBuffer
 from .beam import BeamPyTorchInference
 from .config import AlignAttConfig
 from .decoder_state import DecoderState
 from .eow_detection import fire_at_boundary, load_cif
+from .streaming_mel import StreamingLogMel
 from .token_buffer import TokenBuffer
 
 DEC_PAD = 50257
@@ -85,11 +88,17 @@ class AlignAtt:
             loaded_model=None,
             mlx_encoder=None,
             fw_encoder=None,
+            encoder_batcher=None,
+            decoder_batcher=None,
         ) -> None:
         # Shared model reference (can be shared across sessions)
         self.model = loaded_model
         self.mlx_encoder = mlx_encoder
         self.fw_encoder = fw_encoder            
+        # Optional cross-session scheduler batching the whisper encoder pass
+        self.encoder_batcher = encoder_batcher
+        # Optional cross-session scheduler batching single-token decoder steps
+        self.decoder_batcher = decoder_batcher
         if fw_encoder:
             self.fw_feature_extractor = FeatureExtractor(feature_size=self.model.dims.n_mels)
         self.coreml_encoder_tuple = None
@@ -116,8 +125,11 @@ class AlignAtt:
         else:
             self.max_context_tokens = self.cfg.max_context_tokens
 
+        # SessionTracer of the session, if traced
+        self.tracer = None
+
         # Initialize per-session state
-        self.state = DecoderState()
+        self.state = DecoderState(segments=AudioRingBuffer(int(cfg.audio_max_len * 16000)))
         self._init_state(cfg)
         
     def _init_state(self, cfg: AlignAttConfig):
@@ -169,6 +181,17 @@ class AlignAtt:
         self.init_tokens()
         self.init_context()
 
+        if cfg.static_kv_cache:
+            self.state.kv_cache = StaticKVCache(self.max_text_len)
+
+        # Incremental front end, only for the whisper encoder
+        if cfg.streaming_mel and not (self.use_mlcore or self.mlx_encoder or self.fw_encoder):
+            self.state.mel = StreamingLogMel(
+                n_mels=self.model.dims.n_mels,
+                capacity_frames=int(cfg.audio_max_len * 100) + 1,
+                device=self.device,
+            )
+
         # Set up decoder type
         self.state.decoder_type = cfg.decoder_type
         if cfg.decoder_type == "greedy":
@@ -209,8 +232,9 @@ class AlignAtt:
         self.state.context = TokenBuffer.empty(**kw)
         if self.cfg.static_init_prompt is not None:
             self.state.context = TokenBuffer.from_text(self.cfg.static_init_prompt, **kw)
+            self.state.context.pin()
         if self.cfg.init_prompt is not None:
-            self.state.context.text += self.cfg.init_prompt
+            self.state.context.append_text(self.cfg.init_prompt)
 
     def init_tokens(self):
         logger.debug(f"init tokens, {len(self.state.segments)}")
@@ -225,22 +249,18 @@ class AlignAtt:
         self.state.tokens = [self.state.initial_tokens]
 
     def trim_context(self):
-        logger.info("Trimming context")
-        c = len(self.state.context.as_token_ids()) - len(self.state.context.prefix_token_ids)
-        logger.info(f"Context text: {self.state.context.as_text()}")
+        logger.debug("Trimming context")
+        c = len(self.state.context)
         l = sum(t.shape[1] for t in self.state.tokens) + c
-        if self.cfg.static_init_prompt is None:
-            after = 0
-        else:
-            after = len(self.cfg.static_init_prompt)
         while c > self.max_context_tokens or l > self.max_text_len - 20:
-            t = self.state.context.trim_words(after=after)
+            t = self.state.context.trim_words()
             l -= t
             c -= t
             logger.debug(f"len {l}, c {c}, max_context_tokens {self.max_context_tokens}")
             if t == 0:
                 break
-        logger.info(f"Context after trim: {self.state.context.text} (len: {l})")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Context after trim: {self.state.context.text} (len: {l})")
 
 
     def logits(
@@ -250,6 +270,10 @@ class AlignAtt:
         return_cross_attn: bool = False
     ):
         """Get logits from decoder, optionally returning cross-attention weights."""
+        if self.decoder_batcher is not None and return_cross_attn and tokens.shape[1] == 1:
+            kv_cache = self.state.kv_cache if self.state.decoder_type == "greedy" else self.state.inference.kv_cache
+            if kv_cache:
+                return self.decoder_batcher.step(tokens, kv_cache)
         if self.state.decoder_type == "greedy":
             return self.model.decoder(
                 tokens, audio_features, 
@@ -272,10 +296,10 @@ class AlignAtt:
         self.init_context()
         logger.debug(f"Context: {self.state.context}")
         if not complete and len(self.state.segments) > 2:
-            self.state.segments = self.state.segments[-2:]
+            self.state.segments.keep_last_chunks(2)
         else:
             logger.debug("removing all segments.")
-            self.state.segments = []
+            self.state.segments.clear()
         self.state.log_segments += 1
         self.state.pending_incomplete_tokens = []
 
@@ -313,8 +337,7 @@ class AlignAtt:
     ### audio buffer 
 
     def segments_len(self):
-        segments_len = sum(s.shape[0] for s in self.state.segments) / 16000
-        return segments_len
+        return self.state.segments.duration()
 
     def _apply_minseglen(self):
         segments_len = self.segments_len()
@@ -332,11 +355,10 @@ class AlignAtt:
         # len of audio is bigger than buffer_len. Going to remove the first segment
         segments_len = self.segments_len()
         while len(self.state.segments) > 1 and segments_len > self.cfg.audio_max_len:
-            removed_len = self.state.segments[0].shape[0] / 16000
+            removed_len = self.state.segments.pop_first_chunk() / 16000
             segments_len -= removed_len
             self.state.last_attend_frame -= int(TOKENS_PER_SECOND * removed_len)
             self.state.cumulative_time_offset += removed_len  # Track cumulative time removed
-            self.state.segments = self.state.segments[1:]
             logger.debug(f"remove segments: {len(self.state.segments)} {len(self.state.tokens)}, cumulative offset: {self.state.cumulative_time_offset:.2f}s")
             if len(self.state.tokens) > 1:
                 self.state.context.append_token_ids(self.state.tokens[1][0, :].tolist())
@@ -390,16 +412,15 @@ class AlignAtt:
             return []
         if not self._apply_minseglen():
             logger.debug(f"applied minseglen {self.cfg.audio_min_len} > {self.segments_len()}.")
-            input_segments = torch.cat(self.state.segments, dim=0)
             return []
 
-        # input_segments is concatenation of audio, it's one array
-        if len(self.state.segments) > 1:
-            input_segments = torch.cat(self.state.segments, dim=0)
-        else:
-            input_segments = self.state.segments[0]
+        # input_segments is the buffered audio, it's one contiguous array
+        input_segments = self.state.segments.view()
 
         beg_encode = time()
+        end_mel = None  # the other encoders compute their features themselves
+        # offset of the first mel frame from the start of the buffered audio, in seconds
+        mel_lead = 0.0
         if self.use_mlcore:
             coreml_encoder, coreml_input_name, coreml_output_name = self.coreml_encoder_tuple
             mel_padded = log_mel_spectrogram(
@@ -440,16 +461,39 @@ class AlignAtt:
             except TypeError: # Normally the cpu condition should prevent having exceptions, but just in case:
                 encoder_feature = torch.as_tensor(np.array(encoder_feature_ctranslate), device=self.device)
         else:
-            # mel + padding to 30s
-            mel_padded = log_mel_spectrogram(input_segments, n_mels=self.model.dims.n_mels, padding=N_SAMPLES, 
-                                                device=self.device).unsqueeze(0)
-            # trim to 3000
-            mel = pad_or_trim(mel_padded, N_FRAMES)
-            # the len of actual audio
-            content_mel_len = int((mel_padded.shape[2] - mel.shape[2])/2)
-            encoder_feature = self.model.encoder(mel)
+            if self.state.mel is not None:
+                mel, content_mel_len, lead = self.state.mel.update(input_segments, self.state.segments.evicted_samples)
+                mel_lead = lead / 16000
+            else:
+                # mel + padding to 30s
+                mel_padded = log_mel_spectrogram(input_segments, n_mels=self.model.dims.n_mels, padding=N_SAMPLES, 
+                                                    device=self.device).unsqueeze(0)
+                # trim to 3000
+                mel = pad_or_trim(mel_padded, N_FRAMES)
+                # the len of actual audio
+                content_mel_len = int((mel_padded.shape[2] - mel.shape[2])/2)
+            if self.cfg.audio_ctx_bucket > 0:
+                # encode only the content, rounded up to a bucket, instead of the full 30s
+                bucket = self.cfg.audio_ctx_bucket
+                n_audio_ctx = min(self.model.dims.n_audio_ctx, (content_mel_len // bucket + 1) * bucket)
+                mel = mel[:, :, :2 * n_audio_ctx]
+            end_mel = time()
+            if self.encoder_batcher is not None:
+                encoder_feature = self.encoder_batcher.encode(mel)
+            else:
+                encoder_feature = self.model.encoder(mel)
         end_encode = time()
-        # print('Encoder duration:', end_encode-beg_encode)
+        if end_mel is not None:
+            metrics.observe_stage("mel", end_mel - beg_encode)
+        metrics.observe_stage("encoder", end_encode - (end_mel or beg_encode))
+        tracer = self.tracer
+        if tracer is not None:
+            # end of the buffered audio, in stream time
+            audio_end = self.state.global_time_offset + self.state.cumulative_time_offset + self.segments_len()
+            if end_mel is not None:
+                tracer.add("mel", beg_encode, end_mel, audio_time=audio_end)
+            tracer.add("encoder", end_mel or beg_encode, end_encode, audio_time=audio_end,
+                       args={"audio_seconds": round(self.segments_len(), 2)})
                 
         if self.cfg.language == "auto" and self.state.detected_language is None and self.state.first_timestamp:
             seconds_since_start = self.segments_len() - self.state.first_timestamp
@@ -482,95 +526,109 @@ class AlignAtt:
         
         l_absolute_timestamps = []
         
-        accumulated_cross_attns = []
+        alignment = AlignmentTracker(self.state.align_source, self.state.num_align_heads)
         
-        while not completed and current_tokens.shape[1] < self.max_text_len:  # bos is 3 tokens
+        beg_decode = time()
+        if self.decoder_batcher is not None:
+            self.decoder_batcher.begin()
+        try:
+            while not completed and current_tokens.shape[1] < self.max_text_len:  # bos is 3 tokens
+                beg_step = time()
 
-            if new_segment:
-                tokens_for_logits = current_tokens
-            else:
-                # only need to use the last token except in the first forward pass
-                tokens_for_logits = current_tokens[:, -1:]
+                if new_segment:
+                    tokens_for_logits = current_tokens
+                else:
+                    # only need to use the last token except in the first forward pass
+                    tokens_for_logits = current_tokens[:, -1:]
 
-            # Get logits and cross-attention weights from decoder
-            result = self.logits(tokens_for_logits, encoder_feature, return_cross_attn=True)
-            logits, cross_attns = result
+                # Get logits and cross-attention weights from decoder
+                result = self.logits(tokens_for_logits, encoder_feature, return_cross_attn=True)
+                logits, cross_attns = result
             
-            # Accumulate cross-attention from this forward pass
-            accumulated_cross_attns.append(cross_attns)
-
-            if new_segment and self.tokenizer.no_speech is not None:
-                probs_at_sot = logits[:, self.state.sot_index, :].float().softmax(dim=-1)
-                no_speech_probs = probs_at_sot[:, self.tokenizer.no_speech].tolist()
-                if no_speech_probs[0] > self.cfg.nonspeech_prob:
-                    logger.info("no speech, stop")
-                    break
-
-            logits = logits[:, -1, :]  # logits for the last token
-
-            # suppress blank tokens only at the beginning of the segment
-            if new_segment:
-                logits[:, self.tokenizer.encode(" ") + [self.tokenizer.eot]] = -np.inf
-            new_segment = False
-            self.state.suppress_tokens_fn(logits)
-            current_tokens, completed = self.state.token_decoder.update(current_tokens, logits, sum_logprobs)
-
-            logger.debug(f"Decoding completed: {completed}, sum_logprobs: {sum_logprobs.tolist()}, tokens: ")
-            self.debug_print_tokens(current_tokens)
-
-            # Process accumulated cross-attention weights for alignment
-            attn_of_alignment_heads = self._process_cross_attention(accumulated_cross_attns, content_mel_len)
-
-            # for each beam, the most attended frame is:
-            most_attended_frames = torch.argmax(attn_of_alignment_heads[:, -1, :], dim=-1)
+                # Update the running alignment statistics with this forward pass
+                alignment.append(cross_attns)
+
+                if new_segment and self.tokenizer.no_speech is not None:
+                    probs_at_sot = logits[:, self.state.sot_index, :].float().softmax(dim=-1)
+                    no_speech_probs = probs_at_sot[:, self.tokenizer.no_speech].tolist()
+                    if no_speech_probs[0] > self.cfg.nonspeech_prob:
+                        logger.info("no speech, stop")
+                        break
+
+                logits = logits[:, -1, :]  # logits for the last token
+
+                # suppress blank tokens only at the beginning of the segment
+                if new_segment:
+                    logits[:, self.tokenizer.encode(" ") + [self.tokenizer.eot]] = -np.inf
+                new_segment = False
+                self.state.suppress_tokens_fn(logits)
+                current_tokens, completed = self.state.token_decoder.update(current_tokens, logits, sum_logprobs)
+
+                logger.debug(f"Decoding completed: {completed}, sum_logprobs: {sum_logprobs.tolist()}, tokens: ")
+                self.debug_print_tokens(current_tokens)
+                end_step = time()
+
+                # Normalize and filter the newest cross-attention row for alignment
+                attn_of_alignment_heads = alignment.attention(content_mel_len, self.cfg.beam_size, self.device)
+
+                # for each beam, the most attended frame is:
+                most_attended_frames = torch.argmax(attn_of_alignment_heads[:, -1, :], dim=-1)
             
-            # Calculate absolute timestamps accounting for cumulative offset
-            absolute_timestamps = [
-                (frame * 0.02 + self.state.cumulative_time_offset) 
-                for frame in most_attended_frames.tolist()
-            ]
+                # Calculate absolute timestamps accounting for cumulative offset
+                absolute_timestamps = [
+                    (frame * 0.02 + self.state.cumulative_time_offset + mel_lead) 
+                    for frame in most_attended_frames.tolist()
+                ]
             
-            logger.debug(str(most_attended_frames.tolist()) + " most att frames")
-            logger.debug(f"Absolute timestamps: {absolute_timestamps} (offset: {self.state.cumulative_time_offset:.2f}s)")
-
-            most_attended_frame = most_attended_frames[0].item()
-            l_absolute_timestamps.append(absolute_timestamps[0])
-
-            logger.debug("current tokens" + str(current_tokens.shape))
-            if completed:
-                # stripping the last token, the eot
-                current_tokens = current_tokens[:, :-1]
-                break
+                logger.debug(str(most_attended_frames.tolist()) + " most att frames")
+                logger.debug(f"Absolute timestamps: {absolute_timestamps} (offset: {self.state.cumulative_time_offset:.2f}s)")
+
+                most_attended_frame = most_attended_frames[0].item()
+                l_absolute_timestamps.append(absolute_timestamps[0])
+                if tracer is not None:
+                    tracer.add("decoder_step", beg_step, end_step, audio_time=audio_end)
+                    tracer.add("alignment", end_step, time(),
+                               audio_time=absolute_timestamps[0] + self.state.global_time_offset)
+
+                logger.debug("current tokens" + str(current_tokens.shape))
+                if completed:
+                    # stripping the last token, the eot
+                    current_tokens = current_tokens[:, :-1]
+                    break
             
-            # for some rare cases where the attention fails
-            if not is_last and self.state.last_attend_frame - most_attended_frame > self.cfg.rewind_threshold:
-                if current_tokens.shape[1] > 1 and current_tokens[0, -2] >= DEC_PAD:
-                    logger.debug("omit rewinding from special tokens")
-                    self.state.last_attend_frame = most_attended_frame
+                # for some rare cases where the attention fails
+                if not is_last and self.state.last_attend_frame - most_attended_frame > self.cfg.rewind_threshold:
+                    if current_tokens.shape[1] > 1 and current_tokens[0, -2] >= DEC_PAD:
+                        logger.debug("omit rewinding from special tokens")
+                        self.state.last_attend_frame = most_attended_frame
+                    else:
+                        logger.debug(
+                            f"[rewind detected] current attention pos: {most_attended_frame}, "
+                            f"last attention pos: {self.state.last_attend_frame}; omit this segment")
+                        self.state.last_attend_frame = -self.cfg.rewind_threshold
+                        current_tokens = torch.cat(self.state.tokens, dim=1) if len(self.state.tokens) > 0 else self.state.tokens[0]
+                        break
                 else:
-                    logger.debug(
-                        f"[rewind detected] current attention pos: {most_attended_frame}, "
-                        f"last attention pos: {self.state.last_attend_frame}; omit this segment")
-                    self.state.last_attend_frame = -self.cfg.rewind_threshold
-                    current_tokens = torch.cat(self.state.tokens, dim=1) if len(self.state.tokens) > 0 else self.state.tokens[0]
-                    break
-            else:
-                self.state.last_attend_frame = most_attended_frame
+                    self.state.last_attend_frame = most_attended_frame
 
-            if content_mel_len - most_attended_frame <= (4 if is_last else self.cfg.frame_threshold):
-                logger.debug(f"attention reaches the end: {most_attended_frame}/{content_mel_len}")
-                # stripping the last token, the one that is attended too close to the end
-                current_tokens = current_tokens[:, :-1]
-                break
+                if content_mel_len - most_attended_frame <= (4 if is_last else self.cfg.frame_threshold):
+                    logger.debug(f"attention reaches the end: {most_attended_frame}/{content_mel_len}")
+                    # stripping the last token, the one that is attended too close to the end
+                    current_tokens = current_tokens[:, :-1]
+                    break
         
-            # debug print
-            for i in range(self.cfg.beam_size):
-                logger.debug("attn: {}, current pos: {}, current token: {}({})".format(
-                    attn_of_alignment_heads.shape if attn_of_alignment_heads is not None else None,
-                    most_attended_frames[i], 
-                    current_tokens[i, -1].item(),
-                    self.tokenizer.decode([current_tokens[i, -1].item()])
-                ))
+                # debug print
+                for i in range(self.cfg.beam_size):
+                    logger.debug("attn: {}, current pos: {}, current token: {}({})".format(
+                        attn_of_alignment_heads.shape if attn_of_alignment_heads is not None else None,
+                        most_attended_frames[i], 
+                        current_tokens[i, -1].item(),
+                        self.tokenizer.decode([current_tokens[i, -1].item()])
+                    ))
+        finally:
+            if self.decoder_batcher is not None:
+                self.decoder_batcher.end()
+        metrics.observe_stage("decoder", time() - beg_decode)
 
         tokens_to_split = current_tokens[0, token_len_before_decoding:]
 
@@ -638,68 +696,3 @@ class AlignAtt:
             logger.warning(f"[UTF-8 Fix] Holding {len(self.state.pending_incomplete_tokens)} incomplete tokens for next chunk: {self.state.pending_incomplete_tokens}")
 
         return timestamped_words
-
-    def _process_cross_attention(
-        self, 
-        cross_attns: List[torch.Tensor], 
-        content_mel_len: int
-    ) -> torch.Tensor:
-        """
-        Process cross-attention weights from decoder layers for alignment.
-        
-        Args:
-            cross_attns: List of cross-attention tensors from each decoder layer.
-                         Each tensor has shape (batch, n_head, seq_len, audio_len)
-            content_mel_len: Length of actual audio content in mel frames
-            
-        Returns processed attention tensor for alignment, shape (batch, seq_len, content_mel_len)
-        """
-        attn_of_alignment_heads = [[] for _ in range(self.state.num_align_heads)]
-        num_decoder_layers = len(self.model.decoder.blocks)
-
-        if cross_attns and isinstance(cross_attns[0], list):
-            flattened_attns: List[torch.Tensor] = [attn for layer_list in cross_attns for attn in layer_list]
-        else:
-            flattened_attns = cross_attns
-        
-        for idx, attn_mat in enumerate(flattened_attns):
-            layer_rank = idx % num_decoder_layers
-            # attn_mat shape: (batch, n_head, seq_len, audio_len) or (n_head, seq_len, audio_len) for batch=1
-            align_heads_in_layer = self.state.align_source.get(layer_rank, [])
-            if len(align_heads_in_layer) == 0:
-                continue
-            
-            attn_mat = F.softmax(attn_mat, dim=-1)
-            
-            for align_head_rank, head_id in align_heads_in_layer:
-                if self.cfg.beam_size == 1:
-                    # (n_head, seq_len, audio_len) when squeezed
-                    if attn_mat.dim() == 4:
-                        a = attn_mat[0, head_id, :, :]  # (seq_len, audio_len)
-                    else:
-                        a = attn_mat[head_id, :, :]
-                    a = a.unsqueeze(0)  # (1, seq_len, audio_len)
-                else:
-                    # attn_mat: (batch, n_head, seq_len, audio_len)
-                    a = attn_mat[:, head_id, :, :]  # (batch, seq_len, audio_len)
-                attn_of_alignment_heads[align_head_rank].append(a)
-        
-        tmp = []
-        for mat in attn_of_alignment_heads:
-            if mat:
-                t = torch.cat(mat, dim=1)  # (batch, total_seq_len, audio_len)
-                tmp.append(t)
-        
-        if not tmp:
-            return torch.zeros(self.cfg.beam_size, 1, content_mel_len, device=self.device)
-        
-        # stck al heads: (batch, num_align_heads, seq_len, audio_len)
-        attn_of_alignment_heads = torch.stack(tmp, dim=1)
-        
-        std, mean = torch.std_mean(attn_of_alignment_heads, dim=-2, keepdim=True, unbiased=False)
-        attn_of_alignment_heads = (attn_of_alignment_heads - mean) / (std + 1e-8)
-        
-        attn_of_alignment_heads = median_filter(attn_of_alignment_heads, 7)
-        attn_of_alignment_heads = attn_of_alignment_heads.mean(dim=1)
-        attn_of_alignment_heads = attn_of_alignment_heads[:, :, :content_mel_len]
-        return attn_of_alignment_heads
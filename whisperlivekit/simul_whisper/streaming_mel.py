@@ -0,0 +1,148 @@
+from typing import Optional, Tuple, Union
+
+import torch
+import torch.nn.functional as F
+
+from whisperlivekit.whisper.audio import (HOP_LENGTH, N_FFT, N_FRAMES,
+                                          mel_filters)
+
+LOG_SILENCE = -10.0  # log10 of the 1e-10 floor, value of all-zero frames
+
+
+class StreamingLogMel:
+    """
+    Incremental `log_mel_spectrogram` of the audio held by an AudioRingBuffer.
+
+    Frames are computed on a fixed grid of the session stream (frame k is
+    centered on sample `origin + k * HOP_LENGTH`, the stream start is reflected
+    like with `torch.stft(center=True)`). A frame is cached once all of its
+    samples have been received; only the frames overlapping the end of the
+    audio are recomputed, zero-padded on the right, at each call. Frames are
+    dropped as the buffer evicts audio, and the global `max - 8.0` clamp is
+    applied when the encoder input is assembled.
+
+    Since the grid is not reset on eviction, the first frame of the buffer
+    may start up to one hop after the first buffered sample; `update()`
+    returns that lead so that timestamps can be corrected.
+    """
+
+    def __init__(
+        self,
+        n_mels: int = 80,
+        capacity_frames: int = N_FRAMES,
+        device: Optional[Union[str, torch.device]] = None,
+    ):
+        self.n_mels = n_mels
+        self.device = device
+        self.window = torch.hann_window(N_FFT, device=device)
+        self.filters = mel_filters(device, n_mels)
+        self._frames = torch.empty(n_mels, 2 * capacity_frames, device=device)
+        self._maxima = torch.empty(2 * capacity_frames, device=device)
+        self.reset(0)
+
+    def reset(self, origin: int) -> None:
+        """Restart the frame grid at absolute sample `origin`."""
+        self.origin = origin
+        self.received = origin
+        self._samples = torch.zeros(0, device=self.device)
+        self._samples_start = origin
+        self.first_frame = 0  # frame index stored at self._frames[:, self._start]
+        self._start = 0
+        self._end = 0
+
+    def _samples_between(self, a: int, b: int) -> torch.Tensor:
+        """Received samples in the absolute range [a, b), zero-filled past the end."""
+        x = self._samples[a - self._samples_start:min(b, self.received) - self._samples_start]
+        if x.shape[0] < b - a:
+            x = F.pad(x, (0, b - a - x.shape[0]))
+        return x
+
+    def _compute(self, k_a: int, k_b: int) -> torch.Tensor:
+        """Log-mel (before clamping) of frames [k_a, k_b), shape (n_mels, k_b - k_a)."""
+        a = self.origin + k_a * HOP_LENGTH - N_FFT // 2
+        b = self.origin + (k_b - 1) * HOP_LENGTH + N_FFT // 2
+        if a < self.origin:
+            left = self.origin - a
+            x = self._samples_between(self.origin, max(b, self.origin + left + 1))
+            x = torch.cat([x[1:left + 1].flip(0), x])[:b - a]
+        else:
+            x = self._samples_between(a, b)
+        stft = torch.stft(x, N_FFT, HOP_LENGTH, window=self.window, center=False, return_complex=True)
+        mel_spec = self.filters @ (stft.abs() ** 2)
+        return torch.clamp(mel_spec, min=1e-10).log10()
+
+    def _store(self, frames: torch.Tensor) -> None:
+        n = frames.shape[1]
+        if self._end + n > self._frames.shape[1]:
+            size = self._end - self._start
+            if size + n > self._frames.shape[1]:
+                storage = torch.empty(self.n_mels, 2 * (size + n), device=self.device)
+                maxima = torch.empty(2 * (size + n), device=self.device)
+            else:
+                storage, maxima = self._frames, self._maxima
+            storage[:, :size] = self._frames[:, self._start:self._end].clone()
+            maxima[:size] = self._maxima[self._start:self._end].clone()
+            self._frames, self._maxima = storage, maxima
+            self._start, self._end = 0, size
+        self._frames[:, self._end:self._end + n] = frames
+        self._maxima[self._end:self._end + n] = frames.amax(dim=0)
+        self._end += n
+
+    def update(self, audio: torch.Tensor, evicted_samples: int) -> Tuple[torch.Tensor, int, int]:
+        """
+        Args:
+            audio: the buffered audio (`AudioRingBuffer.view()`)
+            evicted_samples: absolute stream position of audio[0]
+
+        Returns:
+            mel: encoder input of shape (1, n_mels, N_FRAMES)
+            content_mel_len: number of encoder frames holding audio
+            lead: number of samples between audio[0] and the first mel frame
+        """
+        end = evicted_samples + audio.shape[0]
+        if evicted_samples > self.received or end < self.received:
+            # samples were evicted before being seen: restart from the buffer start
+            self.reset(evicted_samples)
+        new = audio[self.received - evicted_samples:].to(self.device, torch.float32)
+        self._samples = torch.cat([self._samples, new])
+        self.received = end
+
+        # drop the frames centered before the buffer start
+        k_first = -(-(evicted_samples - self.origin) // HOP_LENGTH)
+        if k_first > self.first_frame:
+            self._start = min(self._end, self._start + k_first - self.first_frame)
+            self.first_frame = k_first
+
+        # cache the frames whose window is complete
+        rel = self.received - self.origin
+        k_next = self.first_frame + self._end - self._start
+        k_stable = (rel - N_FFT // 2 - 1) // HOP_LENGTH + 1 if rel > N_FFT // 2 else 0
+        if k_stable > k_next:
+            self._store(self._compute(k_next, k_stable))
+            k_next = k_stable
+            keep_from = max(self.origin, self.origin + k_next * HOP_LENGTH - N_FFT // 2)
+            self._samples = self._samples[keep_from - self._samples_start:]
+            self._samples_start = keep_from
+
+        # recompute the frames overlapping the end of the audio
+        k_audio_end = (rel + N_FFT // 2 - 1) // HOP_LENGTH + 1
+        stable = self._frames[:, self._start:self._end]
+        global_max = self._maxima[self._start:self._end].amax() if self._end > self._start else None
+        if k_audio_end > k_next:
+            tail = self._compute(k_next, k_audio_end)
+            tail_max = tail.amax()
+            global_max = tail_max if global_max is None else torch.maximum(global_max, tail_max)
+            spec = torch.cat([stable, tail], dim=1)
+        else:
+            spec = stable
+
+        mel = torch.full((self.n_mels, N_FRAMES), LOG_SILENCE, device=self.device)
+        n = min(spec.shape[1], N_FRAMES)
+        mel[:, :n] = spec[:, :n]
+        if global_max is not None:
+            mel = torch.maximum(mel, torch.clamp(global_max, min=LOG_SILENCE) - 8.0)
+        mel = (mel + 4.0) / 4.0
+
+        lead = self.origin + self.first_frame * HOP_LENGTH - evicted_samples
+        content_mel_len = ((audio.shape[0] - lead) // HOP_LENGTH) // 2
+        return mel.unsqueeze(0), content_mel_len, lead
@@ -1,38 +1,61 @@
-import sys
+from typing import List
 
 import torch
 
 
 class TokenBuffer:
+    """
+    Rolling decoder context kept as token ids.
+
+    Token ids and word boundaries (token count per word) are the source of
+    truth, so the context is never re-tokenized while decoding. Leading ids
+    can be pinned (static prompt) to protect them from trimming. The text is
+    only decoded when requested, and the context tensors are cached until the
+    buffer changes.
+    """
 
     def __init__(self, text="", tokenizer=None, device=None, prefix_token_ids=[]):
-        self.text = text
         self.prefix_token_ids = prefix_token_ids
         self.tokenizer = tokenizer
         self.device = device
         self.pending_token_ids = []
+        self.token_ids: List[int] = []
+        self.word_lengths: List[int] = []  # number of tokens of each unpinned word
+        self.pinned = 0  # number of leading token ids that are never trimmed
+        self._text = None
+        self._tensors = {}
+        if text:
+            self.append_text(text)
+
+    def _invalidate(self):
+        self._text = None
+        self._tensors = {}
+
+    @property
+    def text(self):
+        if self._text is None:
+            self._text = self.tokenizer.decode(self.token_ids) if self.token_ids else ""
+        return self._text
 
     def as_token_ids(self, tokenizer=None):
-
-        if tokenizer is None:
-            tokenizer = self.tokenizer
-        if tokenizer is None:
-            raise ValueError("Tokenizer is not set.") 
-        return self.prefix_token_ids + tokenizer.encode(self.text)
+        return self.prefix_token_ids + self.token_ids
 
     def as_tensor(self, device=None):
+        return self.as_tensor_beam(1, device=device)
+
+    def as_tensor_beam(self, beam, device=None):
         if device is None:
             device = self.device
         if device is None:
             raise ValueError("Device is not set.")
-        tok_ids = self.as_token_ids()
-        return torch.tensor(tok_ids, 
-                     dtype=torch.long, device=device).unsqueeze(0)
-
-    def as_tensor_beam(self, beam, device=None):
-        t = self.as_tensor(device=device)
-        return t.repeat_interleave(beam, dim=0)
-
+        key = (beam, str(device))
+        t = self._tensors.get(key)
+        if t is None:
+            t = torch.tensor(self.as_token_ids(), dtype=torch.long, device=device).unsqueeze(0)
+            if beam > 1:
+                t = t.repeat_interleave(beam, dim=0)
+            self._tensors[key] = t
+        return t
 
     def as_text(self):
         return self.text
@@ -44,26 +67,52 @@ class TokenBuffer:
     @staticmethod
     def from_text(text, *a, **kw):
         return TokenBuffer(*a, text=text, **kw)
-    
+
     def is_empty(self):
-        return self.text is None or self.text == ""
+        return not self.token_ids
 
-    def trim_words(self, num=1, after=0):
-        '''
-        num: how many words to trim from the beginning
-        after: how many characters to skip (length of the static prompt)
-        '''
+    def __len__(self):
+        return len(self.token_ids)
+
+    def pin(self):
+        """Protect the current content (e.g. the static prompt) from `trim_words`."""
+        self.pinned = len(self.token_ids)
+        self.word_lengths = []
+
+    def _extend(self, token_ids):
+        if not token_ids:
+            return
         tokenizer = self.tokenizer
         assert tokenizer is not None, "Tokenizer is not set."
+        # new ids may continue the last word: re-split it together with them
+        last = self.word_lengths.pop() if self.word_lengths else 0
+        ids = self.token_ids[len(self.token_ids) - last:] + token_ids
+        self.token_ids.extend(token_ids)
+        _, wids = tokenizer.split_to_word_tokens(ids)
+        lengths = [len(wi) for wi in wids]
+        missing = len(ids) - sum(lengths)
+        if missing > 0:
+            lengths.append(missing)
+        self.word_lengths.extend(lengths)
+        self._invalidate()
+
+    def append_text(self, text):
+        tokenizer = self.tokenizer
+        assert tokenizer is not None, "Tokenizer is not set."
+        self._extend(tokenizer.encode(text))
 
-        ids = tokenizer.encode(self.text[after:])
-        words, wids = self.tokenizer.split_to_word_tokens(ids)
-#        print(words, file=sys.stderr)
-#        print(wids, file=sys.stderr)
-        if not words:
+    def trim_words(self, num=1):
+        '''
+        num: how many words to trim from the beginning, after the pinned tokens.
+        Returns the number of removed tokens.
+        '''
+        if not self.word_lengths:
             return 0
-        self.text = self.text[:after] + "".join(words[num:])
-        return sum(len(wi) for wi in wids[:num])
+        n = sum(self.word_lengths[:num])
+        del self.word_lengths[:num]
+        del self.token_ids[self.pinned:self.pinned + n]
+        self._invalidate()
+        return n
 
     def append_token_ids(self, token_ids):
         tokenizer = self.tokenizer
@@ -79,18 +128,17 @@ class TokenBuffer:
                 decoded_partial = tokenizer.decode(all_tokens[:-1])
 
                 if replacement_char not in decoded_partial:
-                    self.text += decoded_partial
+                    self._extend(all_tokens[:-1])
                     self.pending_token_ids = [all_tokens[-1]]
                 else:
                     self.pending_token_ids = all_tokens
             else:
                 self.pending_token_ids = all_tokens
         else:
-            self.text += decoded
+            self._extend(all_tokens)
             self.pending_token_ids = []
 
     def as_split_word_tokens(self):
         tokenizer = self.tokenizer
         assert tokenizer is not None, "Tokenizer is not set."
-        ids = tokenizer.encode(self.text)
-        return tokenizer.split_to_word_tokens(ids)
+        return tokenizer.split_to_word_tokens(self.token_ids)
@@ -163,6 +163,18 @@ class Line(TimedText):
         if self.detected_language:
             _dict['detected_language'] = self.detected_language
         return _dict
+
+    def to_segment_dict(self, segment_id: int) -> Dict[str, Any]:
+        """Serialize the line as a segment of the delta protocol."""
+        return {
+            'id': segment_id,
+            'speaker': int(self.speaker) if self.speaker != -1 else 1,
+            'text': self.text or '',
+            'start': round(self.start, 2),
+            'end': round(self.end, 2),
+            'language': self.detected_language,
+            'translation': self.translation,
+        }
     
     def build_from_tokens(self, tokens: List[ASRToken]) -> "Line":
         """Populate line attributes from a contiguous token list."""
@@ -202,6 +214,7 @@ class FrontData():
     buffer_translation: str = ''
     remaining_time_transcription: float = 0.
     remaining_time_diarization: float = 0.
+    archived_lines: int = 0  # number of lines released to the archive, before `lines`
     
     def to_dict(self) -> Dict[str, Any]:
         """Serialize the front-end data payload."""
@@ -216,6 +229,8 @@ class FrontData():
         }
         if self.error:
             _dict['error'] = self.error
+        if self.archived_lines:
+            _dict['archived_lines'] = self.archived_lines
         return _dict
 
 @dataclass  
@@ -1,3 +1,6 @@
+from bisect import bisect_left, bisect_right
+from dataclasses import replace
+from math import inf
 from time import time
 from typing import Any, List, Optional, Tuple, Union
 
@@ -7,6 +10,24 @@ from whisperlivekit.timed_objects import (ASRToken, Line, Segment, Silence,
 
 
 class TokensAlignment:
+    """
+    Builds the output lines from the tokens, diarization and translation
+    received so far.
+
+    Lines are built incrementally: tokens are folded into the lines once, and
+    lines that can no longer change (closed by a silence, or by punctuation
+    with a final speaker when diarization is enabled, or while diarization
+    is paused) are kept as is. Only the
+    tail after the last committed boundary is re-derived at each call. Cached
+    lines are never modified in place, a changed line is replaced by a copy,
+    so that previously returned lines stay valid for comparison.
+
+    Speakers and translations are attributed with sweeps over time-sorted
+    intervals: a cursor skips the speaker intervals that end before the
+    segments still to be attributed, and a line only gets its translation
+    recomputed when it changed or when a new translation segment may fall
+    within it.
+    """
 
     def __init__(self, state: Any, args: Any, sep: Optional[str]) -> None:
         self.state = state
@@ -27,6 +48,37 @@ class TokensAlignment:
         self.sep: str = sep if sep is not None else ' '
         self.beg_loop: Optional[float] = None
 
+        # lines split on silences only (no diarization)
+        self._lines: List[Line] = []
+        self._lines_scanned: int = 0
+        self._line_open: bool = False
+
+        # punctuation segments closed so far, and start of the open one
+        self._punctuation_segments: List[Segment] = []
+        self._punctuation_scanned: int = 0
+        self._segment_start_idx: int = 0
+
+        # diarization: merged speaker segments, and lines of the segments whose speaker is final
+        self._merged_diarization: List[SpeakerSegment] = []
+        self._diarization_merged: int = 0
+        self._diarization_lines: List[Line] = []
+        self._final_segments: int = 0
+        # first merged speaker interval that may overlap the segments not committed yet
+        self._diarization_cursor: int = 0
+        # audio time up to which diarization was paused (load shedding): the
+        # segments past the diarized audio and before it are committed without a speaker
+        self.unattributed_until: float = 0.0
+
+        # start times and indices of the translation segments, sorted by start time
+        self._translation_starts: List[float] = []
+        self._translation_indices: List[int] = []
+        # lines of the previous call, with their translation, and earliest start of the segments received since
+        self._translation_sources: List[Line] = []
+        self._translated_lines: List[Line] = []
+        self._translation_dirty_from: float = inf
+        # end of the last translation segment received
+        self.translated_until: float = 0.0
+
     def update(self) -> None:
         """Drain state buffers into the running alignment context."""
         self.new_tokens, self.state.new_tokens = self.state.new_tokens, []
@@ -36,45 +88,78 @@ class TokensAlignment:
 
         self.all_tokens.extend(self.new_tokens)
         self.all_diarization_segments.extend(self.new_diarization)
-        self.all_translation_segments.extend(self.new_translation)
+        for ts in self.new_translation:
+            if ts.text:
+                i = bisect_right(self._translation_starts, ts.start)
+                self._translation_starts.insert(i, ts.start)
+                self._translation_indices.insert(i, len(self.all_translation_segments))
+                self._translation_dirty_from = min(self._translation_dirty_from, ts.start)
+            self.all_translation_segments.append(ts)
+            if ts.end is not None:
+                self.translated_until = max(self.translated_until, ts.end)
         self.new_translation_buffer = self.state.new_translation_buffer
 
-    def add_translation(self, line: Line) -> None:
-        """Append translated text segments that overlap with a line."""
-        for ts in self.all_translation_segments:
-            if ts.is_within(line):
-                line.translation += ts.text + (self.sep if ts.text else '')
-            elif line.translation:
+    def add_translation(self, line: Line) -> Line:
+        """Return the line with the text of the translation segments that lie within it."""
+        translation = ''
+        i = bisect_left(self._translation_starts, line.start)
+        while i < len(self._translation_indices):
+            ts = self.all_translation_segments[self._translation_indices[i]]
+            if not ts.is_within(line):
                 break
+            translation += ts.text + self.sep
+            i += 1
+        if translation == line.translation:
+            return line
+        return replace(line, translation=translation)
 
+    def _translate_lines(self, lines: List[Line]) -> List[Line]:
+        """Add the translations, reusing the result of the previous call for the lines that cannot have changed."""
+        sources, translated = self._translation_sources, self._translated_lines
+        dirty_from = self._translation_dirty_from
+        result = []
+        for i, line in enumerate(lines):
+            # a new translation segment only falls within lines ending after its start
+            if i < len(sources) and line is sources[i] and line.end < dirty_from:
+                result.append(translated[i])
+            else:
+                result.append(self.add_translation(line))
+        self._translation_sources, self._translated_lines = lines, result
+        self._translation_dirty_from = inf
+        return result
 
-    def compute_punctuations_segments(self, tokens: Optional[List[ASRToken]] = None) -> List[Segment]:
-        """Group tokens into segments split by punctuation and explicit silence."""
-        segments = []
-        segment_start_idx = 0
-        for i, token in enumerate(self.all_tokens):
+    def _extend_punctuation_segments(self) -> None:
+        """Close the segments ended by the tokens received since the last call."""
+        tokens = self.all_tokens
+        for i in range(self._punctuation_scanned, len(tokens)):
+            token = tokens[i]
             if token.is_silence():
                 previous_segment = Segment.from_tokens(
-                        tokens=self.all_tokens[segment_start_idx: i],
+                        tokens=tokens[self._segment_start_idx: i],
                     )
                 if previous_segment:
-                    segments.append(previous_segment)
+                    self._punctuation_segments.append(previous_segment)
                 segment = Segment.from_tokens(
                     tokens=[token],
                     is_silence=True
                 )
-                segments.append(segment)
-                segment_start_idx = i+1
+                self._punctuation_segments.append(segment)
+                self._segment_start_idx = i+1
             else:
                 if token.has_punctuation():
                     segment = Segment.from_tokens(
-                        tokens=self.all_tokens[segment_start_idx: i+1],
+                        tokens=tokens[self._segment_start_idx: i+1],
                     )
-                    segments.append(segment)
-                    segment_start_idx = i+1
+                    self._punctuation_segments.append(segment)
+                    self._segment_start_idx = i+1
+        self._punctuation_scanned = len(tokens)
 
+    def compute_punctuations_segments(self, tokens: Optional[List[ASRToken]] = None) -> List[Segment]:
+        """Group tokens into segments split by punctuation and explicit silence."""
+        self._extend_punctuation_segments()
+        segments = list(self._punctuation_segments)
         final_segment = Segment.from_tokens(
-            tokens=self.all_tokens[segment_start_idx:],
+            tokens=self.all_tokens[self._segment_start_idx:],
         )
         if final_segment:
             segments.append(final_segment)
@@ -83,14 +168,13 @@ class TokensAlignment:
 
     def concatenate_diar_segments(self) -> List[SpeakerSegment]:
         """Merge consecutive diarization slices that share the same speaker."""
-        if not self.all_diarization_segments:
-            return []
-        merged = [self.all_diarization_segments[0]]
-        for segment in self.all_diarization_segments[1:]:
-            if segment.speaker == merged[-1].speaker:
+        merged = self._merged_diarization
+        for segment in self.all_diarization_segments[self._diarization_merged:]:
+            if merged and segment.speaker == merged[-1].speaker:
                 merged[-1].end = segment.end
             else:
                 merged.append(segment)
+        self._diarization_merged = len(self.all_diarization_segments)
         return merged
 
 
@@ -102,41 +186,175 @@ class TokensAlignment:
 
         return max(0, end - start)
 
+    @staticmethod
+    def _skip_ended(diarization_segments: List[SpeakerSegment], cursor: int, start: float) -> int:
+        """Move the cursor past the speaker intervals that end before `start`."""
+        while cursor < len(diarization_segments) and diarization_segments[cursor].end <= start:
+            cursor += 1
+        return cursor
+
+    def _attribute_speaker(self, punctuation_segment: Segment, diarization_segments: List[SpeakerSegment], cursor: int = 0) -> None:
+        """Give the segment the speaker it overlaps the most, scanning the intervals from `cursor` until they start after it."""
+        max_overlap = 0.0
+        max_overlap_speaker = 1
+        for i in range(cursor, len(diarization_segments)):
+            diarization_segment = diarization_segments[i]
+            if diarization_segment.start >= punctuation_segment.end:
+                break
+            intersec = self.intersection_duration(punctuation_segment, diarization_segment)
+            if intersec > max_overlap:
+                max_overlap = intersec
+                max_overlap_speaker = diarization_segment.speaker + 1
+        punctuation_segment.speaker = max_overlap_speaker
+
+    @staticmethod
+    def _append_segment(lines: List[Line], segment: Segment) -> None:
+        """Add a segment to the lines, extending the last line (as a copy) when the speaker is the same."""
+        if lines and segment.speaker == lines[-1].speaker:
+            last = lines[-1]
+            lines[-1] = replace(
+                last,
+                text=last.text + segment.text if last.text else last.text,
+                end=segment.end,
+            )
+        else:
+            lines.append(Line().build_from_segment(segment))
+
     def get_lines_diarization(self) -> Tuple[List[Line], str]:
         """Build lines when diarization is enabled and track overflow buffer."""
         diarization_buffer = ''
-        punctuation_segments = self.compute_punctuations_segments()
+        self._extend_punctuation_segments()
         diarization_segments = self.concatenate_diar_segments()
-        for punctuation_segment in punctuation_segments:
+        diarization_end = diarization_segments[-1].end if diarization_segments else None
+
+        # commit the closed segments whose speaker can no longer change
+        segments = self._punctuation_segments
+        while self._final_segments < len(segments):
+            segment = segments[self._final_segments]
+            if not segment.is_silence():
+                if diarization_end is None or segment.end > diarization_end or segment.start >= diarization_end:
+                    if segment.start < (diarization_end or 0.0) or segment.end > self.unattributed_until:
+                        break
+                else:
+                    self._diarization_cursor = self._skip_ended(diarization_segments, self._diarization_cursor, segment.start)
+                    self._attribute_speaker(segment, diarization_segments, self._diarization_cursor)
+            self._append_segment(self._diarization_lines, segment)
+            self._final_segments += 1
+
+        # speakers are attributed to copies: a cached segment can go back to the diarization buffer
+        tail = [replace(segment) for segment in segments[self._final_segments:]]
+        final_segment = Segment.from_tokens(
+            tokens=self.all_tokens[self._segment_start_idx:],
+        )
+        if final_segment:
+            tail = tail + [final_segment]
+
+        lines = list(self._diarization_lines)
+        cursor = self._diarization_cursor
+        for punctuation_segment in tail:
             if not punctuation_segment.is_silence():
-                if diarization_segments and punctuation_segment.start >= diarization_segments[-1].end:
+                if diarization_segments and punctuation_segment.start >= diarization_end:
                     diarization_buffer += punctuation_segment.text
                 else:
-                    max_overlap = 0.0
-                    max_overlap_speaker = 1
-                    for diarization_segment in diarization_segments:
-                        intersec = self.intersection_duration(punctuation_segment, diarization_segment)
-                        if intersec > max_overlap:
-                            max_overlap = intersec
-                            max_overlap_speaker = diarization_segment.speaker + 1
-                    punctuation_segment.speaker = max_overlap_speaker
-        
-        lines = []
-        if punctuation_segments:
-            lines = [Line().build_from_segment(punctuation_segments[0])]
-            for segment in punctuation_segments[1:]:
-                if segment.speaker == lines[-1].speaker:
-                    if lines[-1].text:
-                        lines[-1].text += segment.text
-                    lines[-1].end = segment.end
-                else:
-                    lines.append(Line().build_from_segment(segment))
+                    cursor = self._skip_ended(diarization_segments, cursor, punctuation_segment.start)
+                    self._attribute_speaker(punctuation_segment, diarization_segments, cursor)
+            self._append_segment(lines, punctuation_segment)
 
         return lines, diarization_buffer
 
+    def _extend_lines(self) -> None:
+        """Fold the tokens received since the last call into the silence-split lines."""
+        lines = self._lines
+        pending: List[ASRToken] = []
+
+        def flush() -> None:
+            if not pending:
+                return
+            if self._line_open:
+                last = lines[-1]
+                lines[-1] = replace(
+                    last,
+                    text=last.text + ''.join(token.text for token in pending),
+                    end=pending[-1].end,
+                )
+            else:
+                lines.append(Line().build_from_tokens(pending))
+                self._line_open = True
+            pending.clear()
+
+        for token in self.all_tokens[self._lines_scanned:]:
+            if token.is_silence():
+                flush()
+                self._line_open = False
+                end_silence = token.end if token.has_ended else time() - self.beg_loop
+                if lines and lines[-1].is_silent():
+                    lines[-1] = replace(lines[-1], end=end_silence)
+                else:
+                    lines.append(SilentLine(
+                        start = token.start,
+                        end = end_silence
+                    ))
+            else:
+                pending.append(token)
+        flush()
+        self._lines_scanned = len(self.all_tokens)
+
+    def release_lines(self, lines: List[Line], before: float, limit: Optional[int] = None) -> List[Line]:
+        """
+        Remove the leading lines of `lines` (as returned by the last `get_lines`
+        call) that are final and end before `before`, at most `limit` of them,
+        together with the tokens, speaker intervals and translation segments
+        they were built from. Returns the removed lines.
+        """
+        cached = self._diarization_lines if self.diarization else self._lines
+        # the last cached line can still be extended
+        max_lines = len(cached) - 1 if limit is None else min(limit, len(cached) - 1)
+        n = 0
+        while n < max_lines and lines[n].end <= before:
+            n += 1
+        if not n:
+            return []
+        released = lines[:n]
+        released_end = released[-1].end
+        del cached[:n]
+        self._translation_sources = self._translation_sources[n:]
+        self._translated_lines = self._translated_lines[n:]
+
+        def prefix(items: List[Any], limit: int) -> int:
+            k = 0
+            while k < limit and items[k].end <= released_end:
+                k += 1
+            return k
+
+        k = prefix(self.all_tokens, self._segment_start_idx if self.diarization else self._lines_scanned)
+        del self.all_tokens[:k]
+        self._lines_scanned = max(0, self._lines_scanned - k)
+        self._punctuation_scanned = max(0, self._punctuation_scanned - k)
+        self._segment_start_idx = max(0, self._segment_start_idx - k)
+
+        if self.diarization:
+            k = prefix(self._punctuation_segments, self._final_segments)
+            del self._punctuation_segments[:k]
+            self._final_segments -= k
+            # keep the last merged interval, its end is the end of the diarized audio
+            k = prefix(self._merged_diarization, min(self._diarization_cursor, len(self._merged_diarization) - 1))
+            del self._merged_diarization[:k]
+            self._diarization_cursor -= k
+            k = prefix(self.all_diarization_segments, self._diarization_merged)
+            del self.all_diarization_segments[:k]
+            self._diarization_merged -= k
+
+        if self.all_translation_segments:
+            self.all_translation_segments = [ts for ts in self.all_translation_segments if ts.end > released_end]
+            order = sorted(
+                (ts.start, i) for i, ts in enumerate(self.all_translation_segments) if ts.text
+            )
+            self._translation_starts = [start for start, _ in order]
+            self._translation_indices = [i for _, i in order]
+        return released
 
     def get_lines(
-            self, 
+            self,
             diarization: bool = False,
             translation: bool = False,
             current_silence: Optional[Silence] = None
@@ -146,34 +364,17 @@ class TokensAlignment:
             lines, diarization_buffer = self.get_lines_diarization()
         else:
             diarization_buffer = ''
-            lines = []
-            current_line_tokens = []
-            for token in self.all_tokens:
-                if token.is_silence():
-                    if current_line_tokens:
-                        lines.append(Line().build_from_tokens(current_line_tokens))
-                        current_line_tokens = []
-                    end_silence = token.end if token.has_ended else time() - self.beg_loop
-                    if lines and lines[-1].is_silent():
-                        lines[-1].end = end_silence
-                    else:
-                        lines.append(SilentLine(
-                            start = token.start,
-                            end = end_silence
-                        ))
-                else:
-                    current_line_tokens.append(token)
-            if current_line_tokens:
-                lines.append(Line().build_from_tokens(current_line_tokens))
+            self._extend_lines()
+            lines = list(self._lines)
         if current_silence:
             end_silence = current_silence.end if current_silence.has_ended else time() - self.beg_loop
             if lines and lines[-1].is_silent():
-                lines[-1].end = end_silence
+                lines[-1] = replace(lines[-1], end=end_silence)
             else:
                 lines.append(SilentLine(
                     start = current_silence.start,
                     end = end_silence
                 ))
         if translation:
-            [self.add_translation(line) for line in lines if not type(line) == Silence]
+            lines = self._translate_lines(lines)
         return lines, diarization_buffer, self.new_translation_buffer.text
@@ -0,0 +1,145 @@
+import glob
+import json
+import os
+import re
+import tempfile
+import threading
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from time import time
+from typing import Any, Callable, Deque, Dict, Iterator, Optional, Tuple
+
+_traces: "OrderedDict[str, SessionTracer]" = OrderedDict()
+_traces_lock = threading.Lock()
+
+
+def _trace_directory(directory: Optional[str]) -> str:
+    return directory or os.path.join(tempfile.gettempdir(), "whisperlivekit-traces")
+
+
+class SessionTracer:
+    """
+    Timeline of the pipeline stages of one session (`--trace-sessions`).
+
+    Spans are kept in a ring buffer of `max_spans` entries, so the newest
+    spans replace the oldest ones. Each span has its wall-clock start and
+    duration, the thread that ran it and, when it applies, the audio time
+    (seconds from the start of the stream) it relates to. Timestamps are
+    `time.time()` values, so that the stages timed by the decoders can be
+    passed as is. The trace is exported in the Chrome trace event format,
+    which chrome://tracing and https://ui.perfetto.dev open.
+    """
+
+    def __init__(self, session_id: str, max_spans: int) -> None:
+        self.session_id = session_id
+        self.origin = time()
+        self._spans: Deque[Tuple[str, float, Optional[float], int, Optional[float], Optional[Dict[str, Any]]]] = deque(maxlen=max_spans)
+        self._threads: Dict[int, str] = {}
+
+    def add(
+        self,
+        name: str,
+        start: float,
+        end: Optional[float] = None,
+        audio_time: Optional[float] = None,
+        args: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        """Record a span from `start` to `end` (`time()` values), or an instant event if `end` is None."""
+        thread = threading.current_thread()
+        self._threads.setdefault(thread.ident, thread.name)
+        self._spans.append((name, start, end, thread.ident, audio_time, args))
+
+    def instant(self, name: str, audio_time: Optional[float] = None, **args: Any) -> None:
+        self.add(name, time(), None, audio_time, args or None)
+
+    @contextmanager
+    def span(self, name: str, audio_time: Optional[float] = None, **args: Any) -> Iterator[Dict[str, Any]]:
+        """Record the enclosed block; the yielded dict can be filled with more arguments."""
+        start = time()
+        try:
+            yield args
+        finally:
+            self.add(name, start, time(), audio_time, args or None)
+
+    def traced(self, name: str, fn: Callable, audio_time: Optional[float] = None) -> Callable:
+        """Wrap a blocking call so that it is recorded in the thread that runs it."""
+        def call(*args: Any) -> Any:
+            with self.span(name, audio_time):
+                return fn(*args)
+        return call
+
+    def chrome_trace(self) -> Dict[str, Any]:
+        pid = os.getpid()
+        events = [
+            {"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+            for tid, name in list(self._threads.items())
+        ]
+        for name, start, end, tid, audio_time, args in list(self._spans):
+            event = {
+                "name": name,
+                "cat": "wlk",
+                "ts": round((start - self.origin) * 1e6),
+                "pid": pid,
+                "tid": tid,
+                "args": {"wall_time": start, **(args or {})},
+            }
+            if audio_time is not None:
+                event["args"]["audio_time"] = round(audio_time, 3)
+            if end is None:
+                event.update(ph="i", s="t")
+            else:
+                event.update(ph="X", dur=round((end - start) * 1e6))
+            events.append(event)
+        return {
+            "traceEvents": events,
+            "displayTimeUnit": "ms",
+            "otherData": {"session_id": self.session_id, "wall_time_origin": self.origin},
+        }
+
+    def save(self, directory: Optional[str], keep: int) -> None:
+        """
+        Write the trace of the ended session to `directory`, so that any
+        worker process can serve it, and remove the oldest files beyond
+        `keep`. Blocking file I/O, meant for `asyncio.to_thread`.
+        """
+        directory = _trace_directory(directory)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{self.session_id}.json")
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(self.chrome_trace(), f)
+        os.replace(f"{path}.tmp", path)
+        saved = sorted(glob.glob(os.path.join(directory, "*.json")), key=os.path.getmtime)
+        for old in saved[:-keep]:
+            try:
+                os.remove(old)
+            except OSError:
+                pass  # removed by another worker
+
+
+def start_trace(session_id: str, max_sessions: int, max_spans: int) -> SessionTracer:
+    """Create the tracer of a session; only the traces of the last `max_sessions` sessions are kept."""
+    tracer = SessionTracer(session_id, max_spans)
+    with _traces_lock:
+        _traces[session_id] = tracer
+        while len(_traces) > max_sessions:
+            _traces.popitem(last=False)
+    return tracer
+
+
+def read_trace(session_id: str, directory: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    Chrome trace of a session: from its tracer if the session ran in this
+    process, otherwise from the file saved when it ended (the session may
+    have run in another worker).
+    """
+    with _traces_lock:
+        tracer = _traces.get(session_id)
+    if tracer is not None:
+        return tracer.chrome_trace()
+    if not re.fullmatch(r"[0-9a-f]{32}", session_id):
+        return None
+    try:
+        with open(os.path.join(_trace_directory(directory), f"{session_id}.json")) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
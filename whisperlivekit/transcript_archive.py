@@ -0,0 +1,139 @@
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+from array import array
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_live_archives: Dict[str, "TranscriptArchive"] = {}
+
+
+def _archive_directory(directory: Optional[str]) -> str:
+    return directory or os.path.join(tempfile.gettempdir(), "whisperlivekit-archive")
+
+
+def get_archive(session_id: str, directory: Optional[str] = None) -> Optional["TranscriptArchive"]:
+    """
+    Return the archive of a session: the live one if the session runs in
+    this process, otherwise a read-only view of its file (the session may
+    run in another worker).
+    """
+    archive = _live_archives.get(session_id)
+    if archive is not None or not re.fullmatch(r"[0-9a-f]{32}", session_id):
+        return archive
+    path = os.path.join(_archive_directory(directory), f"{session_id}.jsonl")
+    if not os.path.exists(path):
+        return None
+    return TranscriptArchive.open_readonly(path, session_id)
+
+
+class TranscriptArchive:
+    """
+    Append-only JSONL archive of the lines a long session released from memory.
+
+    One record per line, holding the segment of the delta protocol (id,
+    speaker, text, start, end, language, translation). The byte offset of
+    each record is kept so that a range of ids is read with a single seek.
+    `append` and `read` do blocking file I/O and are meant to be called
+    through `asyncio.to_thread`; they can run concurrently.
+    """
+
+    def __init__(self, directory: Optional[str] = None, session_id: Optional[str] = None) -> None:
+        self.session_id = session_id or uuid.uuid4().hex
+        directory = _archive_directory(directory)
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f"{self.session_id}.jsonl")
+        self._file = open(self.path, "ab")
+        self._offsets = array("q")  # byte offset of each record, record i has id i + 1
+        self._size = self._file.tell()
+        self._lock = threading.Lock()
+        _live_archives[self.session_id] = self
+        logger.info(f"Archiving the transcript of session {self.session_id} to {self.path}")
+
+    @classmethod
+    def open_readonly(cls, path: str, session_id: str) -> "TranscriptArchive":
+        """Archive of a file written by another process, indexed at opening."""
+        archive = cls.__new__(cls)
+        archive.session_id = session_id
+        archive.path = path
+        archive._file = None
+        archive._offsets = array("q")
+        archive._lock = threading.Lock()
+        size = 0
+        with open(path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # record being written
+                archive._offsets.append(size)
+                size += len(line)
+        archive._size = size
+        return archive
+
+    def append(self, records: List[Dict[str, Any]]) -> None:
+        data = []
+        offsets = []
+        size = self._size
+        for record in records:
+            line = json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
+            offsets.append(size)
+            size += len(line)
+            data.append(line)
+        with self._lock:
+            self._file.write(b"".join(data))
+            self._file.flush()
+            self._offsets.extend(offsets)
+            self._size = size
+
+    def read(self, from_id: int = 1, to_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Records with ids in [from_id, to_id] (to the last one by default)."""
+        with self._lock:
+            n = len(self._offsets)
+            first = max(from_id, 1) - 1
+            last = n if to_id is None else min(to_id, n)
+            if first >= last:
+                return []
+            start = self._offsets[first]
+            end = self._offsets[last] if last < n else self._size
+        with open(self.path, "rb") as f:
+            f.seek(start)
+            data = f.read(end - start)
+        return [json.loads(line) for line in data.splitlines()]
+
+    def close(self, retention: Optional[float] = None) -> None:
+        """
+        Close the archive. With `retention`, also delete the archives of the
+        ended sessions not written for `retention` seconds, or only this one
+        when `retention` is 0. Blocking file I/O.
+        """
+        _live_archives.pop(self.session_id, None)
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+        if retention == 0:
+            os.remove(self.path)
+        elif retention is not None:
+            prune_archives(os.path.dirname(self.path), retention)
+
+
+def prune_archives(directory: Optional[str], retention: float) -> int:
+    """Delete the archives not written for `retention` seconds, except the live ones. Returns their number."""
+    directory = _archive_directory(directory)
+    horizon = time.time() - retention
+    removed = 0
+    for entry in os.scandir(directory):
+        session_id, ext = os.path.splitext(entry.name)
+        if ext != ".jsonl" or session_id in _live_archives:
+            continue
+        try:
+            if entry.stat().st_mtime <= horizon:
+                os.remove(entry.path)
+                removed += 1
+        except OSError:
+            pass  # removed by another worker
+    return removed
@@ -68,6 +68,55 @@ def sinusoids(length, channels, max_timescale=10000):
     return torch.cat([torch.sin(scaled_time), torch.cos(scaled_time)], dim=1)
 
 
+class StaticKVCache(dict):
+    """
+    kv_cache with preallocated self-attention buffers.
+
+    Self-attention keys/values are written in place into
+    (n_batch, n_ctx, n_state) buffers at the current `offset`, and the
+    buffers are kept across `reset()` calls so that a session decodes
+    without reallocating its cache. Cross-attention entries are stored as
+    regular dict items, like with a plain dict kv_cache.
+    """
+
+    def __init__(self, n_ctx: int):
+        super().__init__()
+        self.n_ctx = n_ctx
+        self.offset = 0
+        self.buffers: Dict[str, Tensor] = {}
+
+    def write(self, cache_id: str, x: Tensor) -> Tensor:
+        """Write x (n_batch, n_new, n_state) at the current offset and return the filled part of the buffer."""
+        n_batch, n_new = x.shape[:2]
+        end = self.offset + n_new
+        if end > self.n_ctx:
+            raise ValueError(f"Static kv_cache overflow: {end} > {self.n_ctx} positions")
+        buffer = self.buffers.get(cache_id)
+        if (
+            buffer is None
+            or buffer.shape[0] != n_batch
+            or buffer.dtype != x.dtype
+            or buffer.device != x.device
+        ):
+            buffer = x.new_zeros(n_batch, self.n_ctx, x.shape[-1])
+            self.buffers[cache_id] = buffer
+        buffer[:, self.offset : end] = x
+        return buffer[:, :end]
+
+    def advance(self, n_tokens: int):
+        self.offset += n_tokens
+
+    def rearrange(self, source_indices):
+        """Reorder the batch rows of the filled positions (beam search)."""
+        for buffer in self.buffers.values():
+            buffer[:, : self.offset] = buffer[source_indices, : self.offset]
+
+    def reset(self):
+        """Forget the cached positions and cross-attention entries, keeping the buffers."""
+        self.offset = 0
+        self.clear()
+
+
 @contextmanager
 def disable_sdpa():
     prev_state = MultiHeadAttention.use_sdpa
@@ -131,6 +180,10 @@ class MultiHeadAttention(nn.Module):
         self, k: Tensor, v: Tensor, kv_cache: dict
     ) -> Tuple[Tensor, Tensor]:
         """Update self-attention kv cache by concatenating new k,v with cached values."""
+        if isinstance(kv_cache, StaticKVCache):
+            k = kv_cache.write(self.key_cache_id, k.detach())
+            v = kv_cache.write(self.value_cache_id, v.detach())
+            return k, v
         if self.key_cache_id not in kv_cache or k.shape[1] > self.n_text_ctx:
             # First token or context overflow: save as-is
             kv_cache[self.key_cache_id] = k.detach()
@@ -238,14 +291,17 @@ class AudioEncoder(nn.Module):
     def forward(self, x: Tensor):
         """
         x : torch.Tensor, shape = (batch_size, n_mels, n_ctx)
-            the mel spectrogram of the audio
+            the mel spectrogram of the audio; shorter inputs than the full
+            audio context only use the first positional embeddings
         """
         x = F.gelu(self.conv1(x))
         x = F.gelu(self.conv2(x))
         x = x.permute(0, 2, 1)
 
-        assert x.shape[1:] == self.positional_embedding.shape, "incorrect audio shape"
-        x = (x + self.positional_embedding).to(x.dtype)
+        n_ctx = x.shape[1]
+        assert n_ctx <= self.positional_embedding.shape[0], "incorrect audio shape"
+        assert x.shape[2] == self.positional_embedding.shape[1], "incorrect audio shape"
+        x = (x + self.positional_embedding[:n_ctx]).to(x.dtype)
 
         for block in self.blocks:
             x, _ = block(x)  # Encoder blocks don't have cross-attention
@@ -304,7 +360,9 @@ class TextDecoder(nn.Module):
         """
         # Calculate offset from self-attention cache (not cross-attention which has audio length)
         offset = 0
-        if kv_cache:
+        if isinstance(kv_cache, StaticKVCache):
+            offset = kv_cache.offset
+        elif kv_cache:
             # Use the first decoder block's self-attention key cache to get token position
             first_self_attn_key = self.blocks[0].attn.key_cache_id
             if first_self_attn_key in kv_cache:
@@ -322,6 +380,9 @@ class TextDecoder(nn.Module):
             if return_cross_attn and cross_attn_qk is not None:
                 cross_attns.append(cross_attn_qk)
 
+        if isinstance(kv_cache, StaticKVCache):
+            kv_cache.advance(x.shape[1])
+
         x = self.ln(x)
         logits = (
             x @ torch.transpose(self.token_embedding.weight.to(x.dtype), 0, 1)
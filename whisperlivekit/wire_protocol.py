@@ -0,0 +1,135 @@
+import json
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+from whisperlivekit.timed_objects import FrontData, Line
+
+PROTOCOLS = ("legacy", "delta")
+ENCODINGS = ("json", "msgpack", "cbor")
+
+
+def _load_packer(encoding: str) -> Callable[[Any], Union[str, bytes]]:
+    if encoding == "msgpack":
+        try:
+            import msgpack
+        except ImportError:
+            raise ImportError("MessagePack encoding requires msgpack: `pip install msgpack`")
+        return msgpack.packb
+    if encoding == "cbor":
+        try:
+            import cbor2
+        except ImportError:
+            raise ImportError("CBOR encoding requires cbor2: `pip install cbor2`")
+        return cbor2.dumps
+    return lambda message: json.dumps(message, ensure_ascii=False, separators=(",", ":"))
+
+
+class DeltaEncoder:
+    """
+    Builds `transcript_update` messages holding only the new or changed segments.
+
+    A segment id is the 1-based position of the line among the displayed
+    lines (lines with text, and silences), so ids are stable as the transcript
+    grows. A changed segment is sent whole and replaces the client's segment
+    with the same id; `n_segments` lets the client drop segments past the end
+    when the tail of the transcript is re-derived into fewer lines. Lines
+    released to the archive (`FrontData.archived_lines`) keep their ids, the
+    following ones are numbered after them. Lines are
+    compared with the ones sent previously, by identity first (TokensAlignment
+    keeps the lines that did not change), so only the changed lines are
+    serialized.
+    """
+
+    def __init__(self) -> None:
+        self._sent: List[Line] = []
+        self._archived = 0
+
+    def encode(self, front_data: FrontData) -> Dict[str, Any]:
+        lines = [line for line in front_data.lines if (line.text or line.speaker == -2)]
+        archived = front_data.archived_lines
+        sent = self._sent[archived - self._archived:]
+        segments = []
+        for i, line in enumerate(lines):
+            if i < len(sent) and (line is sent[i] or line == sent[i]):
+                continue
+            segments.append(line.to_segment_dict(archived + i + 1))
+        self._sent = lines
+        self._archived = archived
+
+        message: Dict[str, Any] = {
+            "type": "transcript_update",
+            "status": front_data.status,
+            "segments": segments,
+            "n_segments": archived + len(lines),
+            "buffer": {
+                "transcription": front_data.buffer_transcription,
+                "diarization": front_data.buffer_diarization,
+                "translation": front_data.buffer_translation,
+            },
+            "metadata": {
+                "remaining_time_transcription": front_data.remaining_time_transcription,
+                "remaining_time_diarization": front_data.remaining_time_diarization,
+            },
+        }
+        if front_data.error:
+            message["error"] = front_data.error
+        return message
+
+
+class WireProtocol:
+    """
+    Per-connection protocol of the /asr results.
+
+    `protocol` selects the message layout: `legacy` sends the full snapshot
+    (`FrontData.to_dict()`) on each update, `delta` sends `transcript_update`
+    messages (see `DeltaEncoder`). `encoding` selects the frame type: `json`
+    text frames, or `msgpack` / `cbor` binary frames. `max_update_rate`
+    lowers the number of updates per second sent to the client.
+    """
+
+    def __init__(
+        self,
+        protocol: str = "legacy",
+        encoding: str = "json",
+        max_update_rate: Optional[float] = None,
+    ) -> None:
+        if protocol not in PROTOCOLS:
+            raise ValueError(f"Unknown protocol '{protocol}', expected one of {', '.join(PROTOCOLS)}")
+        if encoding not in ENCODINGS:
+            raise ValueError(f"Unknown encoding '{encoding}', expected one of {', '.join(ENCODINGS)}")
+        if max_update_rate is not None and not max_update_rate > 0:
+            raise ValueError(f"max_update_rate must be positive, got {max_update_rate}")
+        self.protocol = protocol
+        self.encoding = encoding
+        self.max_update_rate = max_update_rate
+        self._pack = _load_packer(encoding)
+        self._delta = DeltaEncoder() if protocol == "delta" else None
+
+    @classmethod
+    def from_query_params(cls, query_params: Any) -> "WireProtocol":
+        max_update_rate = query_params.get("max_update_rate")
+        if max_update_rate is not None:
+            try:
+                max_update_rate = float(max_update_rate)
+            except ValueError:
+                raise ValueError(f"max_update_rate must be a number, got '{max_update_rate}'")
+        return cls(
+            protocol=query_params.get("protocol", "legacy"),
+            encoding=query_params.get("encoding", "json"),
+            max_update_rate=max_update_rate,
+        )
+
+    def encode_response(self, front_data: FrontData) -> Dict[str, Any]:
+        if self._delta is not None:
+            return self._delta.encode(front_data)
+        return front_data.to_dict()
+
+    def pack(self, message: Dict[str, Any]) -> Tuple[bool, Union[str, bytes]]:
+        """Return (is_binary, frame payload)."""
+        return self.encoding != "json", self._pack(message)
+
+    async def send(self, websocket: Any, message: Dict[str, Any]) -> None:
+        is_binary, payload = self.pack(message)
+        if is_binary:
+            await websocket.send_bytes(payload)
+        else:
+            await websocket.send_text(payload)